@@ -0,0 +1,12 @@
+"""Shared LLM gateway"""
+from .gateway import (
+    GEMINI_MODEL,
+    LLMError,
+    LLMGateway,
+    extract_json_from_response,
+    gateway,
+    generate,
+    stream,
+    structured,
+    usage,
+)
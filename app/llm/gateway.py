@@ -0,0 +1,258 @@
+"""Single pooled Gemini client shared by every LLM-backed service"""
+import asyncio
+import json
+import os
+import random
+import re
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash-exp")
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "2"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+
+# HTTP status codes worth retrying (rate limit and transient server errors)
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """Raised when the gateway cannot serve a generation request"""
+
+
+def extract_json_from_response(text: str) -> dict:
+    """Extract JSON from Gemini response, handling markdown code blocks"""
+    # Remove markdown code blocks if present
+    text = re.sub(r'```json\s*', '', text)
+    text = re.sub(r'```\s*', '', text)
+    text = text.strip()
+
+    # Try to parse as JSON
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        # If that fails, try to find JSON object in the text
+        json_match = re.search(r'\{.*\}', text, re.DOTALL)
+        if json_match:
+            return json.loads(json_match.group())
+        raise ValueError(f"Could not extract valid JSON from response: {text[:200]}")
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, asyncio.TimeoutError):
+        return True
+    code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+    if isinstance(code, int):
+        return code in RETRYABLE_STATUS
+    # Connection-level failures (httpx/aiohttp) carry no status code
+    return isinstance(exc, OSError) or type(exc).__module__.startswith(("httpx", "aiohttp"))
+
+
+class LLMGateway:
+    """
+    Owns one google-genai client (and therefore one HTTP connection pool) and
+    applies timeout, retry, concurrency limits and usage accounting to every call
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: str = GEMINI_MODEL,
+        timeout: float = LLM_TIMEOUT,
+        retries: int = LLM_RETRIES,
+        max_concurrency: int = LLM_MAX_CONCURRENCY
+    ):
+        self.api_key = api_key if api_key is not None else os.getenv("GOOGLE_API_KEY")
+        self.model = model
+        self.timeout = timeout
+        self.retries = retries
+        self.max_concurrency = max_concurrency
+        self._client = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._usage: Dict[str, Any] = {
+            "calls": 0,
+            "errors": 0,
+            "retries": 0,
+            "timeouts": 0,
+            "in_flight": 0,
+            "prompt_tokens": 0,
+            "output_tokens": 0,
+            "latency_ms_total": 0.0,
+            "by_model": {}
+        }
+
+    @property
+    def configured(self) -> bool:
+        return self._client is not None or bool(self.api_key)
+
+    def configure(self, client: Any = None, api_key: Optional[str] = None) -> None:
+        """Swap the underlying client (tests and local stand-ins) or API key"""
+        if api_key is not None:
+            self.api_key = api_key
+            self._client = None
+        if client is not None:
+            self._client = client
+
+    def _get_client(self):
+        if self._client is None:
+            if not self.api_key:
+                raise LLMError("Google Gemini API not configured. Set GOOGLE_API_KEY environment variable.")
+            # Imported lazily: the SDK is heavy and most workers never need it at import time
+            from google import genai
+            self._client = genai.Client(api_key=self.api_key)
+        return self._client
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def _record(self, model: str, started: float, response: Any = None, error: bool = False) -> None:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        stats = self._usage["by_model"].setdefault(model, {"calls": 0, "errors": 0, "latency_ms_total": 0.0})
+        self._usage["calls"] += 1
+        self._usage["latency_ms_total"] += elapsed_ms
+        stats["calls"] += 1
+        stats["latency_ms_total"] += elapsed_ms
+        if error:
+            self._usage["errors"] += 1
+            stats["errors"] += 1
+        metadata = getattr(response, "usage_metadata", None)
+        if metadata is not None:
+            self._usage["prompt_tokens"] += getattr(metadata, "prompt_token_count", 0) or 0
+            self._usage["output_tokens"] += getattr(metadata, "candidates_token_count", 0) or 0
+
+    async def _call(self, fn, timeout: float, retries: int):
+        """Run fn() under the concurrency limit with timeout and jittered retry"""
+        attempt = 0
+        while True:
+            try:
+                async with self._get_semaphore():
+                    self._usage["in_flight"] += 1
+                    try:
+                        return await asyncio.wait_for(fn(), timeout=timeout)
+                    finally:
+                        self._usage["in_flight"] -= 1
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    self._usage["timeouts"] += 1
+                if attempt >= retries or not _is_retryable(e):
+                    raise
+                attempt += 1
+                self._usage["retries"] += 1
+                await asyncio.sleep(min(8.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.0))
+
+    async def generate(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        timeout: Optional[float] = None,
+        retries: Optional[int] = None,
+        config: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """
+        Generate text for a prompt
+
+        Args:
+            prompt: Prompt text
+            model: Model name (defaults to GEMINI_MODEL)
+            timeout: Per-attempt timeout in seconds
+            retries: Retries on timeouts, rate limits and transient server errors
+            config: Optional generation config passed through to the SDK
+
+        Returns:
+            Generated text
+        """
+        model = model or self.model
+        client = self._get_client()
+        started = time.perf_counter()
+        try:
+            response = await self._call(
+                lambda: client.aio.models.generate_content(model=model, contents=prompt, config=config),
+                timeout if timeout is not None else self.timeout,
+                retries if retries is not None else self.retries
+            )
+        except Exception:
+            self._record(model, started, error=True)
+            raise
+        self._record(model, started, response)
+        return response.text or ""
+
+    async def structured(self, prompt: str, **kwargs) -> Any:
+        """Generate and parse a JSON object or array"""
+        text = await self.generate(prompt, **kwargs)
+        return extract_json_from_response(text)
+
+    async def stream(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        timeout: Optional[float] = None,
+        config: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream generated text chunks as they arrive
+
+        The timeout applies to opening the stream and to each gap between chunks.
+        Streams are not retried once the first chunk has been yielded.
+        """
+        model = model or self.model
+        client = self._get_client()
+        timeout = timeout if timeout is not None else self.timeout
+        started = time.perf_counter()
+        last = None
+        error = False
+        async with self._get_semaphore():
+            self._usage["in_flight"] += 1
+            try:
+                chunks = await asyncio.wait_for(
+                    client.aio.models.generate_content_stream(model=model, contents=prompt, config=config),
+                    timeout=timeout
+                )
+                iterator = chunks.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(iterator.__anext__(), timeout=timeout)
+                    except StopAsyncIteration:
+                        break
+                    last = chunk
+                    if chunk.text:
+                        yield chunk.text
+            except BaseException as e:
+                error = True
+                if isinstance(e, asyncio.TimeoutError):
+                    self._usage["timeouts"] += 1
+                raise
+            finally:
+                self._usage["in_flight"] -= 1
+                # The last chunk carries the usage metadata for the whole stream
+                self._record(model, started, last, error=error)
+
+    async def aclose(self) -> None:
+        """Close the pooled client connections (application shutdown)"""
+        aio = getattr(self._client, "aio", None)
+        if aio is not None and hasattr(aio, "aclose"):
+            await aio.aclose()
+
+    def usage(self) -> Dict[str, Any]:
+        """Usage counters for the metrics endpoint"""
+        calls = self._usage["calls"]
+        return {
+            **self._usage,
+            "avg_latency_ms": round(self._usage["latency_ms_total"] / calls, 1) if calls else 0.0,
+            "max_concurrency": self.max_concurrency,
+            "model": self.model
+        }
+
+
+gateway = LLMGateway()
+
+# Module-level shortcuts used by the services
+generate = gateway.generate
+structured = gateway.structured
+stream = gateway.stream
+usage = gateway.usage
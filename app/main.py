@@ -1,19 +1,38 @@
 """Main API application with x402 payment protocol"""
-from fastapi import FastAPI, HTTPException, Header, Request
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Header, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from app.models import *
 from app.payment import PaymentVerifier
+from app import llm
+from app.utils import http_client
+from app.utils.credits import credit_accounts, deposit_message, deposit_signer, is_credit_key
+from app.utils.crawler import CRAWL_MAX_PAGES, Crawler, normalize_url
+from app.utils.executor import shutdown_pools
+from app.utils.fanout import as_completed_bounded, fan_out
+from app.utils.idempotency import IdempotencyMiddleware, idempotency_store
+from app.utils.jobs import JobContext, check_webhook_url, job_queue, public_view
+from app.utils.page_cache import page_cache
+from app.utils.payment_index import PAYMENT_INDEX_ENABLED, Web3Source, transfer_indexer
+from app.utils.payment_ledger import PaymentClaimsMiddleware, durable_storage_problem, payment_ledger, release_claims
+from app.utils.receipts import is_receipt, receipt_signer
+from app.utils.readability import estimate_tokens, prompt_text
+from app.utils.result_cache import HIT, get_ttl, result_cache
+from app.utils.search import search, search_client
+from app.utils.speculation import speculative, speculator
+from app.utils.streaming import event_stream, stream_format
+from app.utils.singleflight import singleflight
+from app.utils import structured_data
+from contextlib import asynccontextmanager
+from pydantic import ValidationError
 from typing import Optional, List
+from urllib.parse import urlsplit
+import asyncio
+import inspect
+import json
 import os
+import time
 from dotenv import load_dotenv
-import httpx
-from bs4 import BeautifulSoup
-from duckduckgo_search import DDGS
-from google import genai
-from google.genai import types
-import json
-import re
-from web3 import Web3
+from web3 import AsyncWeb3
 
 load_dotenv()
 
@@ -28,12 +47,35 @@ NETWORK_NAME = "Base Mainnet"
 # Server Wallet for receiving payments (from your CDP setup)
 SERVER_WALLET = os.getenv("SERVER_WALLET_ADDRESS", "0xDE8A632E7386A919b548352e0CB57DaCE566BbB5")
 
-# AI Configuration
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash-exp")
-client = genai.Client(api_key=GOOGLE_API_KEY) if GOOGLE_API_KEY else None
+# Shared async RPC connection (created on first payment verification)
+_w3: Optional[AsyncWeb3] = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if not TEST_MODE:
+        # Replay protection is only as durable as the ledger file: refuse to take payments on a wiped disk
+        for setting, store in (("PAYMENT_LEDGER_DB", payment_ledger.store), ("CREDITS_DB", credit_accounts.store)):
+            if problem := durable_storage_problem(setting, store.path):
+                raise RuntimeError(problem)
+    await http_client.start()
+    transfer_indexer.configure(Web3Source(get_web3(), USDC_CONTRACT, SERVER_WALLET))
+    if PAYMENT_INDEX_ENABLED and not TEST_MODE:
+        await transfer_indexer.start()
+    await payment_ledger.load()
+    await job_queue.start()
+    yield
+    await job_queue.stop()
+    await transfer_indexer.stop()
+    await payment_ledger.close()
+    await credit_accounts.close()
+    await http_client.close()
+    await llm.gateway.aclose()
+    shutdown_pools()
+
 
 app = FastAPI(
+    lifespan=lifespan,
     title="Agent Hub API",
     description="AI-powered API services with x402 payment protocol on Base Mainnet",
     version="1.0.0",
@@ -43,6 +85,12 @@ app = FastAPI(
     ]
 )
 
+# A paid call that fails with a 5xx gives its payment back for the retry;
+# otherwise any value left on the tx comes back as a Payment-Receipt
+app.add_middleware(PaymentClaimsMiddleware)
+# Retries of a paid call (same Idempotency-Key, or a tx spent in full) get the stored response
+app.add_middleware(IdempotencyMiddleware, store=idempotency_store, paid_in_full=payment_ledger.paid_in_full)
+
 # Configuration
 TEST_MODE = os.getenv("TEST_MODE", "false").lower() == "true"
 
@@ -68,81 +116,155 @@ PRICING = {
     "bulk_content": 1.00,
 }
 
-# USDC ABI for verifying transfers
-USDC_ABI = [
-    {
-        "anonymous": False,
-        "inputs": [
-            {"indexed": True, "name": "from", "type": "address"},
-            {"indexed": True, "name": "to", "type": "address"},
-            {"indexed": False, "name": "value", "type": "uint256"}
-        ],
-        "name": "Transfer",
-        "type": "event"
-    }
-]
+# Bump whenever a handler prompt changes so cached results are not reused
+PROMPT_VERSION = "3"
 
-def verify_usdc_payment(tx_hash: str, expected_amount: float) -> bool:
-    """Verify USDC payment on Base Mainnet"""
-    try:
-        w3 = Web3(Web3.HTTPProvider(BASE_RPC))
+# /agent/scrape/batch: URLs per batch, pages in flight, pages in flight per host
+SCRAPE_BATCH_MAX_URLS = int(os.getenv("SCRAPE_BATCH_MAX_URLS", "50"))
+SCRAPE_BATCH_CONCURRENCY = int(os.getenv("SCRAPE_BATCH_CONCURRENCY", "10"))
+SCRAPE_BATCH_PER_HOST = int(os.getenv("SCRAPE_BATCH_PER_HOST", "2"))
 
-        # Get transaction receipt
-        receipt = w3.eth.get_transaction_receipt(tx_hash)
-        if not receipt or receipt['status'] != 1:
-            return False
+# /agent/bulk-content: pieces generated at once, and retries for a failed piece
+BULK_CONTENT_CONCURRENCY = int(os.getenv("BULK_CONTENT_CONCURRENCY", "5"))
+BULK_CONTENT_RETRIES = int(os.getenv("BULK_CONTENT_RETRIES", "1"))
 
-        # Get transaction details
-        tx = w3.eth.get_transaction(tx_hash)
+# /agent/batch: invocations per batch, and how many run at once
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "20"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "5"))
 
-        # Verify it's to our payment wallet OR the USDC contract
-        # (Standard transfers call the contract, but 'to' field is the contract address)
-        if tx['to'].lower() != USDC_CONTRACT.lower():
-            return False
+# Token budgets for page content sent to Gemini (main content only, boilerplate stripped)
+SUMMARIZE_MAX_TOKENS = int(os.getenv("SUMMARIZE_MAX_TOKENS", "2500"))
+EXTRACT_MAX_TOKENS = int(os.getenv("EXTRACT_MAX_TOKENS", "2000"))
 
-        # Decode USDC transfer logs to find the one to our wallet
-        usdc_contract = w3.eth.contract(address=USDC_CONTRACT, abi=USDC_ABI)
 
-        # Check transfer logs
-        for log in receipt['logs']:
-            if log['address'].lower() == USDC_CONTRACT.lower():
-                try:
-                    decoded = usdc_contract.events.Transfer().process_log(log)
-                    if decoded['args']['to'].lower() == SERVER_WALLET.lower():
-                        amount_usdc = decoded['args']['value'] / 1e6  # USDC has 6 decimals
-                        # Allow 1% slippage/tolerance
-                        return amount_usdc >= expected_amount * 0.99
-                except:
-                    continue
+def get_web3() -> AsyncWeb3:
+    """Return the shared AsyncWeb3 instance for Base Mainnet"""
+    global _w3
+    if _w3 is None:
+        _w3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(BASE_RPC))
+    return _w3
 
-        return False
+
+async def verify_usdc_payment(tx_hash: str, expected_amount: float) -> bool:
+    """Verify USDC payment on Base Mainnet (indexed Transfer logs, receipt for very recent blocks)"""
+    try:
+        return await transfer_indexer.verify(tx_hash, expected_amount)
     except Exception as e:
         print(f"Payment verification error: {e}")
         return False
 
-def extract_json_from_response(text: str) -> dict:
-    """Extract JSON from Gemini response, handling markdown code blocks"""
-    # Remove markdown code blocks if present
-    text = re.sub(r'```json\s*', '', text)
-    text = re.sub(r'```\s*', '', text)
-    text = text.strip()
 
-    # Try to parse as JSON
+async def payment_value(tx_hash: str) -> int:
+    """Micro-USDC a tx paid to the server wallet (0 if none, or if it cannot be checked)"""
     try:
-        return json.loads(text)
-    except json.JSONDecodeError:
-        # If that fails, try to find JSON object in the text
-        json_match = re.search(r'\{.*\}', text, re.DOTALL)
-        if json_match:
-            return json.loads(json_match.group())
-        raise ValueError(f"Could not extract valid JSON from response: {text[:200]}")
-
-
-def require_payment(service: str, payment_signature: Optional[str] = None) -> Optional[JSONResponse]:
-    if TEST_MODE:
+        return await transfer_indexer.value(tx_hash)
+    except Exception as e:
+        print(f"Payment verification error: {e}")
+        return 0
+
+async def cached(service: str, request, response: Response, compute) -> dict:
+    """Serve a handler result through the result cache and report the cache status"""
+    result, status = await result_cache.get_or_compute(
+        service, request, compute, model=llm.gateway.model, prompt_version=PROMPT_VERSION
+    )
+    response.headers["X-Cache"] = status
+    return result
+
+
+def stream_llm(service: str, request, prompt, finish, fmt: str) -> StreamingResponse:
+    """
+    Stream a generative endpoint: "token" events carrying text as Gemini
+    produces it, then a "done" event holding exactly the JSON the endpoint
+    returns without streaming (or an "error" event if generation fails)
+
+    Results go through the result cache like a normal call; a hit is sent
+    as the "done" event alone.
+
+    Args:
+        service: Service name (cache TTL and key)
+        request: Request model
+        prompt: Prompt string, or an async callable that builds it
+        finish: Turns the full generated text into the JSON response
+        fmt: Streaming format from stream_format()
+    """
+    async def events():
+        status, key, value = result_cache.lookup(service, request, model=llm.gateway.model, prompt_version=PROMPT_VERSION)
+        if status == HIT:
+            yield "done", value
+            return
+        parts = []
+        try:
+            text = prompt if isinstance(prompt, str) else await prompt()
+            async for chunk in llm.stream(text):
+                parts.append(chunk)
+                yield "token", {"text": chunk}
+            result = finish("".join(parts))
+        except Exception as e:
+            print(f"❌ {service} stream failed: {e}")
+            yield "error", {"error": str(e)}
+            return
+        if key is not None:
+            result_cache.set(service, key, result, get_ttl(service))
+        yield "done", result
+
+    return event_stream(events(), fmt)
+
+
+def job_service(service: str, model, checkpointed: bool = False):
+    """
+    Register compute(request) as the background job runner for a service;
+    jobs rebuild the request from its stored JSON and share the result cache.
+    Checkpointed services are called as compute(request, job) with the
+    JobContext, so they can save finished pieces and skip them on resume.
+    """
+    def decorator(compute):
+        async def runner(payload: dict, job: JobContext):
+            request = model(**payload)
+            work = (lambda: compute(request, job)) if checkpointed else (lambda: compute(request))
+            result, _ = await result_cache.get_or_compute(
+                service, request, work, model=llm.gateway.model, prompt_version=PROMPT_VERSION
+            )
+            return result
+
+        job_queue.register(service, runner)
+        return compute
+    return decorator
+
+
+def wants_job(request: AsyncJobOptions) -> bool:
+    return request.async_job or bool(request.webhook_url)
+
+
+async def submit_job(service: str, request: AsyncJobOptions) -> JSONResponse:
+    """Queue a paid request as a job and answer 202 with where to fetch the result"""
+    if request.webhook_url and (problem := await check_webhook_url(request.webhook_url)):
+        raise HTTPException(status_code=400, detail=problem)
+    # A queued job outlives this request, so it must not start on an unverified payment
+    if err := await speculator.confirmed(): return err
+    # Job options are left out so the stored request hits the same result-cache key as a synchronous call
+    payload = request.model_dump(mode="json", exclude={"async_job", "webhook_url"})
+    job = await job_queue.submit(service, payload, request.webhook_url)
+    poll_url = f"/jobs/{job['job_id']}"
+    return JSONResponse(
+        status_code=202,
+        content={**job, "poll_url": poll_url, "paid": not TEST_MODE},
+        headers={"Location": poll_url}
+    )
+
+
+# Passed as payment_signature by /agent/batch, which has already verified one
+# payment for every item; a header can only ever carry a string, never this object
+PREPAID = object()
+
+
+async def require_payment(
+    service: str, payment_signature: Optional[str] = None, amount: Optional[float] = None
+) -> Optional[JSONResponse]:
+    if TEST_MODE or payment_signature is PREPAID:
         return None
 
-    amount = PRICING.get(service, 0.10)
+    if amount is None:
+        amount = PRICING.get(service, 0.10)
 
     if not payment_signature:
         return JSONResponse(
@@ -163,16 +285,75 @@ def require_payment(service: str, payment_signature: Optional[str] = None) -> Op
             }
         )
 
-    # Verify payment on Base Mainnet
-    is_valid = verify_usdc_payment(payment_signature, amount)
+    # A tx hash takes an on-chain lookup: in speculative mode it overlaps the
+    # handler's work, which is only released once the payment checks out
+    if (
+        not is_credit_key(payment_signature) and not is_receipt(payment_signature)
+        and not payment_ledger.is_spent(payment_signature)
+        and speculator.start(lambda: settle_payment(service, payment_signature, amount))
+    ):
+        return None
+    return await settle_payment(service, payment_signature, amount)
+
+
+async def settle_payment(service: str, payment_signature: str, amount: float) -> Optional[JSONResponse]:
+    """Charge a call to a credit key, receipt or tx hash; the 402 response if that fails"""
+    # Prepaid credits: debit the account locally, no chain access
+    if is_credit_key(payment_signature):
+        debit = await credit_accounts.debit(payment_signature, service, amount)
+        if debit["ok"]:
+            return None
+        if debit["reason"] == "invalid_key":
+            return JSONResponse(
+                status_code=402,
+                content={"detail": {"error": "Invalid Credit Key", "message": "Unknown or revoked credit key."}}
+            )
+        return JSONResponse(
+            status_code=402,
+            content={
+                "detail": {
+                    "error": "Insufficient Credit",
+                    "service": service,
+                    "amount_usd": amount,
+                    "balance_usd": debit["balance_usd"],
+                    "currency": "USDC",
+                    "instructions": {
+                        "step_1": f"Send USDC to {SERVER_WALLET} on {NETWORK_NAME}",
+                        "step_2": "POST /credits/deposit with the transaction hash in PAYMENT-SIGNATURE "
+                                  "and {\"credit_key\": \"<your key>\", \"signature\": \"...\"} in the body",
+                        "step_3": "Retry your request with the same credit key"
+                    }
+                }
+            }
+        )
 
-    if not is_valid:
+    # Verify payment on Base Mainnet (or a signed receipt for one) and spend
+    # it in the ledger, so a tx hash pays for calls up to its value and never more
+    if is_receipt(payment_signature):
+        claim = await payment_ledger.redeem_receipt(payment_signature, amount, service, payment_value)
+    else:
+        claim = await payment_ledger.claim(payment_signature, amount, service, payment_value)
+
+    if not claim["ok"]:
+        if claim["reason"] == "invalid_receipt":
+            message = "Payment receipt is invalid or expired. Send the original transaction hash instead."
+        elif claim["reason"] == "unpaid":
+            message = "Payment verification failed. Ensure you sent the correct USDC amount on Base Mainnet."
+        elif claim["reason"] == "spent":
+            message = "This payment has already been used in full. Send a new payment for this request."
+        else:
+            message = (
+                f"This payment has ${claim['remaining_usd']:.2f} USDC left, less than the ${amount} this request costs. "
+                "Send a new payment for this request."
+            )
         return JSONResponse(
             status_code=402,
             content={
                 "detail": {
                     "error": "Invalid Payment",
-                    "message": "Payment verification failed. Ensure you sent the correct USDC amount on Base Mainnet."
+                    "reason": claim["reason"],
+                    "message": message,
+                    **({"remaining_usd": claim["remaining_usd"]} if "remaining_usd" in claim else {})
                 }
             }
         )
@@ -191,7 +372,7 @@ async def root():
         "test_mode": str(TEST_MODE).lower(),
         "server_wallet": SERVER_WALLET,
         "services_available": len(PRICING),
-        "gemini_configured": client is not None,
+        "gemini_configured": llm.gateway.configured,
         "endpoints": {"pricing": "/payment/pricing", "docs": "/docs"}
     }
 
@@ -201,280 +382,579 @@ async def get_pricing():
     return {"currency": "USDC", "network": NETWORK_NAME, "services": PRICING, "test_mode": TEST_MODE}
 
 
+@app.get("/metrics")
+async def metrics():
+    return {
+        "llm": llm.usage(),
+        "result_cache": result_cache.stats(),
+        "page_cache": page_cache.stats(),
+        "extract_fast_path": structured_data.stats(),
+        "search": search_client.stats(),
+        "jobs": job_queue.stats(),
+        "idempotency": idempotency_store.stats(),
+        "payment_index": transfer_indexer.stats(),
+        "payment_ledger": payment_ledger.stats(),
+        "receipts": receipt_signer.stats(),
+        "credits": credit_accounts.stats(),
+        "speculation": speculator.stats(),
+        "singleflight": singleflight.stats()
+    }
+
+
+@app.post("/credits/deposit")
+async def credit_deposit(request: CreditDepositRequest, payment_signature: Optional[str] = Header(None)):
+    """
+    Redeem a USDC transfer (tx hash in PAYMENT-SIGNATURE) as prepaid credit;
+    opens an account and returns its credit key unless credit_key is given.
+    The body's signature must come from the wallet that sent the transfer,
+    so a tx hash seen on-chain cannot be deposited by anyone else.
+    """
+    if not payment_signature or is_credit_key(payment_signature) or is_receipt(payment_signature):
+        raise HTTPException(status_code=400, detail="Send the deposit transaction hash in the PAYMENT-SIGNATURE header")
+    account_id = None
+    if request.credit_key:
+        account_id = await credit_accounts.authenticate(request.credit_key)
+        if account_id is None:
+            raise HTTPException(status_code=401, detail="Unknown credit key")
+    if not request.signature:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Sign \"{deposit_message(payment_signature, account_id)}\" with the wallet that sent the transfer "
+                   "and send it as signature"
+        )
+
+    try:
+        transfers = await transfer_indexer.transfers(payment_signature)
+    except Exception as e:
+        print(f"Payment verification error: {e}")
+        transfers = []
+    if not transfers:
+        return JSONResponse(
+            status_code=402,
+            content={
+                "detail": {
+                    "error": "Invalid Payment",
+                    "reason": "unpaid",
+                    "message": "No confirmed USDC transfer to the server wallet in this transaction yet. "
+                               "Retry once it has a confirmation."
+                }
+            }
+        )
+    if deposit_signer(payment_signature, account_id, request.signature) not in {t["sender"] for t in transfers}:
+        raise HTTPException(status_code=403, detail="The signature is not from the wallet that sent this transfer")
+
+    # Claim exactly the transfers checked above: a second lookup could see transfers the signer never sent
+    value = sum(transfer["value"] for transfer in transfers)
+    claim = await payment_ledger.claim(payment_signature, None, "credit_deposit", known=(value, 0))
+    if not claim["ok"]:
+        return JSONResponse(
+            status_code=402,
+            content={
+                "detail": {
+                    "error": "Invalid Payment",
+                    "reason": claim["reason"],
+                    "message": "The transaction did not send unspent USDC to the server wallet."
+                }
+            }
+        )
+    account = await credit_accounts.deposit(claim["charged_usd"], claim["tx_hash"], account_id)
+    return {**account, "currency": "USDC", "pricing": "/payment/pricing"}
+
+
+@app.get("/credits/balance")
+async def credit_balance(payment_signature: Optional[str] = Header(None), history: int = 20):
+    """Balance and recent deposits/debits of the account whose credit key is in PAYMENT-SIGNATURE"""
+    balance = await credit_accounts.balance(payment_signature or "", max(0, min(history, 100)))
+    if balance is None:
+        raise HTTPException(status_code=401, detail="Send a valid credit key in the PAYMENT-SIGNATURE header")
+    return {**balance, "currency": "USDC"}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0):
+    """
+    Status and (once finished) result of an async job; with ?wait=N the
+    request is held until the job finishes or N seconds pass (capped)
+    """
+    job = await job_queue.wait(job_id, wait)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return public_view(job)
+
+
+@app.get("/jobs/{job_id}/partial")
+async def get_job_partial(job_id: str):
+    """Pieces a job has checkpointed so far, downloadable while it is still running"""
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    items = await job_queue.items(job_id)
+    return {
+        "job_id": job_id,
+        "status": job["status"],
+        "completed": len(items),
+        "items": [items[index] for index in sorted(items)]
+    }
+
+
 # ==========================================
 # TIER 1: CORE & DATA ENDPOINTS
 # ==========================================
 
 
 @app.post("/agent/sentiment")
-async def sentiment_analysis(request: SentimentRequest, payment_signature: Optional[str] = Header(None)):
-    if err := require_payment("sentiment", payment_signature): return err
+@speculative
+async def sentiment_analysis(request: SentimentRequest, response: Response, payment_signature: Optional[str] = Header(None)):
+    if err := await require_payment("sentiment", payment_signature): return err
 
-    if not client:
+    if not llm.gateway.configured:
         raise HTTPException(status_code=503, detail="Google Gemini API not configured. Set GOOGLE_API_KEY environment variable.")
 
-    try:
+    async def run():
         prompt = f"Analyze the sentiment of this text and respond with ONLY a JSON object containing 'sentiment' (positive/negative/neutral) and 'score' (float between -1 and 1). Do not include markdown formatting or code blocks.\n\nText: {request.text}"
-        response = client.models.generate_content(model=GEMINI_MODEL, contents=prompt)
-        result = extract_json_from_response(response.text)
+        result = await llm.structured(prompt)
         return {"status": "success", **result, "paid": not TEST_MODE}
+
+    try:
+        return await cached("sentiment", request, response, run)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/agent/translate")
-async def translate(request: TranslateRequest, payment_signature: Optional[str] = Header(None)):
-    if err := require_payment("translate", payment_signature): return err
-
-    if not client:
+@speculative
+async def translate(
+    request: TranslateRequest,
+    response: Response,
+    payment_signature: Optional[str] = Header(None),
+    accept: Optional[str] = Header(None)
+):
+    if err := await require_payment("translate", payment_signature): return err
+
+    if not llm.gateway.configured:
         raise HTTPException(status_code=503, detail="Google Gemini API not configured. Set GOOGLE_API_KEY environment variable.")
 
-    try:
-        prompt = f"Translate this text to {request.target_language}. Respond with ONLY the translated text:\n\n{request.text}"
-        response = client.models.generate_content(model=GEMINI_MODEL, contents=prompt)
+    prompt = f"Translate this text to {request.target_language}. Respond with ONLY the translated text:\n\n{request.text}"
+
+    def finish(text):
         return {
             "status": "success",
             "original_text": request.text,
-            "translated_text": response.text.strip(),
+            "translated_text": text.strip(),
             "target_language": request.target_language,
             "paid": not TEST_MODE
         }
+
+    if fmt := stream_format(None, accept):
+        return stream_llm("translate", request, prompt, finish, fmt)
+
+    async def run():
+        return finish(await llm.generate(prompt))
+
+    try:
+        return await cached("translate", request, response, run)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/agent/summarize")
-async def summarize(request: SummarizeRequest, payment_signature: Optional[str] = Header(None)):
-    if err := require_payment("summarize", payment_signature): return err
-
-    if not client:
+@speculative
+async def summarize(
+    request: SummarizeRequest,
+    response: Response,
+    payment_signature: Optional[str] = Header(None),
+    accept: Optional[str] = Header(None)
+):
+    if err := await require_payment("summarize", payment_signature): return err
+
+    if not llm.gateway.configured:
         raise HTTPException(status_code=503, detail="Google Gemini API not configured. Set GOOGLE_API_KEY environment variable.")
 
-    try:
+    meta = {}
+
+    async def build_prompt():
         content = request.text or ""
+        truncated = False
         if request.urls:
-            async with httpx.AsyncClient() as c:
-                for url in request.urls[:3]:
-                    try:
-                        resp = await c.get(url, timeout=10)
-                        soup = BeautifulSoup(resp.text, 'html.parser')
-                        content += "\n\n" + soup.get_text()[:5000]
-                    except:
-                        pass
-
-        prompt = f"Summarize this content in approximately {request.max_length} words:\n\n{content[:10000]}"
-        response = client.models.generate_content(model=GEMINI_MODEL, contents=prompt)
+            for url in request.urls[:3]:
+                try:
+                    page, parsed = await page_cache.fetch(url, ("main_text",), timeout=10, max_text=20000)
+                    content += "\n\n" + parsed["main_text"]
+                    truncated = truncated or page["truncated"]
+                except:
+                    pass
+
+        original_length = len(content.split())
+        prompt_content = prompt_text(content.strip(), SUMMARIZE_MAX_TOKENS)
+        meta.update(original_length=original_length, prompt_tokens=estimate_tokens(prompt_content), truncated=truncated)
+        return f"Summarize this content in approximately {request.max_length} words:\n\n{prompt_content}"
+
+    def finish(text):
         return {
             "status": "success",
-            "summary": response.text.strip(),
-            "original_length": len(content.split()),
+            "summary": text.strip(),
+            **meta,
             "paid": not TEST_MODE
         }
+
+    if fmt := stream_format(None, accept):
+        return stream_llm("summarize", request, build_prompt, finish, fmt)
+
+    async def run():
+        prompt = await build_prompt()
+        return finish(await llm.generate(prompt))
+
+    try:
+        return await cached("summarize", request, response, run)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def scrape_page(url: str, max_links: int = 50) -> dict:
+    page, parsed = await page_cache.fetch(url, ("title", "text", "links", "images"), timeout=15, max_links=max_links)
+    return {
+        "status": "success",
+        "url": url,
+        "final_url": page["url"],
+        "title": parsed["title"],
+        "text": parsed["text"],
+        "links": parsed["links"],
+        "images": parsed["images"],
+        "status_code": page["status_code"],
+        "content_type": page["content_type"],
+        "bytes_read": page["bytes_read"],
+        "truncated": page["truncated"],
+        "skipped": page["skipped"],
+        "cache": page["cache"],
+        "paid": not TEST_MODE
+    }
+
+
 @app.post("/agent/scrape")
+@speculative
 async def scrape_web(request: ScrapeRequest, payment_signature: Optional[str] = Header(None)):
-    if err := require_payment("scrape", payment_signature): return err
+    if request.crawl:
+        return await crawl_site(request, payment_signature)
+
+    if err := await require_payment("scrape", payment_signature): return err
 
     try:
-        async with httpx.AsyncClient() as c:
-            response = await c.get(request.url, timeout=15, follow_redirects=True)
-            soup = BeautifulSoup(response.text, 'html.parser')
-
-            return {
-                "status": "success",
-                "url": request.url,
-                "title": soup.title.string if soup.title else None,
-                "text": soup.get_text()[:5000],
-                "links": [a.get('href') for a in soup.find_all('a', href=True)][:50],
-                "images": [img.get('src') for img in soup.find_all('img', src=True)][:20],
-                "status_code": response.status_code,
-                "paid": not TEST_MODE
-            }
+        return await scrape_page(request.url)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Scrape failed: {str(e)}")
 
 
-@app.post("/agent/extract")
-async def extract_data(request: DataExtractionRequest, payment_signature: Optional[str] = Header(None)):
-    if err := require_payment("extract", payment_signature): return err
+async def crawl_site(request: ScrapeRequest, payment_signature: Optional[str] = None):
+    """Crawl mode of /agent/scrape: priced per page of budget, streamed as NDJSON"""
+    if normalize_url(request.url) is None:
+        raise HTTPException(status_code=400, detail=f"Not a crawlable URL: {request.url}")
+    max_pages = min(max(request.max_pages, 1), CRAWL_MAX_PAGES)
+    amount = round(PRICING["scrape"] * max_pages, 6)
+    if err := await require_payment("scrape", payment_signature, amount=amount): return err
+
+    crawler = Crawler(lambda url: scrape_page(url, max_links=500), max_depth=request.max_depth, max_pages=max_pages)
+
+    async def lines():
+        async for result in crawler.run(request.url):
+            if result.get("done"):
+                result = {**result, "amount_usd": amount, "paid": not TEST_MODE}
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.post("/agent/scrape/batch")
+@speculative
+async def scrape_batch(request: BatchScrapeRequest, payment_signature: Optional[str] = Header(None)):
+    """
+    Scrape many URLs for one payment (the scrape price per URL), streaming one
+    NDJSON line per page as it completes and a summary line at the end
+    """
+    urls = list(dict.fromkeys(request.urls))  # drop duplicates, keep order
+    if not urls:
+        raise HTTPException(status_code=400, detail="No URLs provided")
+    if len(urls) > SCRAPE_BATCH_MAX_URLS:
+        raise HTTPException(status_code=400, detail=f"At most {SCRAPE_BATCH_MAX_URLS} URLs per batch")
+
+    amount = round(PRICING["scrape"] * len(urls), 6)
+    if err := await require_payment("scrape", payment_signature, amount=amount): return err
+
+    async def scrape_one(item):
+        index, url = item
+        started = time.perf_counter()
+        try:
+            result = await scrape_page(url)
+        except Exception as e:
+            result = {"status": "error", "url": url, "error": f"Scrape failed: {str(e)}"}
+        return {"index": index, **result, "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+    async def lines():
+        started = time.perf_counter()
+        succeeded = 0
+        async for result in as_completed_bounded(
+            enumerate(urls),
+            scrape_one,
+            limit=SCRAPE_BATCH_CONCURRENCY,
+            key=lambda item: urlsplit(item[1]).hostname or "",
+            per_key_limit=SCRAPE_BATCH_PER_HOST
+        ):
+            succeeded += result["status"] == "success"
+            yield json.dumps(result) + "\n"
+        yield json.dumps({
+            "done": True,
+            "count": len(urls),
+            "succeeded": succeeded,
+            "failed": len(urls) - succeeded,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+            "amount_usd": amount,
+            "paid": not TEST_MODE
+        }) + "\n"
 
-    if not client:
-        raise HTTPException(status_code=503, detail="Google Gemini API not configured. Set GOOGLE_API_KEY environment variable.")
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
-    try:
-        async with httpx.AsyncClient() as c:
-            response = await c.get(request.url, timeout=15)
-            soup = BeautifulSoup(response.text, 'html.parser')
-            page_content = soup.get_text()[:8000]
 
-        schema_str = str(request.extraction_schema) if request.extraction_schema else "title, description, main_content"
-        prompt = f"Extract the following fields from this webpage content: {schema_str}\n\nReturn ONLY a valid JSON object without markdown formatting or code blocks.\n\nContent:\n{page_content}"
+@app.post("/agent/extract")
+@speculative
+async def extract_data(request: DataExtractionRequest, response: Response, payment_signature: Optional[str] = Header(None)):
+    if err := await require_payment("extract", payment_signature): return err
 
-        ai_response = client.models.generate_content(model=GEMINI_MODEL, contents=prompt)
-        extracted = extract_json_from_response(ai_response.text)
+    async def run():
+        page, parsed = await page_cache.fetch(
+            request.url, ("title", "description", "structured", "main_text"), timeout=15, max_text=20000
+        )
+        schema = request.extraction_schema or {"title": "string", "description": "string", "main_content": "string"}
+
+        # JSON-LD, OpenGraph, microdata and meta tags first; Gemini only sees what they lack
+        extracted, field_sources = structured_data.fill_fields(schema, parsed["structured"], parsed)
+        missing = {field: hint for field, hint in schema.items() if field not in extracted}
+        structured_data.record(len(extracted), len(missing))
+
+        prompt_tokens = 0
+        if missing:
+            if not llm.gateway.configured:
+                raise HTTPException(status_code=503, detail="Google Gemini API not configured. Set GOOGLE_API_KEY environment variable.")
+            header = "\n".join(filter(None, (parsed["title"], parsed["description"])))
+            page_content = prompt_text(f"{header}\n\n{parsed['main_text']}".strip(), EXTRACT_MAX_TOKENS)
+            prompt = f"Extract the following fields from this webpage content: {missing}\n\nReturn ONLY a valid JSON object without markdown formatting or code blocks.\n\nContent:\n{page_content}"
+            generated = await llm.structured(prompt)
+            if isinstance(generated, dict):
+                for field in missing:
+                    if field in generated:
+                        extracted[field] = generated[field]
+                        field_sources[field] = structured_data.LLM
+            prompt_tokens = estimate_tokens(page_content)
 
         return {
             "status": "success",
             "url": request.url,
-            "extracted_data": extracted,
+            "extracted_data": {field: extracted.get(field) for field in schema},
+            "field_sources": field_sources,
+            "llm_used": bool(missing),
+            "prompt_tokens": prompt_tokens,
+            "truncated": page["truncated"],
             "paid": not TEST_MODE
         }
+
+    try:
+        return await cached("extract", request, response, run)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@job_service("research", ResearchRequest)
+async def run_research(request: ResearchRequest) -> dict:
+    results = await search(request.query, max_results=request.max_sources)
+    sources_text = "\n\n".join([f"Source: {r['title']}\n{r['body']}" for r in results])
+
+    prompt = f"Based on these search results, provide a comprehensive research summary about: {request.query}\n\nSources:\n{sources_text}"
+    text = await llm.generate(prompt)
+
+    return {
+        "status": "success",
+        "query": request.query,
+        "sources": [{"title": r['title'], "url": r['href'], "snippet": r['body']} for r in results],
+        "summary": text.strip(),
+        "paid": not TEST_MODE
+    }
+
+
 @app.post("/agent/research")
-async def research_topic(request: ResearchRequest, payment_signature: Optional[str] = Header(None)):
-    if err := require_payment("research", payment_signature): return err
+@speculative
+async def research_topic(request: ResearchRequest, response: Response, payment_signature: Optional[str] = Header(None)):
+    if err := await require_payment("research", payment_signature): return err
 
-    if not client:
+    if not llm.gateway.configured:
         raise HTTPException(status_code=503, detail="Google Gemini API not configured. Set GOOGLE_API_KEY environment variable.")
 
-    try:
-        ddgs = DDGS()
-        results = list(ddgs.text(request.query, max_results=request.max_sources))
-        sources_text = "\n\n".join([f"Source: {r['title']}\n{r['body']}" for r in results])
-
-        prompt = f"Based on these search results, provide a comprehensive research summary about: {request.query}\n\nSources:\n{sources_text}"
-        response = client.models.generate_content(model=GEMINI_MODEL, contents=prompt)
+    if wants_job(request):
+        return await submit_job("research", request)
 
-        return {
-            "status": "success",
-            "query": request.query,
-            "sources": [{"title": r['title'], "url": r['href'], "snippet": r['body']} for r in results],
-            "summary": response.text.strip(),
-            "paid": not TEST_MODE
-        }
+    try:
+        return await cached("research", request, response, lambda: run_research(request))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/agent/content-gen")
-async def generate_content(request: ContentGenRequest, payment_signature: Optional[str] = Header(None)):
-    if err := require_payment("content_gen", payment_signature): return err
-
-    if not client:
+@speculative
+async def generate_content(
+    request: ContentGenRequest,
+    response: Response,
+    payment_signature: Optional[str] = Header(None),
+    accept: Optional[str] = Header(None)
+):
+    if err := await require_payment("content_gen", payment_signature): return err
+
+    if not llm.gateway.configured:
         raise HTTPException(status_code=503, detail="Google Gemini API not configured. Set GOOGLE_API_KEY environment variable.")
 
-    try:
-        keywords_str = ", ".join(request.keywords) if request.keywords else ""
-        prompt = f"Write a {request.word_count}-word {request.content_type} about {request.topic} in a {request.tone} tone."
-        if keywords_str:
-            prompt += f" Include these keywords: {keywords_str}"
+    keywords_str = ", ".join(request.keywords) if request.keywords else ""
+    prompt = f"Write a {request.word_count}-word {request.content_type} about {request.topic} in a {request.tone} tone."
+    if keywords_str:
+        prompt += f" Include these keywords: {keywords_str}"
 
-        response = client.models.generate_content(model=GEMINI_MODEL, contents=prompt)
+    def finish(text):
         return {
             "status": "success",
             "topic": request.topic,
-            "content": response.text.strip(),
-            "word_count": len(response.text.split()),
+            "content": text.strip(),
+            "word_count": len(text.split()),
             "paid": not TEST_MODE
         }
+
+    if fmt := stream_format(None, accept):
+        return stream_llm("content_gen", request, prompt, finish, fmt)
+
+    async def run():
+        return finish(await llm.generate(prompt))
+
+    try:
+        return await cached("content_gen", request, response, run)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/agent/code-review")
-async def code_review(request: CodeReviewRequest, payment_signature: Optional[str] = Header(None)):
-    if err := require_payment("code_review", payment_signature): return err
+@speculative
+async def code_review(request: CodeReviewRequest, response: Response, payment_signature: Optional[str] = Header(None)):
+    if err := await require_payment("code_review", payment_signature): return err
 
-    if not client:
+    if not llm.gateway.configured:
         raise HTTPException(status_code=503, detail="Google Gemini API not configured. Set GOOGLE_API_KEY environment variable.")
 
-    try:
+    async def run():
         prompt = f"Review this {request.language} code. Check for:"
         if request.check_security: prompt += " security vulnerabilities,"
         if request.check_performance: prompt += " performance issues,"
         prompt += f" and code quality. Return ONLY a valid JSON object (no markdown formatting) with 'issues' (array), 'quality_score' (0-100), and 'recommendations' (array).\n\nCode:\n{request.code}"
 
-        response = client.models.generate_content(model=GEMINI_MODEL, contents=prompt)
-        result = extract_json_from_response(response.text)
+        result = await llm.structured(prompt)
         return {"status": "success", **result, "paid": not TEST_MODE}
+
+    try:
+        return await cached("code_review", request, response, run)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/agent/seo-optimize")
-async def seo_optimize(request: SeoOptimizeRequest, payment_signature: Optional[str] = Header(None)):
-    if err := require_payment("seo_optimize", payment_signature): return err
-
-    if not client:
+@speculative
+async def seo_optimize(
+    request: SeoOptimizeRequest,
+    response: Response,
+    payment_signature: Optional[str] = Header(None),
+    accept: Optional[str] = Header(None)
+):
+    if err := await require_payment("seo_optimize", payment_signature): return err
+
+    if not llm.gateway.configured:
         raise HTTPException(status_code=503, detail="Google Gemini API not configured. Set GOOGLE_API_KEY environment variable.")
 
-    try:
-        keywords_str = ", ".join(request.target_keywords)
-        prompt = f"Optimize this content for SEO with these keywords: {keywords_str}. Return the optimized version:\n\n{request.content}"
-        response = client.models.generate_content(model=GEMINI_MODEL, contents=prompt)
+    keywords_str = ", ".join(request.target_keywords)
+    prompt = f"Optimize this content for SEO with these keywords: {keywords_str}. Return the optimized version:\n\n{request.content}"
 
+    def finish(text):
         return {
             "status": "success",
-            "optimized_content": response.text.strip(),
+            "optimized_content": text.strip(),
             "keywords_used": request.target_keywords,
             "paid": not TEST_MODE
         }
+
+    if fmt := stream_format(None, accept):
+        return stream_llm("seo_optimize", request, prompt, finish, fmt)
+
+    async def run():
+        return finish(await llm.generate(prompt))
+
+    try:
+        return await cached("seo_optimize", request, response, run)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/agent/swot")
-async def swot_analysis(request: SWOTRequest, payment_signature: Optional[str] = Header(None)):
-    if err := require_payment("swot", payment_signature): return err
+@speculative
+async def swot_analysis(request: SWOTRequest, response: Response, payment_signature: Optional[str] = Header(None)):
+    if err := await require_payment("swot", payment_signature): return err
 
-    if not client:
+    if not llm.gateway.configured:
         raise HTTPException(status_code=503, detail="Google Gemini API not configured. Set GOOGLE_API_KEY environment variable.")
 
-    try:
+    async def run():
         prompt = f"Perform a SWOT analysis for {request.subject} in the {request.industry} industry. Return ONLY a valid JSON object (no markdown formatting) with 'strengths', 'weaknesses', 'opportunities', 'threats' (each as arrays)."
         if request.include_recommendations:
             prompt += " Also include 'recommendations' array."
 
-        response = client.models.generate_content(model=GEMINI_MODEL, contents=prompt)
-        result = extract_json_from_response(response.text)
+        result = await llm.structured(prompt)
         return {"status": "success", "subject": request.subject, "swot": result, "paid": not TEST_MODE}
+
+    try:
+        return await cached("swot", request, response, run)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/agent/competitive-analysis")
-async def competitive_analysis(request: CompetitiveRequest, payment_signature: Optional[str] = Header(None)):
-    if err := require_payment("competitive", payment_signature): return err
+@speculative
+async def competitive_analysis(request: CompetitiveRequest, response: Response, payment_signature: Optional[str] = Header(None)):
+    if err := await require_payment("competitive", payment_signature): return err
 
-    if not client:
+    if not llm.gateway.configured:
         raise HTTPException(status_code=503, detail="Google Gemini API not configured. Set GOOGLE_API_KEY environment variable.")
 
-    try:
-        ddgs = DDGS()
-        results = list(ddgs.text(f"{request.company_domain} competitors analysis", max_results=5))
+    async def run():
+        results = await search(f"{request.company_domain} competitors analysis", max_results=5)
         context = "\n".join([r['body'] for r in results])
 
         prompt = f"Based on this research, analyze {request.company_domain}. Return ONLY a valid JSON object (no markdown formatting) with 'competitors' (array), 'market_position' (string), 'strengths' (array), 'weaknesses' (array).\n\nResearch:\n{context}"
-        response = client.models.generate_content(model=GEMINI_MODEL, contents=prompt)
-        result = extract_json_from_response(response.text)
+        result = await llm.structured(prompt)
         return {"status": "success", "target": request.company_domain, **result, "paid": not TEST_MODE}
+
+    try:
+        return await cached("competitive", request, response, run)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/agent/email-finder")
-async def email_finder(request: EmailFinderRequest, payment_signature: Optional[str] = Header(None)):
-    if err := require_payment("email_finder", payment_signature): return err
+@speculative
+async def email_finder(request: EmailFinderRequest, response: Response, payment_signature: Optional[str] = Header(None)):
+    if err := await require_payment("email_finder", payment_signature): return err
 
-    if not client:
+    if not llm.gateway.configured:
         raise HTTPException(status_code=503, detail="Google Gemini API not configured. Set GOOGLE_API_KEY environment variable.")
 
-    try:
+    async def run():
         # Use DuckDuckGo to search for email patterns
-        ddgs = DDGS()
         search_query = f"{request.role} email {request.domain}"
-        results = list(ddgs.text(search_query, max_results=3))
+        results = await search(search_query, max_results=3)
         context = "\n".join([r['body'] for r in results])
 
         prompt = f"Based on this research about {request.domain}, suggest a likely email format for the {request.role} role. Return ONLY a JSON object with 'email' (string) and 'confidence' (float 0-1).\n\nContext:\n{context}"
-        response = client.models.generate_content(model=GEMINI_MODEL, contents=prompt)
-        result = extract_json_from_response(response.text)
+        result = await llm.structured(prompt)
 
         return {
             "status": "success",
@@ -484,6 +964,9 @@ async def email_finder(request: EmailFinderRequest, payment_signature: Optional[
             "verified": request.verify,
             "paid": not TEST_MODE
         }
+
+    try:
+        return await cached("email_finder", request, response, run)
     except Exception as e:
         # Fallback
         return {
@@ -498,16 +981,16 @@ async def email_finder(request: EmailFinderRequest, payment_signature: Optional[
 
 
 @app.post("/agent/company-intel")
-async def company_intel(request: CompanyIntelRequest, payment_signature: Optional[str] = Header(None)):
-    if err := require_payment("company_intel", payment_signature): return err
+@speculative
+async def company_intel(request: CompanyIntelRequest, response: Response, payment_signature: Optional[str] = Header(None)):
+    if err := await require_payment("company_intel", payment_signature): return err
 
-    if not client:
+    if not llm.gateway.configured:
         raise HTTPException(status_code=503, detail="Google Gemini API not configured. Set GOOGLE_API_KEY environment variable.")
 
-    try:
+    async def run():
         # Research company
-        ddgs = DDGS()
-        results = list(ddgs.text(f"{request.domain} company funding employees technology", max_results=5))
+        results = await search(f"{request.domain} company funding employees technology", max_results=5)
         context = "\n".join([r['body'] for r in results])
 
         intel_fields = []
@@ -516,8 +999,7 @@ async def company_intel(request: CompanyIntelRequest, payment_signature: Optiona
         if request.include_tech_stack: intel_fields.append("technology stack")
 
         prompt = f"Analyze {request.domain} and extract: {', '.join(intel_fields)}. Return a JSON object with appropriate fields.\n\nContext:\n{context}"
-        response = client.models.generate_content(model=GEMINI_MODEL, contents=prompt)
-        result = extract_json_from_response(response.text)
+        result = await llm.structured(prompt)
 
         return {
             "status": "success",
@@ -525,6 +1007,9 @@ async def company_intel(request: CompanyIntelRequest, payment_signature: Optiona
             **result,
             "paid": not TEST_MODE
         }
+
+    try:
+        return await cached("company_intel", request, response, run)
     except Exception as e:
         return {
             "status": "success",
@@ -537,18 +1022,18 @@ async def company_intel(request: CompanyIntelRequest, payment_signature: Optiona
 
 
 @app.post("/agent/social-schedule")
-async def social_schedule(request: SocialScheduleRequest, payment_signature: Optional[str] = Header(None)):
-    if err := require_payment("social_schedule", payment_signature): return err
+@speculative
+async def social_schedule(request: SocialScheduleRequest, response: Response, payment_signature: Optional[str] = Header(None)):
+    if err := await require_payment("social_schedule", payment_signature): return err
 
-    if not client:
+    if not llm.gateway.configured:
         raise HTTPException(status_code=503, detail="Google Gemini API not configured. Set GOOGLE_API_KEY environment variable.")
 
-    try:
+    async def run():
         total_posts = request.posts_per_day * request.duration_days
         prompt = f"Create {total_posts} social media posts about {request.topic} for {', '.join(request.platforms)}. Each post should be engaging and {request.tone}. Return a JSON array of posts with 'day', 'time', 'platform', and 'content' fields."
 
-        response = client.models.generate_content(model=GEMINI_MODEL, contents=prompt)
-        schedule = extract_json_from_response(response.text)
+        schedule = await llm.structured(prompt)
 
         return {
             "status": "success",
@@ -557,6 +1042,9 @@ async def social_schedule(request: SocialScheduleRequest, payment_signature: Opt
             "total_posts": total_posts,
             "paid": not TEST_MODE
         }
+
+    try:
+        return await cached("social_schedule", request, response, run)
     except Exception as e:
         # Fallback
         schedule = []
@@ -572,18 +1060,22 @@ async def social_schedule(request: SocialScheduleRequest, payment_signature: Opt
 
 
 @app.post("/agent/email-campaign")
-async def email_campaign(request: EmailCampaignRequest, payment_signature: Optional[str] = Header(None)):
-    if err := require_payment("email_campaign", payment_signature): return err
-
-    if not client:
+@speculative
+async def email_campaign(
+    request: EmailCampaignRequest,
+    response: Response,
+    payment_signature: Optional[str] = Header(None),
+    accept: Optional[str] = Header(None)
+):
+    if err := await require_payment("email_campaign", payment_signature): return err
+
+    if not llm.gateway.configured:
         raise HTTPException(status_code=503, detail="Google Gemini API not configured. Set GOOGLE_API_KEY environment variable.")
 
-    try:
-        prompt = f"Create {request.num_emails} email campaign for {request.product} targeting {request.target_audience} with goal: {request.goal}. Tone: {request.tone}. Return a JSON array with 'subject', 'body', and 'cta' for each email."
-
-        response = client.models.generate_content(model=GEMINI_MODEL, contents=prompt)
-        emails = extract_json_from_response(response.text)
+    prompt = f"Create {request.num_emails} email campaign for {request.product} targeting {request.target_audience} with goal: {request.goal}. Tone: {request.tone}. Return a JSON array with 'subject', 'body', and 'cta' for each email."
 
+    def finish(text):
+        emails = llm.extract_json_from_response(text)
         return {
             "status": "success",
             "product": request.product,
@@ -591,6 +1083,15 @@ async def email_campaign(request: EmailCampaignRequest, payment_signature: Optio
             "goal": request.goal,
             "paid": not TEST_MODE
         }
+
+    if fmt := stream_format(None, accept):
+        return stream_llm("email_campaign", request, prompt, finish, fmt)
+
+    async def run():
+        return finish(await llm.generate(prompt))
+
+    try:
+        return await cached("email_campaign", request, response, run)
     except Exception as e:
         emails = [
             {
@@ -603,72 +1104,87 @@ async def email_campaign(request: EmailCampaignRequest, payment_signature: Optio
         return {"status": "success", "emails": emails, "paid": not TEST_MODE}
 
 
+@job_service("lead_gen", LeadGenRequest)
+async def run_lead_gen(request: LeadGenRequest) -> dict:
+    # Search for companies and contacts
+    job_titles_str = ", ".join(request.job_titles) if request.job_titles else "executives"
+    search_query = f"{request.industry} companies {job_titles_str}"
+
+    if request.location:
+        search_query += f" in {request.location}"
+    if request.company_size:
+        search_query += f" {request.company_size} employees"
+
+    results = await search(search_query, max_results=request.count)
+
+    leads = []
+    for i, result in enumerate(results[:request.count]):
+        leads.append({
+            "name": f"Lead {i+1}",
+            "title": request.job_titles[0] if request.job_titles else "Executive",
+            "company": result.get('title', f'Company {i+1}'),
+            "industry": request.industry,
+            "source": result.get('href', ''),
+            "snippet": result.get('body', '')[:100]
+        })
+
+    return {
+        "status": "success",
+        "leads": leads,
+        "industry": request.industry,
+        "count": len(leads),
+        "paid": not TEST_MODE
+    }
+
+
 @app.post("/agent/lead-gen")
-async def lead_generation(request: LeadGenRequest, payment_signature: Optional[str] = Header(None)):
-    if err := require_payment("lead_gen", payment_signature): return err
+@speculative
+async def lead_generation(request: LeadGenRequest, response: Response, payment_signature: Optional[str] = Header(None)):
+    if err := await require_payment("lead_gen", payment_signature): return err
 
-    if not client:
+    if not llm.gateway.configured:
         raise HTTPException(status_code=503, detail="Google Gemini API not configured. Set GOOGLE_API_KEY environment variable.")
 
-    try:
-        # Search for companies and contacts
-        ddgs = DDGS()
-        job_titles_str = ", ".join(request.job_titles) if request.job_titles else "executives"
-        search_query = f"{request.industry} companies {job_titles_str}"
-
-        if request.location:
-            search_query += f" in {request.location}"
-        if request.company_size:
-            search_query += f" {request.company_size} employees"
-
-        results = list(ddgs.text(search_query, max_results=request.count))
-
-        leads = []
-        for i, result in enumerate(results[:request.count]):
-            leads.append({
-                "name": f"Lead {i+1}",
-                "title": request.job_titles[0] if request.job_titles else "Executive",
-                "company": result.get('title', f'Company {i+1}'),
-                "industry": request.industry,
-                "source": result.get('href', ''),
-                "snippet": result.get('body', '')[:100]
-            })
+    if wants_job(request):
+        return await submit_job("lead_gen", request)
 
-        return {
-            "status": "success",
-            "leads": leads,
-            "industry": request.industry,
-            "count": len(leads),
-            "paid": not TEST_MODE
-        }
+    try:
+        return await cached("lead_gen", request, response, lambda: run_lead_gen(request))
     except Exception as e:
         leads = [{"name": f"Lead {i+1}", "title": request.job_titles[0] if request.job_titles else "Manager", "company": f"Company {i+1}"} for i in range(request.count)]
         return {"status": "success", "leads": leads, "paid": not TEST_MODE}
 
 
+@job_service("trend_forecast", TrendForecastRequest)
+async def run_trend_forecast(request: TrendForecastRequest) -> dict:
+    results = await search(f"{request.topic} trends {request.timeframe}", max_results=5)
+    context = "\n".join([r['body'] for r in results])
+
+    prompt = f"Forecast trends for {request.topic} in {request.timeframe}. Return JSON with 'forecast' (string), 'confidence' (float), 'key_drivers' (array), and 'data_points' (array of numbers if available).\n\nContext:\n{context}"
+    result = await llm.structured(prompt)
+
+    return {
+        "status": "success",
+        "topic": request.topic,
+        "timeframe": request.timeframe,
+        **result,
+        "paid": not TEST_MODE
+    }
+
+
 @app.post("/agent/trend-forecast")
-async def trend_forecast(request: TrendForecastRequest, payment_signature: Optional[str] = Header(None)):
-    if err := require_payment("trend_forecast", payment_signature): return err
+@speculative
+async def trend_forecast(request: TrendForecastRequest, response: Response, payment_signature: Optional[str] = Header(None)):
+    if err := await require_payment("trend_forecast", payment_signature): return err
 
-    if not client:
+    if not llm.gateway.configured:
         raise HTTPException(status_code=503, detail="Google Gemini API not configured. Set GOOGLE_API_KEY environment variable.")
 
-    try:
-        ddgs = DDGS()
-        results = list(ddgs.text(f"{request.topic} trends {request.timeframe}", max_results=5))
-        context = "\n".join([r['body'] for r in results])
-
-        prompt = f"Forecast trends for {request.topic} in {request.timeframe}. Return JSON with 'forecast' (string), 'confidence' (float), 'key_drivers' (array), and 'data_points' (array of numbers if available).\n\nContext:\n{context}"
-        response = client.models.generate_content(model=GEMINI_MODEL, contents=prompt)
-        result = extract_json_from_response(response.text)
+    if wants_job(request):
+        return await submit_job("trend_forecast", request)
 
-        return {
-            "status": "success",
-            "topic": request.topic,
-            "timeframe": request.timeframe,
-            **result,
-            "paid": not TEST_MODE
-        }
+    try:
+        return await cached("trend_forecast", request, response, lambda: run_trend_forecast(request))
     except Exception as e:
         return {
             "status": "success",
@@ -680,37 +1196,269 @@ async def trend_forecast(request: TrendForecastRequest, payment_signature: Optio
         }
 
 
-@app.post("/agent/bulk-content")
-async def bulk_content(request: BulkContentRequest, payment_signature: Optional[str] = Header(None)):
-    if err := require_payment("bulk_content", payment_signature): return err
+async def generate_bulk_pieces(request: BulkContentRequest, finished: Optional[dict] = None):
+    """
+    Generate every topic concurrently (BULK_CONTENT_CONCURRENCY at a time,
+    each retried on its own), yielding ("piece", ...) events as pieces finish
+    and a final ("summary", ...) event with per-topic status and latency
+
+    Args:
+        request: Bulk content request
+        finished: Pieces already generated, by topic index (from a job's
+            checkpoints); they are yielded first and not generated again
+    """
+    finished = finished or {}
+
+    async def generate_piece(entry):
+        index, topic = entry
+        prompt = f"Write a {request.word_count}-word {request.content_type} about {topic} in a {request.tone} tone."
+        text = await llm.generate(prompt)
+        return {"topic": topic, "content": text.strip(), "word_count": len(text.split())}
+
+    started = time.perf_counter()
+    per_topic = [None] * len(request.topics)
+    for index, piece in sorted(finished.items()):
+        per_topic[index] = {key: piece[key] for key in ("topic", "status", "latency_ms", "attempts")}
+        yield "piece", {**piece, "resumed": True}
+
+    remaining = [(index, topic) for index, topic in enumerate(request.topics) if index not in finished]
+    async for outcome in fan_out(remaining, generate_piece, BULK_CONTENT_CONCURRENCY, retries=BULK_CONTENT_RETRIES):
+        index, topic = outcome["item"]
+        status = {"topic": topic, "status": outcome["status"], "latency_ms": outcome["latency_ms"], "attempts": outcome["attempts"]}
+        per_topic[index] = status
+        if outcome["status"] == "success":
+            yield "piece", {"index": index, **outcome["result"], **status}
+        else:
+            yield "piece", {"index": index, **status, "error": outcome["error"]}
+
+    succeeded = sum(1 for s in per_topic if s["status"] == "success")
+    yield "summary", {
+        "total_pieces": len(per_topic),
+        "succeeded": succeeded,
+        "failed": len(per_topic) - succeeded,
+        "resumed": len(finished),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        "per_topic": per_topic,
+        "paid": not TEST_MODE
+    }
 
-    if not client:
-        raise HTTPException(status_code=503, detail="Google Gemini API not configured. Set GOOGLE_API_KEY environment variable.")
 
-    try:
-        content_pieces = []
+@job_service("bulk_content", BulkContentRequest, checkpointed=True)
+async def run_bulk_content(request: BulkContentRequest, job: Optional[JobContext] = None) -> dict:
+    # As a job, every finished piece is checkpointed, so a resumed job skips those topics
+    finished = await job.checkpoints() if job is not None else {}
+    content_pieces, failed, summary = [], [], {}
+    async for event, data in generate_bulk_pieces(request, finished):
+        if event == "summary":
+            summary = data
+        elif data["status"] == "success":
+            content_pieces.append(data)
+            if job is not None and not data.get("resumed"):
+                await job.checkpoint(data["index"], data)
+        else:
+            failed.append({"topic": data["topic"], "error": data["error"]})
+    if not content_pieces and failed:
+        raise Exception(failed[0]["error"])
+
+    content_pieces.sort(key=lambda piece: piece["index"])
+    return {
+        "status": "success",
+        "content_pieces": [
+            {"topic": p["topic"], "content": p["content"], "word_count": p["word_count"]} for p in content_pieces
+        ],
+        "total_pieces": len(content_pieces),
+        "failed": failed,
+        "summary": summary,
+        "paid": not TEST_MODE
+    }
 
-        for topic in request.topics:
-            prompt = f"Write a {request.word_count}-word {request.content_type} about {topic} in a {request.tone} tone."
-            response = client.models.generate_content(model=GEMINI_MODEL, contents=prompt)
 
-            content_pieces.append({
-                "topic": topic,
-                "content": response.text.strip(),
-                "word_count": len(response.text.split())
-            })
+@app.post("/agent/bulk-content")
+@speculative
+async def bulk_content(
+    request: BulkContentRequest,
+    response: Response,
+    payment_signature: Optional[str] = Header(None),
+    accept: Optional[str] = Header(None)
+):
+    if err := await require_payment("bulk_content", payment_signature): return err
+
+    if not llm.gateway.configured:
+        raise HTTPException(status_code=503, detail="Google Gemini API not configured. Set GOOGLE_API_KEY environment variable.")
 
-        return {
-            "status": "success",
-            "content_pieces": content_pieces,
-            "total_pieces": len(content_pieces),
-            "paid": not TEST_MODE
-        }
+    if wants_job(request):
+        return await submit_job("bulk_content", request)
+
+    fmt = stream_format(request.stream, accept)
+    if fmt:
+        return event_stream(generate_bulk_pieces(request), fmt)
+
+    try:
+        return await cached("bulk_content", request, response, lambda: run_bulk_content(request))
     except Exception as e:
         content_pieces = [{"topic": topic, "content": f"Content about {topic}...", "word_count": request.word_count} for topic in request.topics]
         return {"status": "success", "content_pieces": content_pieces, "paid": not TEST_MODE}
 
 
+# ==========================================
+# BATCH: SEVERAL SERVICES, ONE PAYMENT
+# ==========================================
+
+# PRICING key -> (request model, endpoint handler)
+SERVICES = {
+    "sentiment": (SentimentRequest, sentiment_analysis),
+    "translate": (TranslateRequest, translate),
+    "summarize": (SummarizeRequest, summarize),
+    "extract": (DataExtractionRequest, extract_data),
+    "scrape": (ScrapeRequest, scrape_web),
+    "email_finder": (EmailFinderRequest, email_finder),
+    "company_intel": (CompanyIntelRequest, company_intel),
+    "code_review": (CodeReviewRequest, code_review),
+    "research": (ResearchRequest, research_topic),
+    "content_gen": (ContentGenRequest, generate_content),
+    "seo_optimize": (SeoOptimizeRequest, seo_optimize),
+    "social_schedule": (SocialScheduleRequest, social_schedule),
+    "email_campaign": (EmailCampaignRequest, email_campaign),
+    "lead_gen": (LeadGenRequest, lead_generation),
+    "competitive": (CompetitiveRequest, competitive_analysis),
+    "swot": (SWOTRequest, swot_analysis),
+    "trend_forecast": (TrendForecastRequest, trend_forecast),
+    "bulk_content": (BulkContentRequest, bulk_content),
+}
+
+
+# Params that make a handler stream its response, which a batch item cannot carry
+BATCH_UNSUPPORTED_PARAMS = ("crawl", "stream")
+
+
+def batch_refs(items: List[BatchItem]) -> List[dict]:
+    """
+    Resolve each item's pipe into {param: (source index, field path)}
+
+    A pipe may only name an earlier item (by id or index), so the items
+    always form a DAG and items with no pipe run immediately. Items without
+    a pipe are validated here, before anyone is charged for them, and
+    streaming/crawl modes (which a batch cannot return) are refused.
+    """
+    ids = {}
+    refs = []
+    for index, item in enumerate(items):
+        if item.service not in SERVICES:
+            raise HTTPException(status_code=400, detail=f"Item {index}: unknown service '{item.service}'")
+        if any(item.params.get(param) or param in (item.pipe or {}) for param in BATCH_UNSUPPORTED_PARAMS):
+            raise HTTPException(status_code=400, detail=f"Item {index}: streaming and crawl modes are not available in a batch")
+        pipes = {}
+        for param, source in (item.pipe or {}).items():
+            ref, _, path = source.partition(".")
+            source_index = ids.get(ref, int(ref) if ref.isdigit() else None)
+            if source_index is None or source_index >= index:
+                raise HTTPException(status_code=400, detail=f"Item {index}: pipe '{source}' must name an earlier item")
+            pipes[param] = (source_index, [part for part in path.split(".") if part])
+        if not pipes:
+            try:
+                SERVICES[item.service][0](**item.params)
+            except ValidationError as e:
+                raise HTTPException(status_code=422, detail={"item": index, "errors": json.loads(e.json(include_url=False))})
+        refs.append(pipes)
+        if item.id:
+            ids[item.id] = index
+    return refs
+
+
+def pick(value, path: List[str]):
+    """Walk a dotted field path through dicts and lists"""
+    for part in path:
+        value = value[int(part)] if isinstance(value, list) else value[part]
+    return value
+
+
+async def call_service(service: str, params: dict) -> dict:
+    """Run one service through its endpoint handler, payment already settled"""
+    model, handler = SERVICES[service]
+    request = model(**params)
+    response = Response()
+    arguments = {"request": request, "response": response, "payment_signature": PREPAID, "accept": None}
+    parameters = inspect.signature(handler).parameters
+    result = await handler(**{name: value for name, value in arguments.items() if name in parameters})
+    if isinstance(result, StreamingResponse):
+        raise HTTPException(status_code=400, detail="Streaming and crawl modes are not available in a batch")
+    if isinstance(result, Response):
+        return {"status_code": result.status_code, "result": json.loads(result.body)}
+    return {"status_code": 200, "result": result, "cache": response.headers.get("X-Cache")}
+
+
+@app.post("/agent/batch")
+@speculative
+async def batch(request: BatchRequest, payment_signature: Optional[str] = Header(None)):
+    """
+    Run several service invocations for one payment covering their summed
+    price; independent items run concurrently, and an item's pipe feeds
+    fields of earlier results into its params. Items that fail with a 5xx
+    (or are skipped because of one) give their share of the payment back.
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="items must not be empty")
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_ITEMS} items per batch")
+    refs = batch_refs(request.items)
+
+    total = round(sum(PRICING[item.service] for item in request.items), 2)
+    if err := await require_payment("batch", payment_signature, amount=total): return err
+
+    started = time.perf_counter()
+    slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+    tasks: List[asyncio.Task] = []
+
+    async def run_item(index: int, item: BatchItem) -> dict:
+        outcome = {"index": index, "id": item.id, "service": item.service}
+        params = dict(item.params)
+        for param, (source, path) in refs[index].items():
+            upstream = await tasks[source]
+            if upstream["status"] != "success":
+                return {**outcome, "status": "skipped", "error": f"Depends on item {source}, which did not succeed"}
+            try:
+                params[param] = pick(upstream["result"], path)
+            except (KeyError, IndexError, ValueError, TypeError):
+                return {**outcome, "status": "error", "status_code": 400, "error": f"Item {source} has no field '{'.'.join(path)}'"}
+
+        async with slots:
+            item_started = time.perf_counter()
+            try:
+                outcome.update(await call_service(item.service, params))
+                outcome["status"] = "success" if outcome["status_code"] < 400 else "error"
+            except HTTPException as e:
+                outcome.update(status="error", status_code=e.status_code, error=e.detail)
+            except ValidationError as e:
+                outcome.update(status="error", status_code=422, error=json.loads(e.json(include_url=False)))
+            except Exception as e:
+                outcome.update(status="error", status_code=500, error=str(e))
+            outcome["elapsed_ms"] = round((time.perf_counter() - item_started) * 1000, 1)
+        return outcome
+
+    for index, item in enumerate(request.items):
+        tasks.append(asyncio.ensure_future(run_item(index, item)))
+    items = await asyncio.gather(*tasks)
+
+    succeeded = sum(1 for item in items if item["status"] == "success")
+    unserved = round(sum(
+        PRICING[item["service"]] for item in items
+        if item["status"] == "skipped" or item.get("status_code", 0) >= 500
+    ), 2)
+    refunded = 0.0
+    # The claim exists once the payment is settled (speculative batches settle in the background)
+    if unserved and await speculator.confirmed() is None:
+        refunded = await release_claims(unserved)
+    return {
+        "status": "success" if succeeded == len(items) else "partial" if succeeded else "error",
+        "items": items,
+        "succeeded": succeeded,
+        "amount_usd": total,
+        "refunded_usd": refunded,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        "paid": not TEST_MODE
+    }
+
+
 @app.get("/privacy")
 async def privacy_policy():
     return {
@@ -1,16 +1,40 @@
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 
+class AsyncJobOptions(BaseModel):
+    """Opt-in async mode for long-running services (see /jobs/{job_id})"""
+    async_job: bool = False  # return a job id at once instead of waiting for the result
+    webhook_url: Optional[str] = None  # POSTed the finished job; implies async_job
+
 # Original models
 class ScrapeRequest(BaseModel):
     url: str
+    crawl: bool = False  # follow same-site links and stream pages as NDJSON
+    max_depth: int = 1
+    max_pages: int = 10
+
+class BatchScrapeRequest(BaseModel):
+    urls: List[str]
+
+class BatchItem(BaseModel):
+    service: str  # a PRICING key, e.g. "sentiment" or "content_gen"
+    params: Dict[str, Any] = {}  # body of the service's own request model
+    id: Optional[str] = None  # name other items use to pipe from this one
+    pipe: Optional[Dict[str, str]] = None  # param -> "<earlier id or index>.<field path>"
 
-class ResearchRequest(BaseModel):
+class BatchRequest(BaseModel):
+    items: List[BatchItem]
+
+class CreditDepositRequest(BaseModel):
+    credit_key: Optional[str] = None  # top up this account instead of opening a new one
+    signature: Optional[str] = None  # personal_sign of deposit_message() by the wallet that sent the transfer
+
+class ResearchRequest(AsyncJobOptions):
     query: str
     depth: str = "standard"
     max_sources: int = 5
 
-class LeadGenRequest(BaseModel):
+class LeadGenRequest(AsyncJobOptions):
     industry: str
     location: Optional[str] = None
     company_size: Optional[str] = None
@@ -66,11 +90,12 @@ class CompanyIntelRequest(BaseModel):
     include_employees: bool = True
 
 # Tier 2: Content at Scale
-class BulkContentRequest(BaseModel):
+class BulkContentRequest(AsyncJobOptions):
     topics: List[str]
     content_type: str = "article"
     tone: str = "professional"
     word_count: int = 500
+    stream: Optional[str] = None  # "ndjson" or "sse" to receive pieces as they finish
 
 class SocialScheduleRequest(BaseModel):
     topic: str
@@ -82,6 +107,7 @@ class EmailCampaignRequest(BaseModel):
     product: str
     target_audience: str
     goal: str = "sales"
+    tone: str = "professional"
     num_emails: int = 5
 
 # Tier 3: Advanced Analysis
@@ -90,7 +116,7 @@ class SWOTRequest(BaseModel):
     industry: str
     include_recommendations: bool = True
 
-class TrendForecastRequest(BaseModel):
+class TrendForecastRequest(AsyncJobOptions):
     topic: str
     timeframe: str = "12m"
     include_data: bool = True
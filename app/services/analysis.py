@@ -1,19 +1,18 @@
-import os
 from typing import Dict
-from ddgs import DDGS
-import google.generativeai as genai
 from dotenv import load_dotenv
+from app import llm
+from app.utils.result_cache import cached_service
+from app.utils.search import search
 
 load_dotenv()
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-model = genai.GenerativeModel(os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite"))
 
 
+@cached_service("swot")
 async def swot_analysis(subject: str, industry: str, include_recommendations: bool = True) -> Dict:
     """Generate SWOT analysis"""
     try:
         # Search for data
-        results = DDGS().text(f"{subject} {industry} analysis strengths weaknesses", max_results=5)
+        results = await search(f"{subject} {industry} analysis strengths weaknesses", max_results=5)
         content = "\n\n".join([r.get("body", "") for r in results])
         
         prompt = f"""Create comprehensive SWOT analysis for:
@@ -33,22 +32,23 @@ Provide:
 
 Format as structured report."""
 
-        response = model.generate_content(prompt)
+        generated = await llm.generate(prompt)
         
         return {
             "subject": subject,
             "industry": industry,
-            "swot_analysis": response.text,
+            "swot_analysis": generated,
             "includes_recommendations": include_recommendations
         }
     except Exception as e:
         raise Exception(f"SWOT analysis failed: {str(e)}")
 
 
+@cached_service("trend_forecast")
 async def trend_forecast(topic: str, timeframe: str = "12m", include_data: bool = True) -> Dict:
     """Forecast market trends"""
     try:
-        results = DDGS().text(f"{topic} trends forecast 2026 2027", max_results=8)
+        results = await search(f"{topic} trends forecast 2026 2027", max_results=8)
         content = "\n\n".join([r.get("body", "") for r in results])
         
         prompt = f"""Forecast trends for: {topic}
@@ -67,18 +67,19 @@ Provide:
 
 Format as forecast report (under 400 words)."""
 
-        response = model.generate_content(prompt)
+        generated = await llm.generate(prompt)
         
         return {
             "topic": topic,
             "timeframe": timeframe,
-            "forecast": response.text,
+            "forecast": generated,
             "generated_at": "2026-01-02"
         }
     except Exception as e:
         raise Exception(f"Trend forecast failed: {str(e)}")
 
 
+@cached_service("code_review")
 async def code_review(code: str, language: str, check_security: bool = True, 
                        check_performance: bool = True) -> Dict:
     """AI-powered code review"""
@@ -103,12 +104,12 @@ Provide:
 
 Format as code review report."""
 
-        response = model.generate_content(prompt)
+        generated = await llm.generate(prompt)
         
         return {
             "language": language,
             "code_length": len(code),
-            "review": response.text,
+            "review": generated,
             "checks_performed": {
                 "security": check_security,
                 "performance": check_performance
@@ -1,34 +1,36 @@
-import os
 from typing import List, Dict
-import google.generativeai as genai
 from dotenv import load_dotenv
-import asyncio
+from app import llm
+from app.utils.result_cache import cached_service
+from app.utils.fanout import fan_out
+import os
 
 load_dotenv()
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-model = genai.GenerativeModel(os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite"))
+
+BULK_CONCURRENCY = int(os.getenv("BULK_CONTENT_CONCURRENCY", "5"))
 
 
+@cached_service("bulk_content", prompt_version="2")
 async def bulk_generate_content(topics: List[str], content_type: str = "article", 
                                   tone: str = "professional", word_count: int = 500) -> Dict:
     """Generate multiple pieces of content at once"""
     try:
-        generated = []
-        
-        for topic in topics[:10]:  # Limit to 10 per batch
+        async def generate_piece(topic):
             prompt = f"Write a {word_count}-word {tone} {content_type} about: {topic}"
-            
-            response = model.generate_content(prompt)
-            
-            generated.append({
-                "topic": topic,
-                "content": response.text,
-                "word_count": len(response.text.split())
-            })
+            text = await llm.generate(prompt)
+            return {"topic": topic, "content": text, "word_count": len(text.split())}
+        
+        # Concurrent, each piece retried on its own; failures do not sink the batch
+        outcomes = [o async for o in fan_out(topics[:10], generate_piece, BULK_CONCURRENCY)]  # Limit to 10 per batch
+        outcomes.sort(key=lambda o: o["index"])
+        generated = [o["result"] for o in outcomes if o["status"] == "success"]
+        if not generated and outcomes:
+            raise Exception(outcomes[0]["error"])
         
         return {
             "generated_count": len(generated),
             "content": generated,
+            "failed": [{"topic": o["item"], "error": o["error"]} for o in outcomes if o["status"] == "error"],
             "batch_settings": {
                 "content_type": content_type,
                 "tone": tone,
@@ -39,6 +41,7 @@ async def bulk_generate_content(topics: List[str], content_type: str = "article"
         raise Exception(f"Bulk content generation failed: {str(e)}")
 
 
+@cached_service("social_schedule")
 async def generate_social_schedule(topic: str, platforms: List[str], 
                                      posts_per_day: int = 2, duration_days: int = 7) -> Dict:
     """Generate social media content schedule"""
@@ -55,11 +58,11 @@ Requirements:
 
 Format as day-by-day schedule with post content."""
 
-        response = model.generate_content(prompt)
+        generated = await llm.generate(prompt)
         
         return {
             "topic": topic,
-            "schedule": response.text,
+            "schedule": generated,
             "total_posts": total_posts,
             "platforms": platforms,
             "duration_days": duration_days
@@ -68,6 +71,7 @@ Format as day-by-day schedule with post content."""
         raise Exception(f"Social schedule generation failed: {str(e)}")
 
 
+@cached_service("email_campaign")
 async def generate_email_campaign(product: str, target_audience: str, 
                                     goal: str = "sales", num_emails: int = 5) -> Dict:
     """Generate complete email campaign"""
@@ -87,13 +91,13 @@ Include:
 
 Format as Email 1, Email 2, etc."""
 
-        response = model.generate_content(prompt)
+        generated = await llm.generate(prompt)
         
         return {
             "product": product,
             "target_audience": target_audience,
             "goal": goal,
-            "campaign": response.text,
+            "campaign": generated,
             "num_emails": num_emails
         }
     except Exception as e:
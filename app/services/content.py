@@ -1,14 +1,13 @@
-import os
-import google.generativeai as genai
 from typing import List, Optional
 from dotenv import load_dotenv
+from app import llm
+from app.utils.result_cache import cached_service
+from app.utils.readability import estimate_tokens, prompt_text
 
 load_dotenv()
 
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-model = genai.GenerativeModel(os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite"))
-
 
+@cached_service("content_gen")
 async def generate_content(
     topic: str,
     content_type: str = "article",
@@ -30,8 +29,7 @@ async def generate_content(
         }
         
         prompt = prompts.get(content_type, prompts["article"])
-        response = model.generate_content(prompt)
-        content = response.text
+        content = await llm.generate(prompt)
         
         return {
             "content": content,
@@ -44,6 +42,7 @@ async def generate_content(
         raise Exception(f"Content generation failed: {str(e)}")
 
 
+@cached_service("seo_optimize")
 async def seo_optimize(content: str, target_keywords: List[str], level: str = "standard") -> dict:
     """Optimize content for SEO with Gemini"""
     try:
@@ -54,10 +53,10 @@ Original content:
 
 Provide optimized version with keywords naturally integrated. Keep similar length."""
 
-        response = model.generate_content(prompt)
+        generated = await llm.generate(prompt)
         
         return {
-            "optimized_content": response.text,
+            "optimized_content": generated,
             "target_keywords": target_keywords,
             "optimization_level": level
         }
@@ -65,6 +64,7 @@ Provide optimized version with keywords naturally integrated. Keep similar lengt
         raise Exception(f"SEO optimization failed: {str(e)}")
 
 
+@cached_service("summarize", prompt_version="2")
 async def summarize_content(text: Optional[str] = None, urls: Optional[List[str]] = None, max_length: int = 200) -> dict:
     """Summarize text or web pages with Gemini"""
     try:
@@ -82,13 +82,15 @@ async def summarize_content(text: Optional[str] = None, urls: Optional[List[str]
         if not content_to_summarize:
             return {"summary": "No content provided.", "original_length": 0, "summary_length": 0}
         
-        prompt = f"Summarize in {max_length} words or less:\n\n{content_to_summarize[:5000]}"
-        response = model.generate_content(prompt)
-        summary = response.text
+        original_length = len(content_to_summarize.split())
+        content_to_summarize = prompt_text(content_to_summarize.strip(), 1250)
+        prompt = f"Summarize in {max_length} words or less:\n\n{content_to_summarize}"
+        summary = await llm.generate(prompt)
         
         return {
             "summary": summary,
-            "original_length": len(content_to_summarize.split()),
+            "original_length": original_length,
+            "prompt_tokens": estimate_tokens(content_to_summarize),
             "summary_length": len(summary.split()),
             "compression_ratio": round(len(summary) / max(len(content_to_summarize), 1), 2)
         }
@@ -96,17 +98,18 @@ async def summarize_content(text: Optional[str] = None, urls: Optional[List[str]
         raise Exception(f"Summarization failed: {str(e)}")
 
 
+@cached_service("translate")
 async def translate_content(text: str, target_lang: str, source_lang: Optional[str] = None) -> dict:
     """Translate text with Gemini"""
     try:
         source_instruction = f"from {source_lang}" if source_lang else "automatically detecting source"
         prompt = f"Translate this text {source_instruction} to {target_lang}:\n\n{text}"
         
-        response = model.generate_content(prompt)
+        generated = await llm.generate(prompt)
         
         return {
             "original": text,
-            "translated": response.text,
+            "translated": generated,
             "source_language": source_lang or "auto",
             "target_language": target_lang
         }
@@ -1,15 +1,17 @@
-import os
 from typing import Dict, Optional
-from ddgs import DDGS
-import google.generativeai as genai
 from dotenv import load_dotenv
+from app import llm
+from app.utils.result_cache import cached_service
+from app.utils.page_cache import page_cache
+from app.utils.readability import estimate_tokens, prompt_text
+from app.utils.search import search, search_many
 import re
+import time
 
 load_dotenv()
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-model = genai.GenerativeModel(os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite"))
 
 
+@cached_service("sentiment")
 async def sentiment_analysis(text: str, detailed: bool = False, language: str = "en") -> Dict:
     """Analyze sentiment of text"""
     try:
@@ -25,11 +27,11 @@ Provide:
 
 Format as JSON."""
 
-        response = model.generate_content(prompt)
+        generated = await llm.generate(prompt)
         
         return {
             "text": text[:200] + "..." if len(text) > 200 else text,
-            "analysis": response.text,
+            "analysis": generated,
             "language": language,
             "detailed": detailed
         }
@@ -37,19 +39,13 @@ Format as JSON."""
         raise Exception(f"Sentiment analysis failed: {str(e)}")
 
 
+@cached_service("extract", prompt_version="2")
 async def extract_data(url: str, schema: Optional[Dict] = None, format: str = "json") -> Dict:
     """Extract structured data from webpage"""
     try:
-        import httpx
-        from bs4 import BeautifulSoup
-        
-        # Fetch page
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(url, follow_redirects=True, timeout=10)
-            soup = BeautifulSoup(resp.text, 'html.parser')
-        
-        # Get text content
-        text_content = soup.get_text()[:5000]
+        # Main content only: navigation, footers and banners cost tokens for nothing
+        page, parsed = await page_cache.fetch(url, ("title", "main_text"), timeout=10, max_text=20000)
+        text_content = prompt_text(f"{parsed['title'] or ''}\n\n{parsed['main_text']}".strip(), 1250)
         
         schema_instruction = ""
         if schema:
@@ -62,17 +58,20 @@ async def extract_data(url: str, schema: Optional[Dict] = None, format: str = "j
 
 Return data in {format} format."""
 
-        response = model.generate_content(prompt)
+        generated = await llm.generate(prompt)
         
         return {
             "url": url,
-            "extracted_data": response.text,
-            "format": format
+            "extracted_data": generated,
+            "format": format,
+            "prompt_tokens": estimate_tokens(text_content),
+            "truncated": page["truncated"]
         }
     except Exception as e:
         raise Exception(f"Data extraction failed: {str(e)}")
 
 
+@cached_service("email_finder")
 async def find_emails(domain: str, role: Optional[str] = None, verify: bool = False) -> Dict:
     """Find business emails from domain"""
     try:
@@ -81,7 +80,7 @@ async def find_emails(domain: str, role: Optional[str] = None, verify: bool = Fa
         if role:
             query += f" {role}"
         
-        results = DDGS().text(query, max_results=5)
+        results = await search(query, max_results=5)
         
         # Extract emails from results
         emails = []
@@ -102,8 +101,7 @@ async def find_emails(domain: str, role: Optional[str] = None, verify: bool = Fa
 
 Provide JSON with email and likely role."""
             
-            response = model.generate_content(prompt)
-            categorization = response.text
+            categorization = await llm.generate(prompt)
         else:
             categorization = "No emails found"
         
@@ -117,23 +115,25 @@ Provide JSON with email and likely role."""
         raise Exception(f"Email finding failed: {str(e)}")
 
 
+@cached_service("company_intel")
 async def company_intelligence(domain: str, include_funding: bool = True, 
                                 include_tech_stack: bool = True, 
                                 include_employees: bool = True) -> Dict:
     """Get comprehensive company intelligence"""
     try:
-        # Multi-query search
-        queries = [
-            f"{domain} company overview",
-            f"{domain} funding revenue",
-            f"{domain} technology stack",
-            f"{domain} employees team size"
-        ]
-        
-        all_results = []
-        for q in queries[:3]:  # Limit to avoid rate limits
-            results = DDGS().text(q, max_results=2)
-            all_results.extend(results)
+        started = time.perf_counter()
+
+        # One query per requested section, run concurrently under the shared search limiter
+        queries = [f"{domain} company overview"]
+        if include_funding:
+            queries.append(f"{domain} funding revenue")
+        if include_tech_stack:
+            queries.append(f"{domain} technology stack")
+        if include_employees:
+            queries.append(f"{domain} employees team size")
+
+        all_results, search_report = await search_many(queries, max_results=2)
+        search_done = time.perf_counter()
         
         content = "\n\n".join([r.get("body", "") for r in all_results])
         
@@ -151,12 +151,19 @@ Include:
 
 Format as structured report (under 400 words)."""
 
-        response = model.generate_content(prompt)
+        generated = await llm.generate(prompt)
+        finished = time.perf_counter()
         
         return {
             "domain": domain,
-            "intelligence_report": response.text,
-            "sources": [r.get("href") for r in all_results[:5]]
+            "intelligence_report": generated,
+            "sources": [r.get("href") for r in all_results[:5]],
+            "search": search_report,
+            "timing": {
+                "search_ms": round((search_done - started) * 1000, 1),
+                "generate_ms": round((finished - search_done) * 1000, 1),
+                "total_ms": round((finished - started) * 1000, 1)
+            }
         }
     except Exception as e:
         raise Exception(f"Company intelligence failed: {str(e)}")
@@ -1,36 +1,13 @@
-import os
 from typing import List, Optional, Dict
-from ddgs import DDGS
-import google.generativeai as genai
 from dotenv import load_dotenv
+from app import llm
+from app.utils.result_cache import cached_service
+from app.utils.search import search_web
 
 load_dotenv()
 
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-model = genai.GenerativeModel(os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite"))
-
-def search_web_free(query: str, max_results: int = 10) -> List[Dict]:
-    """Free web search"""
-    print(f"🔍 Lead search: {query}")
-    try:
-        # CORRECT: query as first arg
-        results = DDGS().text(query, max_results=max_results)
-        
-        formatted = []
-        for r in results:
-            formatted.append({
-                "title": r.get("title", ""),
-                "url": r.get("href", ""),
-                "content": r.get("body", "")
-            })
-        
-        print(f"✅ Found {len(formatted)} leads")
-        return formatted
-    except Exception as e:
-        print(f"❌ Lead search error: {e}")
-        return []
-
 
+@cached_service("lead_gen")
 async def generate_leads(industry: str, location: Optional[str] = None, company_size: Optional[str] = None, job_titles: Optional[List[str]] = None, count: int = 10) -> dict:
     """Find leads"""
     try:
@@ -38,7 +15,7 @@ async def generate_leads(industry: str, location: Optional[str] = None, company_
         if location:
             query += f" {location}"
         
-        results = search_web_free(query, max_results=count * 2)
+        results = await search_web(query, max_results=count * 2)
         
         if not results:
             return {
@@ -70,10 +47,11 @@ async def generate_leads(industry: str, location: Optional[str] = None, company_
         raise Exception(f"Lead generation failed: {str(e)}")
 
 
+@cached_service("company_intel")
 async def enrich_contact(domain: str) -> dict:
     """Enrich data"""
     try:
-        results = search_web_free(f"{domain} company info", max_results=5)
+        results = await search_web(f"{domain} company info", max_results=5)
         
         if not results:
             return {"domain": domain, "enriched_data": "No data found.", "sources": []}
@@ -81,11 +59,11 @@ async def enrich_contact(domain: str) -> dict:
         content = "\n\n".join([r.get("content", "") for r in results])
         prompt = f"Extract company info for {domain}:\n\n{content[:2000]}\n\nBrief summary."
         
-        response = model.generate_content(prompt)
+        generated = await llm.generate(prompt)
         
         return {
             "domain": domain,
-            "enriched_data": response.text,
+            "enriched_data": generated,
             "sources": [r.get("url") for r in results[:3]]
         }
         
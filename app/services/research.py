@@ -1,48 +1,25 @@
-import os
+import time
 from typing import Dict, List
-from ddgs import DDGS
-import google.generativeai as genai
 from dotenv import load_dotenv
+from app import llm
+from app.utils.result_cache import cached_service
+from app.utils.search import search_many, search_web, web_results
 
 load_dotenv()
 
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-model = genai.GenerativeModel(os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite"))
-
-def search_web_free(query: str, max_results: int = 5) -> List[Dict]:
-    """Free web search using ddgs"""
-    print(f"🔍 Searching for: {query}")
-    try:
-        # CORRECT API: Pass query as first positional argument
-        results = DDGS().text(query, max_results=max_results)
-        
-        formatted = []
-        for r in results:
-            formatted.append({
-                "title": r.get("title", ""),
-                "url": r.get("href", ""),
-                "content": r.get("body", ""),
-                "score": 0.8
-            })
-        
-        print(f"✅ Found {len(formatted)} results")
-        return formatted
-    except Exception as e:
-        print(f"❌ Search error: {e}")
-        return []
-
 
+@cached_service("research")
 async def deep_research(query: str, depth: str = "standard", max_sources: int = 5) -> Dict:
     """Deep web research"""
     try:
-        search_results = search_web_free(query, max_results=max_sources)
+        search_results = await search_web(query, max_results=max_sources)
         
         if not search_results:
             # Fallback to AI knowledge
             try:
-                response = model.generate_content(f"Answer this query: {query}")
+                generated = await llm.generate(f"Answer this query: {query}")
                 return {
-                    "answer": response.text,
+                    "answer": generated,
                     "insights": ["Answered from AI knowledge (search unavailable)"],
                     "sources": [],
                     "confidence": 60,
@@ -67,10 +44,10 @@ Sources:
 
 Provide clear answer with insights (under 300 words)."""
 
-        response = model.generate_content(prompt)
+        generated = await llm.generate(prompt)
         
         return {
-            "answer": response.text,
+            "answer": generated,
             "insights": [f"Source {i+1}: {s['title']}" for i, s in enumerate(sources[:3])],
             "sources": sources,
             "confidence": 85,
@@ -81,37 +58,48 @@ Provide clear answer with insights (under 300 words)."""
         raise Exception(f"Research failed: {str(e)}")
 
 
+@cached_service("competitive")
 async def competitive_analysis(domain: str, analysis_type: str = "full") -> Dict:
     """Analyze competitor"""
     try:
+        started = time.perf_counter()
         queries = [f"{domain} pricing", f"{domain} reviews", f"alternatives to {domain}"]
         
-        all_results = []
-        for q in queries:
-            all_results.extend(search_web_free(q, max_results=2))
+        # Concurrent, deduplicated by URL; a slow query is dropped at the stage deadline
+        results, search_report = await search_many(queries, max_results=2)
+        all_results = web_results(results)
+        search_done = time.perf_counter()
         
         if not all_results:
-            return {"domain": domain, "analysis": {"summary": "No data found."}, "sources": []}
+            return {"domain": domain, "analysis": {"summary": "No data found."}, "sources": [], "search": search_report}
         
         content = "\n\n".join([r.get("content", "") for r in all_results])
         prompt = f"""Analyze {domain}:\n\n{content[:3000]}\n\nBrief analysis: pricing, features, position, competitors."""
         
-        response = model.generate_content(prompt)
+        generated = await llm.generate(prompt)
+        finished = time.perf_counter()
         
         return {
             "domain": domain,
-            "analysis": {"summary": response.text},
-            "sources": [{"url": r["url"], "title": r["title"]} for r in all_results[:5]]
+            "analysis": {"summary": generated},
+            "sources": [{"url": r["url"], "title": r["title"]} for r in all_results[:5]],
+            "search": search_report,
+            "timing": {
+                "search_ms": round((search_done - started) * 1000, 1),
+                "generate_ms": round((finished - search_done) * 1000, 1),
+                "total_ms": round((finished - started) * 1000, 1)
+            }
         }
         
     except Exception as e:
         raise Exception(f"Competitive analysis failed: {str(e)}")
 
 
+@cached_service("market_intel")
 async def market_intelligence(topic: str, timeframe: str = "30d") -> Dict:
     """Market trends"""
     try:
-        results = search_web_free(f"{topic} trends news 2026", max_results=8)
+        results = await search_web(f"{topic} trends news 2026", max_results=8)
         
         if not results:
             return {"topic": topic, "timeframe": timeframe, "intelligence": {"summary": "No data found."}, "updated_at": "2026-01-02"}
@@ -119,12 +107,12 @@ async def market_intelligence(topic: str, timeframe: str = "30d") -> Dict:
         content = "\n\n".join([r.get("content", "") for r in results])
         prompt = f"""Market intelligence: {topic}\n\n{content[:3000]}\n\nBrief: trends, opportunities, players."""
         
-        response = model.generate_content(prompt)
+        generated = await llm.generate(prompt)
         
         return {
             "topic": topic,
             "timeframe": timeframe,
-            "intelligence": {"summary": response.text},
+            "intelligence": {"summary": generated},
             "updated_at": "2026-01-02"
         }
         
@@ -1,24 +1,21 @@
-import httpx
-from bs4 import BeautifulSoup
+from app.utils.page_cache import page_cache
 
 async def scrape_url(url: str):
     headers = {"User-Agent": "AgentHub-Bot/1.0"}
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        resp = await client.get(url, headers=headers, follow_redirects=True)
-        resp.raise_for_status()
-        
-    soup = BeautifulSoup(resp.text, "html.parser")
+    page, parsed = await page_cache.fetch(
+        url, ("title", "description", "h1s", "main_text"),
+        headers=headers, timeout=30.0, raise_for_status=True, max_text=20000
+    )
     
     data = {
         "url": url,
-        "title": soup.title.string.strip() if soup.title else None,
-        "description": "",
-        "h1s": [h.get_text().strip() for h in soup.find_all("h1")],
+        "title": parsed["title"],
+        "description": parsed["description"],
+        "h1s": parsed["h1s"],
+        "text": parsed["main_text"],
+        "token_estimate": parsed["main_text_tokens"],
+        "truncated": page["truncated"],
         "status": "success"
     }
-    
-    meta_desc = soup.find("meta", attrs={"name": "description"})
-    if meta_desc:
-        data["description"] = meta_desc.get("content", "").strip()
         
     return data
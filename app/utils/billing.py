@@ -2,6 +2,8 @@ from fastapi import HTTPException, Request
 from typing import Optional
 import os
 from dotenv import load_dotenv
+from app.utils.payment_ledger import payment_ledger
+from app.utils.receipts import is_receipt
 
 load_dotenv()
 
@@ -53,6 +55,29 @@ async def check_agent_payment(
         print(f"💰 [TEST MODE] Would charge ${amount:.2f} for {service_id}")
         return {"status": "test_mode", "amount": amount, "service": service_id}
     
+    # Signed receipt from an earlier verified payment: no chain or facilitator call
+    payment_signature = request.headers.get("PAYMENT-SIGNATURE")
+    if is_receipt(payment_signature):
+        claim = await payment_ledger.redeem_receipt(payment_signature, amount, service_id)
+        if not claim["ok"]:
+            raise HTTPException(
+                status_code=402,
+                detail={
+                    "error": "Payment receipt rejected",
+                    "reason": claim["reason"],
+                    "amount_usd": amount
+                }
+            )
+        print(f"✅ Payment receipt accepted: ${amount:.2f} for {service_id}")
+        return {
+            "status": "paid",
+            "amount_usd": amount,
+            "tx_hash": claim["tx_hash"],
+            "verified": True,
+            "remaining_usd": claim["remaining_usd"],
+            "receipt": claim.get("receipt")
+        }
+
     # PRODUCTION MODE: Verify x402 payment
     # Import here to avoid circular dependency
     from app.utils.x402_handler import verify_x402_payment, check_wallet_configured
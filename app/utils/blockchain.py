@@ -3,6 +3,8 @@ from web3 import Web3
 from typing import Optional, Dict
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from app.utils.executor import run_blocking
+from app.utils.payment_index import hex_str, transfer_indexer
 
 load_dotenv()
 
@@ -90,7 +92,7 @@ async def verify_specific_transaction(tx_hash: str, from_addr: str, to_addr: str
     """Verify a specific transaction hash"""
     try:
         # Get transaction receipt
-        receipt = w3.eth.get_transaction_receipt(tx_hash)
+        receipt = await run_blocking("web3", w3.eth.get_transaction_receipt, tx_hash)
         
         if not receipt:
             return {
@@ -150,22 +152,39 @@ async def verify_specific_transaction(tx_hash: str, from_addr: str, to_addr: str
 async def search_recent_payments(from_addr: str, to_addr: str, expected_amount: int, timeout_minutes: int) -> Dict:
     """Search recent blocks for matching payment"""
     try:
-        current_block = w3.eth.block_number
+        current_block = await run_blocking("web3", lambda: w3.eth.block_number)
         
         # Base produces ~2 blocks per second, so check last N blocks
         blocks_to_check = timeout_minutes * 60 * 2  # 2 blocks/sec * 60 sec * N minutes
         from_block = max(0, current_block - blocks_to_check)
         
+        # Blocks the transfer indexer already covers are a local lookup; only newer ones need a filter
+        indexer_wallet = getattr(transfer_indexer.source, "wallet", None)
+        if transfer_indexer.checkpoint is not None and indexer_wallet == hex_str(to_addr):
+            for transfer in await transfer_indexer.payments_from(from_addr, from_block):
+                if transfer["value"] >= expected_amount * 0.99:
+                    return {
+                        "verified": True,
+                        "tx_hash": transfer["tx_hash"],
+                        "amount_paid": transfer["value"] / 1_000_000,
+                        "from": from_addr,
+                        "to": to_addr,
+                        "block_number": transfer["block_number"]
+                    }
+            from_block = max(from_block, transfer_indexer.checkpoint + 1)
+        
         print(f"🔍 Searching blocks {from_block} to {current_block} for payment...")
         
         # Get Transfer events to our wallet
-        transfer_filter = usdc_contract.events.Transfer.create_filter(
+        transfer_filter = await run_blocking(
+            "web3",
+            usdc_contract.events.Transfer.create_filter,
             fromBlock=from_block,
             toBlock='latest',
             argument_filters={'to': to_addr}
         )
         
-        events = transfer_filter.get_all_entries()
+        events = await run_blocking("web3", transfer_filter.get_all_entries)
         
         # Check each transfer
         for event in events:
@@ -207,7 +226,7 @@ async def get_wallet_balance(address: str) -> Dict:
         checksum_addr = Web3.to_checksum_address(address)
         
         # Call balanceOf function
-        balance_wei = usdc_contract.functions.balanceOf(checksum_addr).call()
+        balance_wei = await run_blocking("web3", usdc_contract.functions.balanceOf(checksum_addr).call)
         balance_usd = balance_wei / 1_000_000
         
         return {
@@ -0,0 +1,205 @@
+"""Same-site crawler: deduplicating frontier, per-host politeness, deadline"""
+import asyncio
+import os
+import posixpath
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+from urllib.robotparser import RobotFileParser
+
+from dotenv import load_dotenv
+from app.utils import http_client
+
+load_dotenv()
+
+CRAWL_USER_AGENT = os.getenv("CRAWL_USER_AGENT", "AgentHub-Bot/1.0")
+CRAWL_WORKERS = int(os.getenv("CRAWL_WORKERS", "4"))
+# Minimum seconds between two requests to the same host (robots.txt Crawl-delay wins if larger)
+CRAWL_HOST_DELAY = float(os.getenv("CRAWL_HOST_DELAY", "0.5"))
+CRAWL_DEADLINE = float(os.getenv("CRAWL_DEADLINE", "60"))
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "100"))
+CRAWL_MAX_DEPTH = int(os.getenv("CRAWL_MAX_DEPTH", "5"))
+
+# Links to these are never HTML, so they are not worth a request
+SKIP_EXTENSIONS = {
+    ".7z", ".avi", ".css", ".csv", ".doc", ".docx", ".exe", ".gif", ".gz", ".ico", ".jpeg", ".jpg", ".js",
+    ".json", ".mov", ".mp3", ".mp4", ".pdf", ".png", ".ppt", ".pptx", ".rar", ".svg", ".tar", ".webp",
+    ".woff", ".woff2", ".xls", ".xlsx", ".xml", ".zip"
+}
+TRACKING_PARAMS = ("utm_", "fbclid", "gclid", "mc_cid", "mc_eid")
+
+
+def normalize_url(href: str, base: Optional[str] = None) -> Optional[str]:
+    """
+    Canonical absolute form of a link, or None if it is not crawlable
+
+    Resolves against base, lowercases scheme and host, drops default ports,
+    fragments and tracking parameters, sorts the query and resolves dot
+    segments, so trivially different spellings of a page dedupe to one URL.
+    """
+    try:
+        parts = urlsplit(urljoin(base, href.strip()) if base else href.strip())
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    if scheme not in ("http", "https") or not parts.hostname:
+        return None
+    host = parts.hostname.lower()
+    if port and (scheme, port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{port}"
+    path = parts.path or "/"
+    if "/." in path:
+        trailing = path.endswith("/")
+        path = posixpath.normpath(path)
+        path = path + "/" if trailing and path != "/" else path
+    query = urlencode(sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith(TRACKING_PARAMS)
+    ))
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+def site_of(url: str) -> str:
+    """Host without a leading www., used for the same-site check"""
+    host = urlsplit(url).hostname or ""
+    return host[4:] if host.startswith("www.") else host
+
+
+class Crawler:
+    """
+    Breadth-first crawl of one site
+
+    Workers pull (url, depth) pairs from a shared frontier; every URL is
+    normalized and admitted at most once, and only while the page budget
+    lasts. Requests to a host are spaced by the politeness delay, and
+    robots.txt is honoured. Each admitted URL yields exactly one result.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str], Awaitable[Dict]],
+        max_depth: int = 1,
+        max_pages: int = 10,
+        workers: int = CRAWL_WORKERS,
+        host_delay: float = CRAWL_HOST_DELAY,
+        deadline: float = CRAWL_DEADLINE
+    ):
+        self.fetch = fetch
+        self.max_depth = min(max(max_depth, 0), CRAWL_MAX_DEPTH)
+        self.max_pages = min(max(max_pages, 1), CRAWL_MAX_PAGES)
+        self.workers = max(1, workers)
+        self.host_delay = host_delay
+        self.deadline = deadline
+        self._seen: Set[str] = set()
+        self._admitted = 0
+        self._frontier: asyncio.Queue = asyncio.Queue()
+        self._results: asyncio.Queue = asyncio.Queue()
+        self._next_slot: Dict[str, float] = {}
+        self._robots: Dict[str, "asyncio.Future[Tuple[Optional[RobotFileParser], float]]"] = {}
+        self._site = ""
+
+    def _admit(self, url: str, depth: int) -> None:
+        if url in self._seen or self._admitted >= self.max_pages:
+            return
+        if posixpath.splitext(urlsplit(url).path)[1].lower() in SKIP_EXTENSIONS:
+            return
+        self._seen.add(url)
+        self._admitted += 1
+        self._frontier.put_nowait((url, depth))
+
+    async def _load_robots(self, origin: str) -> Tuple[Optional[RobotFileParser], float]:
+        try:
+            response = await http_client.get_client().get(f"{origin}/robots.txt", timeout=5)
+        except Exception:
+            return None, self.host_delay
+        if response.status_code != 200:
+            return None, self.host_delay
+        robots = RobotFileParser()
+        robots.parse(response.text.splitlines())
+        delay = robots.crawl_delay(CRAWL_USER_AGENT)
+        return robots, max(self.host_delay, float(delay or 0))
+
+    async def _politeness(self, url: str) -> Tuple[bool, float]:
+        """(allowed by robots.txt, delay between requests) for the URL's host"""
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        if origin not in self._robots:
+            self._robots[origin] = asyncio.ensure_future(self._load_robots(origin))
+        robots, delay = await self._robots[origin]
+        return (robots is None or robots.can_fetch(CRAWL_USER_AGENT, url)), delay
+
+    async def _wait_for_host(self, url: str, delay: float) -> None:
+        host = urlsplit(url).netloc
+        now = time.monotonic()
+        slot = max(now, self._next_slot.get(host, now))
+        self._next_slot[host] = slot + delay
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def _worker(self) -> None:
+        while True:
+            url, depth = await self._frontier.get()
+            started = time.perf_counter()
+            allowed, delay = await self._politeness(url)
+            if not allowed:
+                self._results.put_nowait({"status": "skipped", "url": url, "depth": depth, "reason": "disallowed by robots.txt"})
+                continue
+            await self._wait_for_host(url, delay)
+            try:
+                result = await self.fetch(url)
+            except Exception as e:
+                result = {"status": "error", "url": url, "error": f"Scrape failed: {str(e)}"}
+            else:
+                if depth < self.max_depth:
+                    base = result.get("final_url") or url
+                    for href in result.get("links") or []:
+                        link = normalize_url(href, base)
+                        if link and site_of(link) == self._site:
+                            self._admit(link, depth + 1)
+            self._results.put_nowait({
+                **result, "depth": depth, "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+            })
+
+    async def run(self, start_url: str) -> AsyncIterator[Dict]:
+        """
+        Crawl from start_url, yielding page results as they finish and a
+        final summary dict ({"done": True, ...})
+        """
+        start = normalize_url(start_url)
+        if start is None:
+            raise ValueError(f"Not a crawlable URL: {start_url}")
+        self._site = site_of(start)
+        self._admit(start, 0)
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        workers = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        emitted = errors = 0
+        stopped = "complete"
+        try:
+            while emitted < self._admitted:
+                remaining = started + self.deadline - loop.time()
+                try:
+                    result = await asyncio.wait_for(self._results.get(), timeout=max(remaining, 0))
+                except asyncio.TimeoutError:
+                    stopped = "deadline"
+                    break
+                emitted += 1
+                errors += result["status"] == "error"
+                yield result
+            else:
+                if self._admitted >= self.max_pages:
+                    stopped = "page_budget"
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+        yield {
+            "done": True,
+            "pages": emitted,
+            "errors": errors,
+            "unfinished": self._admitted - emitted,
+            "stopped": stopped,
+            "elapsed_ms": round((loop.time() - started) * 1000, 1)
+        }
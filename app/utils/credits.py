@@ -0,0 +1,277 @@
+"""Prepaid credit accounts: one on-chain deposit, then many calls debited locally"""
+import hashlib
+import hmac
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+from eth_account import Account
+from eth_account.messages import encode_defunct
+from app.utils.executor import run_blocking
+from app.utils.payment_ledger import track_claim
+
+load_dotenv()
+
+# Local to this machine, like the payment ledger: run a single app instance
+CREDITS_DB = os.getenv("CREDITS_DB", ".cache/credits.sqlite3")
+# Credentials travel in PAYMENT-SIGNATURE like a tx hash; the prefix tells them apart
+CREDIT_KEY_PREFIX = "credit_"
+# Balances below this (USD) are flagged as low in balance responses
+CREDIT_LOW_BALANCE = float(os.getenv("CREDIT_LOW_BALANCE", "0.50"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    id TEXT PRIMARY KEY,
+    key_hash TEXT NOT NULL,
+    balance INTEGER NOT NULL DEFAULT 0,
+    deposited INTEGER NOT NULL DEFAULT 0,
+    calls INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    last_used REAL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    account_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    service TEXT,
+    amount INTEGER NOT NULL,
+    tx_hash TEXT,
+    at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_account ON entries (account_id, at);
+"""
+
+
+def is_credit_key(value: Optional[str]) -> bool:
+    return isinstance(value, str) and value.startswith(CREDIT_KEY_PREFIX)
+
+
+def deposit_message(tx_hash: str, account_id: Optional[str] = None) -> str:
+    """Text the transfer's sender signs (personal_sign) to credit it to an account ("new" opens one)"""
+    return f"Deposit {tx_hash.lower()} to agent-hub credit account {account_id or 'new'}"
+
+
+def deposit_signer(tx_hash: str, account_id: Optional[str], signature: str) -> Optional[str]:
+    """Lowercase address that signed deposit_message(tx_hash, account_id), None if unreadable"""
+    try:
+        signer = Account.recover_message(encode_defunct(text=deposit_message(tx_hash, account_id)), signature=signature)
+    except Exception:
+        return None
+    return signer.lower()
+
+
+def _hash_secret(secret: str) -> str:
+    return hashlib.sha256(secret.encode()).hexdigest()
+
+
+def _split_key(key: str):
+    """(account_id, secret) from "credit_<account_id>.<secret>", or None"""
+    account_id, _, secret = key[len(CREDIT_KEY_PREFIX):].partition(".")
+    if not account_id or not secret:
+        return None
+    return account_id, secret
+
+
+class CreditStore:
+    """SQLite accounts and their deposit/debit entries; use via the "disk" pool"""
+
+    def __init__(self, path: str = CREDITS_DB):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def create(self, account_id: str, key_hash: str) -> None:
+        with self._lock:
+            self._connect().execute(
+                "INSERT INTO accounts (id, key_hash, created) VALUES (?, ?, ?)", (account_id, key_hash, time.time())
+            )
+
+    def get(self, account_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connect().execute("SELECT * FROM accounts WHERE id = ?", (account_id,)).fetchone()
+        return dict(row) if row else None
+
+    def change(self, account_id: str, amount: int, kind: str, service: Optional[str] = None,
+               tx_hash: Optional[str] = None) -> Optional[int]:
+        """
+        Add amount (negative to debit) to a balance and record the entry in
+        one transaction; a debit larger than the balance changes nothing.
+
+        Returns:
+            New balance, or None if the account is missing or short
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                updated = conn.execute(
+                    "UPDATE accounts SET balance = balance + ?, "
+                    "deposited = deposited + MAX(?, 0) * (? = 'deposit'), "
+                    "calls = calls + (? = 'debit'), last_used = ? "
+                    "WHERE id = ? AND balance + ? >= 0",
+                    (amount, amount, kind, kind, now, account_id, amount)
+                ).rowcount
+                if not updated:
+                    conn.execute("ROLLBACK")
+                    return None
+                conn.execute(
+                    "INSERT INTO entries (account_id, kind, service, amount, tx_hash, at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (account_id, kind, service, amount, tx_hash, now)
+                )
+                balance = conn.execute("SELECT balance FROM accounts WHERE id = ?", (account_id,)).fetchone()[0]
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return balance
+
+    def entries(self, account_id: str, limit: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT kind, service, amount, tx_hash, at FROM entries WHERE account_id = ? ORDER BY at DESC LIMIT ?",
+                (account_id, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class CreditAccounts:
+    """
+    Prepaid balances debited per call against PRICING
+
+    A deposit redeems a whole on-chain transfer once (through the payment
+    ledger) and credits its value to an account; the caller proves it sent
+    the transfer by signing deposit_message() with the sending wallet. The account's credential
+    then goes in PAYMENT-SIGNATURE in place of a tx hash; each call costs a
+    hash comparison and one local UPDATE, with no chain access at all.
+    """
+
+    def __init__(self, store: Optional[CreditStore] = None):
+        self.store = store or CreditStore()
+        # account_id -> key hash, so credential checks skip the database
+        self._keys: Dict[str, str] = {}
+        self._stats = {"deposits": 0, "debits": 0, "low_balance": 0, "invalid_keys": 0, "refunds": 0}
+
+    async def authenticate(self, key: str) -> Optional[str]:
+        """Account id for a valid credential, else None"""
+        parts = _split_key(key) if is_credit_key(key) else None
+        if parts is None:
+            return None
+        account_id, secret = parts
+        key_hash = self._keys.get(account_id)
+        if key_hash is None:
+            account = await run_blocking("disk", self.store.get, account_id)
+            if account is None:
+                return None
+            key_hash = self._keys[account_id] = account["key_hash"]
+        if not hmac.compare_digest(key_hash, _hash_secret(secret)):
+            return None
+        return account_id
+
+    async def deposit(self, value_usd: float, tx_hash: str, account_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Credit a verified transfer to an account
+
+        Args:
+            value_usd: Amount redeemed from the transfer
+            tx_hash: The transfer, recorded with the entry
+            account_id: Authenticated account to top up; a new account (and
+                credential) is created when omitted
+
+        Returns:
+            {"account_id", "balance_usd", "deposited_usd"}, plus "credit_key"
+            for a new account
+        """
+        result: Dict[str, Any] = {}
+        if account_id is None:
+            account_id, secret = secrets.token_hex(8), secrets.token_urlsafe(24)
+            await run_blocking("disk", self.store.create, account_id, _hash_secret(secret))
+            self._keys[account_id] = _hash_secret(secret)
+            # Shown once: only the hash is stored
+            result["credit_key"] = f"{CREDIT_KEY_PREFIX}{account_id}.{secret}"
+        amount = round(value_usd * 1_000_000)
+        balance = await run_blocking("disk", self.store.change, account_id, amount, "deposit", None, tx_hash)
+        self._stats["deposits"] += 1
+        return {"account_id": account_id, "balance_usd": balance / 1_000_000, "deposited_usd": value_usd, **result}
+
+    async def debit(self, key: str, service: str, amount_usd: float) -> Dict[str, Any]:
+        """
+        Charge one call to the account behind a credential
+
+        Returns:
+            {"ok": True, "account_id", "charged_usd", "balance_usd"} or
+            {"ok": False, "reason": "invalid_key" | "low_balance", ...}
+        """
+        account_id = await self.authenticate(key)
+        if account_id is None:
+            self._stats["invalid_keys"] += 1
+            return {"ok": False, "reason": "invalid_key"}
+        amount = round(amount_usd * 1_000_000)
+        balance = await run_blocking("disk", self.store.change, account_id, -amount, "debit", service)
+        if balance is None:
+            self._stats["low_balance"] += 1
+            account = await run_blocking("disk", self.store.get, account_id)
+            return {"ok": False, "reason": "low_balance", "account_id": account_id,
+                    "balance_usd": account["balance"] / 1_000_000}
+        self._stats["debits"] += 1
+        claim = {"ok": True, "account_id": account_id, "service": service,
+                 "charged_usd": amount_usd, "balance_usd": balance / 1_000_000}
+        track_claim(self, claim)
+        return claim
+
+    async def refund(self, claim: Dict[str, Any]) -> None:
+        """Put a debit back on the balance (the call it paid for failed)"""
+        amount = round(claim["charged_usd"] * 1_000_000)
+        await run_blocking("disk", self.store.change, claim["account_id"], amount, "refund", claim["service"])
+        self._stats["refunds"] += 1
+
+    async def balance(self, key: str, history: int = 20) -> Optional[Dict[str, Any]]:
+        """Balance and recent entries for a credential, None if it is invalid"""
+        account_id = await self.authenticate(key)
+        if account_id is None:
+            self._stats["invalid_keys"] += 1
+            return None
+        account = await run_blocking("disk", self.store.get, account_id)
+        entries = await run_blocking("disk", self.store.entries, account_id, history)
+        return {
+            "account_id": account_id,
+            "balance_usd": account["balance"] / 1_000_000,
+            "deposited_usd": account["deposited"] / 1_000_000,
+            "calls": account["calls"],
+            "low_balance": account["balance"] < CREDIT_LOW_BALANCE * 1_000_000,
+            "recent": [
+                {"kind": entry["kind"], "service": entry["service"], "amount_usd": entry["amount"] / 1_000_000,
+                 "tx_hash": entry["tx_hash"], "at": entry["at"]}
+                for entry in entries
+            ]
+        }
+
+    async def close(self) -> None:
+        await run_blocking("disk", self.store.close)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for the metrics endpoint"""
+        return {**self._stats, "cached_keys": len(self._keys)}
+
+
+credit_accounts = CreditAccounts()
@@ -0,0 +1,101 @@
+"""Bounded per-dependency thread pools (and a process pool) for blocking work"""
+import asyncio
+import functools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# One pool per upstream dependency, so a backlog of slow Gemini calls can never
+# starve DuckDuckGo searches or payment lookups (and vice versa).
+POOL_SIZES = {
+    "gemini": int(os.getenv("GEMINI_POOL_SIZE", "8")),
+    "search": int(os.getenv("SEARCH_POOL_SIZE", "4")),
+    "web3": int(os.getenv("WEB3_POOL_SIZE", "4")),
+    "parse": int(os.getenv("PARSE_POOL_SIZE", "2")),
+    "disk": int(os.getenv("DISK_POOL_SIZE", "2")),
+    "default": int(os.getenv("DEFAULT_POOL_SIZE", "4")),
+}
+
+# CPU-bound work (HTML parsing) runs in worker processes so it cannot hold the
+# GIL against the event loop. Each worker costs ~30 MB, hence the small default;
+# 0 falls back to the "parse" thread pool.
+PARSE_PROCESSES = int(os.getenv("PARSE_PROCESSES", "1"))
+
+_pools: Dict[str, ThreadPoolExecutor] = {}
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_pool(name: str) -> ThreadPoolExecutor:
+    """Return the thread pool for a dependency, creating it on first use"""
+    pool = _pools.get(name)
+    if pool is None:
+        size = POOL_SIZES.get(name, POOL_SIZES["default"])
+        pool = ThreadPoolExecutor(max_workers=size, thread_name_prefix=f"agenthub-{name}")
+        _pools[name] = pool
+    return pool
+
+
+async def run_blocking(pool: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run a synchronous call on the named pool without blocking the event loop
+
+    Args:
+        pool: Dependency pool name ("gemini", "search", "web3", ...)
+        fn: Blocking callable
+        *args, **kwargs: Arguments forwarded to fn
+
+    Returns:
+        Whatever fn returns (exceptions are re-raised in the caller)
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_pool(pool), functools.partial(fn, *args, **kwargs))
+
+
+def get_process_pool() -> Optional[ProcessPoolExecutor]:
+    """Return the worker process pool, or None when PARSE_PROCESSES is 0"""
+    global _process_pool
+    if PARSE_PROCESSES <= 0:
+        return None
+    if _process_pool is None:
+        # spawn, not fork: forking a process that runs an event loop and
+        # thread pools can deadlock the child
+        _process_pool = ProcessPoolExecutor(
+            max_workers=PARSE_PROCESSES, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _process_pool
+
+
+async def run_in_process(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run a picklable, CPU-bound top-level function in the worker process pool
+
+    Falls back to the "parse" thread pool when processes are disabled or the
+    pool has broken (e.g. a worker was OOM-killed).
+    """
+    global _process_pool
+    pool = get_process_pool()
+    if pool is None:
+        return await run_blocking("parse", fn, *args, **kwargs)
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(pool, functools.partial(fn, *args, **kwargs))
+    except BrokenProcessPool:
+        _process_pool = None
+        return await run_blocking("parse", fn, *args, **kwargs)
+
+
+def shutdown_pools(wait: bool = False) -> None:
+    """Stop all pools (called from the application lifespan)"""
+    global _process_pool
+    for pool in _pools.values():
+        pool.shutdown(wait=wait, cancel_futures=True)
+    _pools.clear()
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=wait, cancel_futures=True)
+        _process_pool = None
@@ -0,0 +1,104 @@
+"""Bounded concurrent fan-out that yields results as they complete"""
+import asyncio
+import random
+import time
+from collections import defaultdict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+async def as_completed_bounded(
+    items: Iterable[T],
+    worker: Callable[[T], Awaitable[Any]],
+    limit: int,
+    key: Optional[Callable[[T], str]] = None,
+    per_key_limit: int = 0
+) -> AsyncIterator[Any]:
+    """
+    Run worker(item) for every item, at most `limit` at a time and at most
+    `per_key_limit` at a time for items sharing key(item) (e.g. a host)
+
+    Results are yielded in completion order; a worker exception is re-raised
+    from the iterator. Closing the iterator early (a client disconnecting
+    from a stream) cancels everything still pending.
+
+    Args:
+        items: Work items
+        worker: Async callable run once per item
+        limit: Global concurrency cap
+        key: Groups items for the per-key cap
+        per_key_limit: Concurrency cap per key; 0 disables it
+    """
+    global_slots = asyncio.Semaphore(max(1, limit))
+    key_slots = defaultdict(lambda: asyncio.Semaphore(per_key_limit))
+    done: asyncio.Queue = asyncio.Queue()
+
+    async def run(item: T) -> Any:
+        # Wait for the per-key slot first so a busy host never holds a global slot
+        slot = key_slots[key(item)] if key is not None and per_key_limit > 0 else None
+        if slot is not None:
+            await slot.acquire()
+        try:
+            async with global_slots:
+                return await worker(item)
+        finally:
+            if slot is not None:
+                slot.release()
+
+    tasks = []
+    for item in items:
+        task = asyncio.ensure_future(run(item))
+        task.add_done_callback(done.put_nowait)
+        tasks.append(task)
+
+    try:
+        for _ in range(len(tasks)):
+            finished = await done.get()
+            yield finished.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def fan_out(
+    items: Iterable[T],
+    worker: Callable[[T], Awaitable[Any]],
+    limit: int,
+    retries: int = 1,
+    backoff: float = 0.5
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    as_completed_bounded() where each item is retried on its own and a
+    failure never aborts the others
+
+    Yields one outcome per item as it finishes: {"index", "item", "status"
+    ("success" or "error"), "result" or "error", "attempts", "latency_ms"},
+    where latency covers all attempts but not time spent queued.
+    """
+    async def attempt(entry):
+        index, item = entry
+        started = time.perf_counter()
+        for attempt_no in range(1, retries + 2):
+            try:
+                result = await worker(item)
+                outcome = {"status": "success", "result": result}
+                break
+            except Exception as e:
+                outcome = {"status": "error", "error": str(e)}
+                if attempt_no <= retries:
+                    await asyncio.sleep(backoff * attempt_no * random.uniform(0.5, 1.5))
+        return {
+            "index": index,
+            "item": item,
+            **outcome,
+            "attempts": attempt_no,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
+
+    outcomes = as_completed_bounded(enumerate(items), attempt, limit)
+    try:
+        async for outcome in outcomes:
+            yield outcome
+    finally:
+        await outcomes.aclose()  # cancel pieces still running if the consumer stops early
@@ -0,0 +1,119 @@
+"""Byte-capped streaming page fetch for URL-consuming services"""
+import codecs
+import os
+import re
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+from app.utils import http_client
+
+load_dotenv()
+
+# Nothing downstream keeps more than a few thousand characters of a page, so
+# there is no point buffering (and decoding, and parsing) more than this.
+PAGE_MAX_BYTES = int(os.getenv("PAGE_MAX_BYTES", str(1024 * 1024)))
+
+TEXT_CONTENT_TYPES = {"text/html", "application/xhtml+xml", "text/plain"}
+
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([a-zA-Z0-9_.:-]+)""", re.IGNORECASE)
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+
+def _valid_encoding(name: Optional[str]) -> Optional[str]:
+    if not name:
+        return None
+    try:
+        return codecs.lookup(name.strip().strip("\"'")).name
+    except LookupError:
+        return None
+
+
+def detect_charset(content_type: str, head: bytes) -> str:
+    """
+    Pick the charset for a page from its Content-Type header, BOM or
+    <meta charset> in the first chunk, falling back to UTF-8
+    """
+    for param in content_type.split(";")[1:]:
+        key, _, value = param.partition("=")
+        if key.strip().lower() == "charset":
+            encoding = _valid_encoding(value)
+            if encoding:
+                return encoding
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding
+    match = _META_CHARSET.search(head[:4096])
+    if match:
+        encoding = _valid_encoding(match.group(1).decode("ascii", "ignore"))
+        if encoding:
+            return encoding
+    return "utf-8"
+
+
+async def fetch_page(
+    url: str,
+    max_bytes: int = PAGE_MAX_BYTES,
+    timeout: float = 15,
+    headers: Optional[Dict[str, str]] = None,
+    raise_for_status: bool = False
+) -> Dict:
+    """
+    Stream a page and stop reading once max_bytes have been received
+
+    Args:
+        url: Page URL
+        max_bytes: Byte budget for the (decompressed) body
+        timeout: Request timeout in seconds
+        headers: Extra request headers
+        raise_for_status: Raise httpx.HTTPStatusError on 4xx/5xx (a 304 answer
+            to a conditional request is returned as-is)
+
+    Returns:
+        Dict with the decoded text plus url, status_code, content_type,
+        encoding, bytes_read, truncated and skipped (reason or None)
+    """
+    client = http_client.get_client()
+    async with client.stream("GET", url, timeout=timeout, headers=headers) as response:
+        if raise_for_status and response.status_code != 304:
+            response.raise_for_status()
+
+        content_type = response.headers.get("content-type", "")
+        mime = content_type.split(";")[0].strip().lower()
+        page = {
+            "url": str(response.url),
+            "status_code": response.status_code,
+            "headers": dict(response.headers),
+            "content_type": mime,
+            "encoding": None,
+            "text": "",
+            "bytes_read": 0,
+            "truncated": False,
+            "skipped": None
+        }
+
+        # Decide from the headers alone, before a single body byte is read
+        if mime and mime not in TEXT_CONTENT_TYPES:
+            page["skipped"] = f"unsupported content type: {mime}"
+            return page
+
+        chunks = []
+        size = 0
+        async for chunk in response.aiter_bytes():
+            remaining = max_bytes - size
+            if len(chunk) > remaining:
+                chunks.append(chunk[:remaining])
+                size = max_bytes
+                page["truncated"] = True
+                break
+            chunks.append(chunk)
+            size += len(chunk)
+
+    body = b"".join(chunks)
+    page["encoding"] = detect_charset(content_type, body[:4096])
+    page["text"] = body.decode(page["encoding"], errors="replace")
+    page["bytes_read"] = size
+    return page
@@ -0,0 +1,226 @@
+"""Selective single-pass HTML extraction with an lxml fast path"""
+import os
+import re
+from html.parser import HTMLParser
+from typing import Dict, Iterable, List, Optional
+
+from dotenv import load_dotenv
+from app.utils.executor import run_in_process
+from app.utils.readability import BLOCK_TAGS, BlockBuilder, estimate_tokens, select_main_content
+from app.utils.structured_data import StructuredCollector, collect_lxml
+
+load_dotenv()
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:  # pure-Python fallback below
+    lxml_html = None
+
+# Pages up to this size parse inline; the IPC round trip costs more than the parse
+PARSE_INLINE_BYTES = int(os.getenv("PARSE_INLINE_BYTES", "32768"))
+
+ALL_FIELDS = ("title", "description", "h1s", "links", "images", "text", "main_text", "structured")
+
+SKIP_TAGS = {"script", "style", "noscript", "template"}
+
+_SPACES = re.compile(r"[ \t\r\f\v\xa0]+")
+_NEWLINES = re.compile(r"\s*\n\s*")
+
+
+def _clean_text(text: str, limit: int) -> str:
+    text = _NEWLINES.sub("\n", _SPACES.sub(" ", text)).strip()
+    return text[:limit]
+
+
+def _main_text_result(builder: BlockBuilder, max_text: int) -> Dict:
+    main_text = select_main_content(builder.close())[:max_text]
+    return {"main_text": main_text, "main_text_tokens": estimate_tokens(main_text)}
+
+
+def _main_text_lxml(root, max_text: int) -> Dict:
+    builder = BlockBuilder()
+    for event, element in etree.iterwalk(root, events=("start", "end")):
+        if not isinstance(element.tag, str):  # comments, processing instructions
+            if event == "end" and element.tail:
+                builder.data(element.tail)
+            continue
+        if event == "start":
+            builder.start(element.tag, element.attrib)
+            if element.text:
+                builder.data(element.text)
+        else:
+            builder.end(element.tag)
+            if element.tail and element is not root:
+                builder.data(element.tail)
+    return _main_text_result(builder, max_text)
+
+
+def _parse_lxml(html: str, fields: Iterable[str], max_text: int, max_links: int, max_images: int) -> Dict:
+    parser = lxml_html.HTMLParser(encoding="utf-8")
+    root = lxml_html.document_fromstring(html.encode("utf-8", "replace"), parser=parser)
+    result: Dict = {}
+
+    if "title" in fields:
+        title = root.findtext(".//title")
+        result["title"] = title.strip() if title else None
+    if "description" in fields:
+        content = root.xpath('//meta[translate(@name, "DESCRIPTION", "description")="description"]/@content')
+        result["description"] = content[0].strip() if content else ""
+    if "h1s" in fields:
+        result["h1s"] = [h.text_content().strip() for h in root.iter("h1")]
+    if "links" in fields:
+        result["links"] = [str(href) for href in root.xpath("//a/@href")[:max_links]]
+    if "images" in fields:
+        result["images"] = [str(src) for src in root.xpath("//img/@src")[:max_images]]
+    if "structured" in fields:
+        result["structured"] = collect_lxml(root)
+    if "text" in fields or "main_text" in fields:
+        etree.strip_elements(root, *SKIP_TAGS, with_tail=False)
+    if "main_text" in fields:
+        result.update(_main_text_lxml(root, max_text))
+    if "text" in fields:
+        for element in root.iter(*BLOCK_TAGS):
+            element.tail = "\n" + (element.tail or "")
+        result["text"] = _clean_text(root.text_content(), max_text)
+    return result
+
+
+class _Extractor(HTMLParser):
+    """Event-driven fallback that collects only the requested fields"""
+
+    def __init__(self, fields: Iterable[str], max_links: int, max_images: int):
+        super().__init__(convert_charrefs=True)
+        self.fields = set(fields)
+        self.max_links = max_links
+        self.max_images = max_images
+        self.title: Optional[str] = None
+        self.description = ""
+        self.h1s: List[str] = []
+        self.links: List[str] = []
+        self.images: List[str] = []
+        self.text: List[str] = []
+        self.blocks = BlockBuilder() if "main_text" in self.fields else None
+        self.structured = StructuredCollector() if "structured" in self.fields else None
+        self._skip = 0
+        self._in_title = False
+        self._h1: Optional[List[str]] = None
+
+    def handle_starttag(self, tag, attrs):
+        if self.structured is not None:
+            self.structured.start(tag, dict(attrs))
+        if tag in SKIP_TAGS:
+            self._skip += 1
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append("\n")
+        if self.blocks is not None:
+            self.blocks.start(tag, dict(attrs))
+        if tag == "title" and self.title is None:
+            self._in_title = True
+            self.title = ""
+        elif tag == "h1" and "h1s" in self.fields:
+            self._h1 = []
+        elif tag == "a" and "links" in self.fields and len(self.links) < self.max_links:
+            href = dict(attrs).get("href")
+            if href is not None:
+                self.links.append(href)
+        elif tag == "img" and "images" in self.fields and len(self.images) < self.max_images:
+            src = dict(attrs).get("src")
+            if src is not None:
+                self.images.append(src)
+        elif tag == "meta" and "description" in self.fields and not self.description:
+            values = dict(attrs)
+            if (values.get("name") or "").lower() == "description":
+                self.description = (values.get("content") or "").strip()
+
+    def handle_endtag(self, tag):
+        if self.structured is not None:
+            self.structured.end(tag)
+        if tag in SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append("\n")
+        if self.blocks is not None:
+            self.blocks.end(tag)
+        if tag == "title":
+            self._in_title = False
+        elif tag == "h1" and self._h1 is not None:
+            self.h1s.append("".join(self._h1).strip())
+            self._h1 = None
+
+    def handle_data(self, data):
+        if self.structured is not None:
+            self.structured.data(data)
+        if self._skip:
+            return
+        if self._in_title:
+            self.title += data
+        if self._h1 is not None:
+            self._h1.append(data)
+        if self.blocks is not None:
+            self.blocks.data(data)
+        self.text.append(data)
+
+
+def _parse_stdlib(html: str, fields: Iterable[str], max_text: int, max_links: int, max_images: int) -> Dict:
+    extractor = _Extractor(fields, max_links, max_images)
+    extractor.feed(html)
+    extractor.close()
+    result: Dict = {}
+    if "title" in fields:
+        result["title"] = extractor.title.strip() if extractor.title else None
+    if "description" in fields:
+        result["description"] = extractor.description
+    if "h1s" in fields:
+        result["h1s"] = extractor.h1s
+    if "links" in fields:
+        result["links"] = extractor.links
+    if "images" in fields:
+        result["images"] = extractor.images
+    if "text" in fields:
+        result["text"] = _clean_text("".join(extractor.text), max_text)
+    if "main_text" in fields:
+        result.update(_main_text_result(extractor.blocks, max_text))
+    if "structured" in fields:
+        result["structured"] = extractor.structured.result()
+    return result
+
+
+def parse_html(
+    html: str,
+    fields: Iterable[str] = ALL_FIELDS,
+    max_text: int = 5000,
+    max_links: int = 50,
+    max_images: int = 20,
+    engine: Optional[str] = None
+) -> Dict:
+    """
+    Extract only the requested fields from a page in one parse
+
+    Args:
+        html: Decoded page source
+        fields: Any of title, description, h1s, links, images, text, main_text
+            (main_text also adds main_text_tokens), structured (JSON-LD,
+            OpenGraph, microdata and meta tags)
+        max_text: Character cap for visible/main text (script/style content excluded)
+        max_links: Cap on anchor hrefs returned
+        max_images: Cap on image srcs returned
+        engine: "lxml" or "stdlib"; defaults to lxml when installed
+
+    Returns:
+        Dict with one key per requested field
+    """
+    fields = tuple(fields)
+    engine = engine or ("lxml" if lxml_html is not None else "stdlib")
+    if engine == "lxml" and html.strip():
+        return _parse_lxml(html, fields, max_text, max_links, max_images)
+    return _parse_stdlib(html, fields, max_text, max_links, max_images)
+
+
+async def parse_page(html: str, fields: Iterable[str] = ALL_FIELDS, **limits) -> Dict:
+    """parse_html off the event loop: inline for small pages, process pool for large ones"""
+    if len(html) <= PARSE_INLINE_BYTES:
+        return parse_html(html, fields, **limits)
+    return await run_in_process(parse_html, html, tuple(fields), **limits)
@@ -0,0 +1,234 @@
+"""Application-lifetime outbound HTTP client with connection reuse"""
+import asyncio
+import importlib.util
+import ipaddress
+import os
+import socket
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import httpcore
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "64"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "32"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_PER_HOST_CONNECTIONS = int(os.getenv("HTTP_PER_HOST_CONNECTIONS", "6"))
+DNS_CACHE_TTL = float(os.getenv("DNS_CACHE_TTL", "300"))
+# HTTP/2 needs the optional h2 package (pip install httpx[http2])
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true" and importlib.util.find_spec("h2") is not None
+
+DEFAULT_TIMEOUT = httpx.Timeout(15.0, connect=5.0)
+
+
+class DNSCachingBackend(httpcore.AsyncNetworkBackend):
+    """
+    Network backend that resolves each host once per DNS_CACHE_TTL
+
+    Only the TCP connect target is replaced by the cached address; TLS still
+    uses the original hostname for SNI and certificate checks.
+    """
+
+    def __init__(self, backend: httpcore.AsyncNetworkBackend, ttl: float = DNS_CACHE_TTL):
+        self._backend = backend
+        self._ttl = ttl
+        self._cache: Dict[Tuple[str, int], Tuple[float, str]] = {}
+        self.lookups = 0
+        self.hits = 0
+
+    async def _resolve(self, host: str, port: int) -> str:
+        try:
+            ipaddress.ip_address(host)
+            return host
+        except ValueError:
+            pass
+        cached = self._cache.get((host, port))
+        if cached and cached[0] > time.monotonic():
+            self.hits += 1
+            return cached[1]
+        self.lookups += 1
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        address = infos[0][4][0]
+        self._cache[(host, port)] = (time.monotonic() + self._ttl, address)
+        return address
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        address = await self._resolve(host, port)
+        try:
+            return await self._backend.connect_tcp(
+                address, port, timeout=timeout, local_address=local_address, socket_options=socket_options
+            )
+        except (httpcore.ConnectError, httpcore.ConnectTimeout):
+            # The cached address may be stale; resolve again next time
+            self._cache.pop((host, port), None)
+            raise
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self._backend.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds: float) -> None:
+        await self._backend.sleep(seconds)
+
+
+def is_public_address(address: str) -> bool:
+    """False for loopback, private, link-local (metadata), multicast and reserved addresses"""
+    ip = ipaddress.ip_address(address.split("%")[0])
+    return not (ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_multicast
+                or ip.is_reserved or ip.is_unspecified)
+
+
+class PublicOnlyBackend(httpcore.AsyncNetworkBackend):
+    """
+    Network backend for URLs supplied by callers (webhooks)
+
+    Resolves the host on every connect and refuses it unless every address
+    is public, then connects to the address it checked, so a host cannot
+    pass an earlier check and rebind to an internal address for the connect.
+    """
+
+    def __init__(self, backend: httpcore.AsyncNetworkBackend, resolve: Optional[Callable[..., Any]] = None):
+        self._backend = backend
+        self._resolve = resolve
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        resolve = self._resolve or asyncio.get_running_loop().getaddrinfo
+        try:
+            infos = await resolve(host, port, type=socket.SOCK_STREAM)
+        except OSError as e:
+            raise httpcore.ConnectError(f"{host} does not resolve: {e}")
+        addresses = [info[4][0] for info in infos]
+        if not addresses or not all(is_public_address(address) for address in addresses):
+            raise httpcore.ConnectError(f"{host} resolves to a non-public address")
+        return await self._backend.connect_tcp(
+            addresses[0], port, timeout=timeout, local_address=local_address, socket_options=socket_options
+        )
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        raise httpcore.ConnectError("Unix sockets are not allowed")
+
+    async def sleep(self, seconds: float) -> None:
+        await self._backend.sleep(seconds)
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response stream that frees its per-host slot once the body is closed"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._release is not None:
+                self._release()
+                self._release = None
+
+
+class HostLimitedTransport(httpx.AsyncBaseTransport):
+    """Caps concurrent requests per host so one slow site cannot take the whole pool"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, per_host: int = HTTP_PER_HOST_CONNECTIONS):
+        self._transport = transport
+        self._per_host = per_host
+        self._hosts: Dict[str, list] = {}  # host -> [semaphore, holders]
+
+    def _release(self, host: str) -> None:
+        entry = self._hosts[host]
+        entry[0].release()
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._hosts[host]
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        entry = self._hosts.setdefault(host, [asyncio.Semaphore(self._per_host), 0])
+        entry[1] += 1
+        try:
+            await entry[0].acquire()
+        except BaseException:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._hosts[host]
+            raise
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            self._release(host)
+            raise
+        response.stream = _ReleasingStream(response.stream, lambda: self._release(host))
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def create_client(public_only: bool = False, **overrides: Any) -> httpx.AsyncClient:
+    """
+    Build a pooled AsyncClient with the tuned limits, DNS cache and per-host caps
+
+    With public_only (caller-supplied URLs) there is no DNS cache: every
+    connect goes through PublicOnlyBackend, and redirects are not followed.
+    Keyword overrides are passed to httpx (e.g. verify=... for local stand-ins).
+    """
+    verify = overrides.pop("verify", True)
+    transport = httpx.AsyncHTTPTransport(
+        verify=verify,
+        http2=HTTP2_ENABLED,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+        ),
+        retries=1
+    )
+    pool = getattr(transport, "_pool", None)
+    if pool is not None and hasattr(pool, "_network_backend"):
+        wrapper = PublicOnlyBackend if public_only else DNSCachingBackend
+        pool._network_backend = wrapper(pool._network_backend)
+    elif public_only:
+        raise RuntimeError("httpx transport has no network backend to restrict to public addresses")
+    options = {"timeout": DEFAULT_TIMEOUT, "follow_redirects": not public_only, **overrides}
+    return httpx.AsyncClient(transport=HostLimitedTransport(transport), **options)
+
+
+_client: Optional[httpx.AsyncClient] = None
+_webhook_client: Optional[httpx.AsyncClient] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Shared client for every outbound call (created lazily outside the app lifespan)"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = create_client()
+    return _client
+
+
+def get_webhook_client() -> httpx.AsyncClient:
+    """Client for caller-supplied URLs: public addresses only, no redirects"""
+    global _webhook_client
+    if _webhook_client is None or _webhook_client.is_closed:
+        _webhook_client = create_client(public_only=True)
+    return _webhook_client
+
+
+async def start() -> None:
+    get_client()
+
+
+async def close() -> None:
+    global _client, _webhook_client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    if _webhook_client is not None:
+        await _webhook_client.aclose()
+        _webhook_client = None
@@ -0,0 +1,218 @@
+"""Idempotent replay of paid POST requests (Idempotency-Key, or the payment tx hash)"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from app.utils.credits import CREDIT_KEY_PREFIX
+from app.utils.receipts import RECEIPT_PREFIX
+
+load_dotenv()
+
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", str(24 * 3600)))
+IDEMPOTENCY_MAX_BYTES = int(os.getenv("IDEMPOTENCY_MAX_BYTES", str(16 * 1024 * 1024)))
+# Seconds a retry waits for the original call before giving up with 409
+IDEMPOTENCY_WAIT = float(os.getenv("IDEMPOTENCY_WAIT", "300"))
+IDEMPOTENCY_PATH_PREFIX = os.getenv("IDEMPOTENCY_PATH_PREFIX", "/agent/")
+
+# Streamed responses are relayed as they are produced and never stored
+STREAMING_TYPES = (b"text/event-stream", b"application/x-ndjson")
+
+
+class IdempotencyStore:
+    """
+    Finished responses by idempotency key, plus the calls still in flight
+
+    Entries are bounded by total body size (least recently used go first)
+    and expire after the TTL.
+    """
+
+    def __init__(self, ttl: int = IDEMPOTENCY_TTL, max_bytes: int = IDEMPOTENCY_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        # key -> (expires_at, fingerprint, status, headers, body)
+        self._entries: "OrderedDict[str, Tuple[float, str, int, List[Tuple[bytes, bytes]], bytes]]" = OrderedDict()
+        self._inflight: Dict[str, Tuple[str, asyncio.Event]] = {}
+        self._bytes = 0
+        self._stats = {"stored": 0, "replayed": 0, "waited": 0, "conflicts": 0, "evictions": 0}
+
+    def get(self, key: str) -> Optional[Tuple[float, str, int, List[Tuple[bytes, bytes]], bytes]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: str, fingerprint: str, status: int, headers: List[Tuple[bytes, bytes]], body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.time() + self.ttl, fingerprint, status, headers, body)
+        self._bytes += len(body)
+        self._stats["stored"] += 1
+        while self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self._stats["evictions"] += 1
+
+    def _remove(self, key: str) -> None:
+        self._bytes -= len(self._entries.pop(key)[4])
+
+    def running(self, key: str) -> Optional[Tuple[str, asyncio.Event]]:
+        """(fingerprint, done event) of the call in flight for a key, if any"""
+        return self._inflight.get(key)
+
+    def begin(self, key: str, fingerprint: str) -> asyncio.Event:
+        done = asyncio.Event()
+        self._inflight[key] = (fingerprint, done)
+        return done
+
+    def end(self, key: str) -> None:
+        self._inflight.pop(key)[1].set()
+
+    def count(self, event: str) -> None:
+        self._stats[event] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for the metrics endpoint"""
+        return {**self._stats, "entries": len(self._entries), "in_flight": len(self._inflight), "bytes": self._bytes}
+
+
+def _json_response(status: int, detail: str) -> Tuple[int, List[Tuple[bytes, bytes]], bytes]:
+    body = json.dumps({"detail": detail}).encode()
+    return status, [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())], body
+
+
+class IdempotencyMiddleware:
+    """
+    ASGI middleware: a POST under IDEMPOTENCY_PATH_PREFIX carrying an
+    Idempotency-Key (or, failing that, a PAYMENT-SIGNATURE) runs at most
+    once per key
+
+    A retry after the call finished gets the stored response back, marked
+    Idempotent-Replayed, with no payment check or upstream work; a retry
+    that arrives while the call is still running waits for it. Only 2xx
+    responses are stored, so a failed call can be retried for real.
+
+    Explicit keys are scoped to the payment credential that sent them, so
+    clients cannot collide on (or read) each other's keys. The tx-hash
+    fallback covers raw tx hashes only, and its response is stored only
+    when paid_in_full(tx) says this one call spent the whole transfer: a tx
+    with value left, a receipt or a credit key pays again for a repeated
+    call unless the client sends an explicit key.
+
+    The fingerprint covers the path, body and payment signature: reusing an
+    explicit key for a different request is a 422, and with the tx-hash
+    fallback different requests simply get different keys.
+    """
+
+    def __init__(
+        self, app, store: Optional[IdempotencyStore] = None,
+        paid_in_full: Optional[Callable[[str], Awaitable[bool]]] = None
+    ):
+        self.app = app
+        self.store = store or IdempotencyStore()
+        self.paid_in_full = paid_in_full
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].startswith(IDEMPOTENCY_PATH_PREFIX):
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        explicit = headers.get(b"idempotency-key", b"").decode("latin-1").strip()
+        payment = headers.get(b"payment-signature", b"").decode("latin-1").strip()
+        if not explicit and (not payment or payment.startswith((CREDIT_KEY_PREFIX, RECEIPT_PREFIX))):
+            # Credit keys and receipts pay for every call they send: repeats are new calls, not retries
+            return await self.app(scope, receive, send)
+
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                return  # client went away before sending the body
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        body = b"".join(chunks)
+        fingerprint = hashlib.sha256(
+            b"\0".join([scope["path"].encode(), scope.get("query_string", b""), payment.encode(), body])
+        ).hexdigest()
+        if explicit:
+            key = f"key:{hashlib.sha256(payment.encode()).hexdigest()}:{explicit}"
+        else:
+            key = f"tx:{payment}:{fingerprint}"
+
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT
+        while True:
+            entry = self.store.get(key)
+            if entry is not None:
+                if entry[1] != fingerprint:
+                    self.store.count("conflicts")
+                    return await self._send(send, *_json_response(422, "Idempotency-Key was already used for a different request"))
+                self.store.count("replayed")
+                return await self._send(send, entry[2], entry[3] + [(b"idempotent-replayed", b"true")], entry[4])
+
+            inflight = self.store.running(key)
+            if inflight is None:
+                break
+            if inflight[0] != fingerprint:
+                self.store.count("conflicts")
+                return await self._send(send, *_json_response(422, "Idempotency-Key was already used for a different request"))
+            self.store.count("waited")
+            try:
+                await asyncio.wait_for(inflight[1].wait(), timeout=max(deadline - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                return await self._send(send, *_json_response(409, "The original request with this key is still running"))
+            # Nothing stored (it failed or streamed): loop and run it ourselves, one waiter at a time
+
+        self.store.begin(key, fingerprint)
+        captured = {"status": 0, "headers": [], "body": [], "streaming": False}
+        replayed_body = False
+
+        async def replay_receive():
+            nonlocal replayed_body
+            if not replayed_body:
+                replayed_body = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                captured["status"] = message["status"]
+                captured["headers"] = list(message.get("headers", []))
+                content_type = dict(captured["headers"]).get(b"content-type", b"")
+                captured["streaming"] = content_type.startswith(STREAMING_TYPES)
+            elif message["type"] == "http.response.body" and not captured["streaming"]:
+                captured["body"].append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+            if 200 <= captured["status"] < 300 and not captured["streaming"] and (explicit or await self._settled(payment)):
+                self.store.set(key, fingerprint, captured["status"], captured["headers"], b"".join(captured["body"]))
+        finally:
+            self.store.end(key)
+
+    async def _settled(self, tx_hash: str) -> bool:
+        """True if one call spent the whole tx, so a repeat can only be a retry"""
+        if self.paid_in_full is None:
+            return False
+        try:
+            return await self.paid_in_full(tx_hash)
+        except Exception as e:
+            print(f"⚠️ Idempotency payment check failed: {e}")
+            return False
+
+    @staticmethod
+    async def _send(send, status: int, headers: List[Tuple[bytes, bytes]], body: bytes) -> None:
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+idempotency_store = IdempotencyStore()
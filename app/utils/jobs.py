@@ -0,0 +1,449 @@
+"""Persistent background jobs for long-running paid services"""
+import asyncio
+import json
+import os
+import random
+import secrets
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+from dotenv import load_dotenv
+from app.utils import http_client
+from app.utils.executor import run_blocking
+
+load_dotenv()
+
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", ".cache/jobs.sqlite3")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Seconds a finished job (and its result) is kept
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", str(24 * 3600)))
+# Upper bound for one long-poll wait on GET /jobs/{id}
+JOB_MAX_WAIT = float(os.getenv("JOB_MAX_WAIT", "25"))
+JOB_WEBHOOK_RETRIES = int(os.getenv("JOB_WEBHOOK_RETRIES", "3"))
+JOB_WEBHOOK_TIMEOUT = float(os.getenv("JOB_WEBHOOK_TIMEOUT", "10"))
+# Runs a job may start; one that keeps killing the process is failed after this many
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED = (SUCCEEDED, FAILED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    service TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    webhook_url TEXT,
+    webhook_status TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (job_id, idx)
+);
+"""
+
+_SELECT_JOB = "SELECT jobs.*, (SELECT COUNT(*) FROM job_items WHERE job_items.job_id = jobs.id) AS checkpoints FROM jobs"
+
+
+class JobStore:
+    """
+    SQLite table of jobs; one connection shared behind a lock, so calls
+    must go through the "disk" thread pool rather than the event loop
+    """
+
+    def __init__(self, path: str = JOB_DB_PATH):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def insert(self, job: Dict[str, Any]) -> None:
+        with self._lock:
+            self._connect().execute(
+                "INSERT INTO jobs (id, service, status, payload, webhook_url, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job["id"], job["service"], job["status"], json.dumps(job["payload"]), job["webhook_url"], job["created_at"], job["updated_at"])
+            )
+
+    def update(self, job_id: str, **fields) -> None:
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"], default=str)
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._connect().execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connect().execute(f"{_SELECT_JOB} WHERE id = ?", (job_id,)).fetchone()
+        return _row_to_job(row) if row else None
+
+    def unfinished(self) -> List[Dict[str, Any]]:
+        """Queued and running jobs, oldest first (what a restart must resume)"""
+        with self._lock:
+            rows = self._connect().execute(
+                f"{_SELECT_JOB} WHERE status IN (?, ?) ORDER BY created_at", (QUEUED, RUNNING)
+            ).fetchall()
+        return [_row_to_job(row) for row in rows]
+
+    def save_item(self, job_id: str, index: int, data: Any) -> None:
+        """Checkpoint one finished piece of a job (replacing any earlier one)"""
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO job_items (job_id, idx, data) VALUES (?, ?, ?)",
+                (job_id, index, json.dumps(data, default=str))
+            )
+
+    def items(self, job_id: str) -> Dict[int, Any]:
+        """Checkpointed pieces of a job by index"""
+        with self._lock:
+            rows = self._connect().execute("SELECT idx, data FROM job_items WHERE job_id = ? ORDER BY idx", (job_id,)).fetchall()
+        return {idx: json.loads(data) for idx, data in rows}
+
+    def pending_webhooks(self) -> List[str]:
+        """Finished jobs whose webhook was never delivered (the process stopped first)"""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) AND webhook_status = 'pending'", FINISHED
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def purge(self, now: float) -> int:
+        """Delete finished jobs past their expiry (and their checkpoints); returns how many went"""
+        with self._lock:
+            conn = self._connect()
+            purged = conn.execute("DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)).rowcount
+            if purged:
+                conn.execute("DELETE FROM job_items WHERE job_id NOT IN (SELECT id FROM jobs)")
+            return purged
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def _row_to_job(row: sqlite3.Row) -> Dict[str, Any]:
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"])
+    job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+    return job
+
+
+def public_view(job: Dict[str, Any]) -> Dict[str, Any]:
+    """What GET /jobs/{id} and webhooks expose (no request payload)"""
+    view = {
+        "job_id": job["id"],
+        "service": job["service"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+        "expires_at": job["expires_at"]
+    }
+    if job.get("checkpoints"):
+        view["checkpoints"] = job["checkpoints"]
+    if job["status"] == SUCCEEDED:
+        view["result"] = job["result"]
+    elif job["status"] == FAILED:
+        view["error"] = job["error"]
+    if job["webhook_url"]:
+        view["webhook_status"] = job["webhook_status"]
+    return view
+
+
+async def check_webhook_url(url: str) -> Optional[str]:
+    """
+    Why url may not receive webhooks (None if it may): only https to hosts
+    that resolve to public addresses, so a caller cannot aim the server at
+    loopback, private or link-local (metadata) endpoints. Delivery checks
+    the address again as it connects (http_client.get_webhook_client).
+    """
+    parts = urlsplit(url)
+    if parts.scheme != "https" or not parts.hostname:
+        return "webhook_url must be an absolute https URL"
+    host = parts.hostname
+    if host == "localhost" or host.endswith((".localhost", ".internal", ".local")):
+        return "webhook_url must point to a public host"
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, parts.port or 443)
+    except OSError:
+        return f"webhook_url host {host} does not resolve"
+    if not infos or not all(http_client.is_public_address(info[4][0]) for info in infos):
+        return "webhook_url must point to a public host"
+    return None
+
+
+class JobContext:
+    """
+    Handed to a running job so long jobs can checkpoint finished pieces; a
+    resumed job reads them back and skips that work
+    """
+
+    def __init__(self, store: JobStore, job_id: str, attempt: int):
+        self.store = store
+        self.job_id = job_id
+        self.attempt = attempt
+
+    async def checkpoint(self, index: int, data: Any) -> None:
+        await run_blocking("disk", self.store.save_item, self.job_id, index, data)
+
+    async def checkpoints(self) -> Dict[int, Any]:
+        return await run_blocking("disk", self.store.items, self.job_id)
+
+
+Runner = Callable[[Dict[str, Any], JobContext], Awaitable[Any]]
+
+
+class JobQueue:
+    """
+    Bounded worker pool over the job store
+
+    Jobs are persisted before they are queued, so a restart re-queues
+    anything that was queued or running (a running job starts over from
+    its last checkpoints) and sends webhooks that were still pending. A job
+    is failed once it has been started JOB_MAX_ATTEMPTS times, so one that
+    crashes the process is not resumed forever.
+    Runners are registered per service and rebuild the work from the
+    stored JSON payload; finished jobs are kept for JOB_RESULT_TTL.
+    """
+
+    def __init__(
+        self, store: Optional[JobStore] = None, workers: int = JOB_WORKERS, ttl: int = JOB_RESULT_TTL,
+        max_attempts: int = JOB_MAX_ATTEMPTS
+    ):
+        self.store = store or JobStore()
+        self.workers = max(1, workers)
+        self.ttl = ttl
+        self.max_attempts = max(1, max_attempts)
+        self._runners: Dict[str, Runner] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._webhooks: set = set()
+        self._waiters: Dict[str, asyncio.Event] = {}
+        self._stats = {"submitted": 0, "resumed": 0, "succeeded": 0, "failed": 0, "expired": 0, "webhooks_delivered": 0, "webhooks_failed": 0}
+
+    def register(self, service: str, runner: Runner) -> None:
+        """runner(payload, context) does the work for a job and returns its JSON result"""
+        self._runners[service] = runner
+
+    async def start(self) -> None:
+        """Open the store, drop expired jobs, resume unfinished ones and start the workers"""
+        self._queue = asyncio.Queue()
+        self._stats["expired"] += await run_blocking("disk", self.store.purge, time.time())
+        for job in await run_blocking("disk", self.store.unfinished):
+            if job["status"] == RUNNING:
+                await run_blocking("disk", self.store.update, job["id"], status=QUEUED)
+            self._queue.put_nowait(job["id"])
+            self._stats["resumed"] += 1
+        if self._stats["resumed"]:
+            print(f"🔁 Resuming {self._stats['resumed']} unfinished job(s)")
+        for job_id in await run_blocking("disk", self.store.pending_webhooks):
+            self._send_webhook(job_id)
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.ensure_future(self._janitor()))
+
+    async def stop(self) -> None:
+        """Cancel workers; interrupted jobs stay running in the store and resume next start"""
+        for task in self._tasks + list(self._webhooks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._webhooks, return_exceptions=True)
+        self._tasks = []
+        await run_blocking("disk", self.store.close)
+
+    async def submit(self, service: str, payload: Dict[str, Any], webhook_url: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Persist and queue a job
+
+        Args:
+            service: Registered service name
+            payload: JSON-serializable input for the service runner
+            webhook_url: Optional https URL the finished job is POSTed to
+
+        Returns:
+            The public view of the queued job
+
+        Raises:
+            ValueError: Unknown service or a webhook_url that is not allowed
+        """
+        if service not in self._runners:
+            raise ValueError(f"No job runner registered for {service}")
+        if webhook_url and (problem := await check_webhook_url(webhook_url)):
+            raise ValueError(problem)
+        if self._queue is None:
+            raise RuntimeError("Job queue is not running")
+        now = time.time()
+        job = {
+            "id": secrets.token_urlsafe(16),  # unguessable: the id is the only credential for the result
+            "service": service,
+            "status": QUEUED,
+            "payload": payload,
+            "result": None,
+            "error": None,
+            "webhook_url": webhook_url,
+            "webhook_status": "pending" if webhook_url else None,
+            "attempts": 0,
+            "created_at": now,
+            "updated_at": now,
+            "expires_at": None
+        }
+        await run_blocking("disk", self.store.insert, job)
+        self._queue.put_nowait(job["id"])
+        self._stats["submitted"] += 1
+        return public_view(job)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """The job, or None if unknown or expired"""
+        job = await run_blocking("disk", self.store.get, job_id)
+        if job is None or (job["expires_at"] is not None and job["expires_at"] <= time.time()):
+            return None
+        return job
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Long-poll: return the job once it finishes or after timeout seconds
+        (capped at JOB_MAX_WAIT), whichever comes first
+        """
+        job = await self.get(job_id)
+        if job is None or job["status"] in FINISHED or timeout <= 0:
+            return job
+        event = self._waiters.setdefault(job_id, asyncio.Event())
+        # Re-read after registering, in case the job finished in between
+        job = await self.get(job_id)
+        if job is None or job["status"] in FINISHED:
+            return job
+        try:
+            await asyncio.wait_for(event.wait(), timeout=min(timeout, JOB_MAX_WAIT))
+        except asyncio.TimeoutError:
+            pass
+        return await self.get(job_id)
+
+    async def items(self, job_id: str) -> Dict[int, Any]:
+        """Pieces a job has checkpointed so far (partial results while it runs)"""
+        return await run_blocking("disk", self.store.items, job_id)
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            job = await run_blocking("disk", self.store.get, job_id)
+            if job is None or job["status"] in FINISHED:
+                continue
+            if job["attempts"] >= self.max_attempts:
+                # Every earlier run was cut off by the process dying (a finished run never re-queues)
+                self._stats["failed"] += 1
+                print(f"❌ Job {job_id} ({job['service']}) interrupted {job['attempts']} times, giving up")
+                await self._finish(job, {"status": FAILED, "error": f"Interrupted {job['attempts']} times; giving up"})
+                continue
+            attempts = job["attempts"] + 1
+            await run_blocking("disk", self.store.update, job_id, status=RUNNING, attempts=attempts)
+            runner = self._runners.get(job["service"])
+            try:
+                if runner is None:
+                    raise ValueError(f"No job runner registered for {job['service']}")
+                result = await runner(job["payload"], JobContext(self.store, job_id, attempts))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                fields = {"status": FAILED, "error": str(e) or type(e).__name__}
+                self._stats["failed"] += 1
+                print(f"❌ Job {job_id} ({job['service']}) failed: {fields['error']}")
+            else:
+                fields = {"status": SUCCEEDED, "result": result}
+                self._stats["succeeded"] += 1
+            await self._finish(job, fields)
+
+    async def _finish(self, job: Dict[str, Any], fields: Dict[str, Any]) -> None:
+        """Store a job's outcome, wake long-pollers and send its webhook"""
+        fields["expires_at"] = time.time() + self.ttl
+        await run_blocking("disk", self.store.update, job["id"], **fields)
+        event = self._waiters.pop(job["id"], None)
+        if event is not None:
+            event.set()
+        if job["webhook_url"]:
+            self._send_webhook(job["id"])
+
+    def _send_webhook(self, job_id: str) -> None:
+        task = asyncio.ensure_future(self._deliver(job_id))
+        self._webhooks.add(task)
+        task.add_done_callback(self._webhooks.discard)
+
+    async def _deliver(self, job_id: str) -> None:
+        """POST the finished job to its webhook, retrying with jittered backoff"""
+        job = await run_blocking("disk", self.store.get, job_id)
+        if job is None:
+            return
+        body = public_view(job)
+        status = "failed"
+        # Checked again at delivery: the host may resolve differently than at submit time
+        if problem := await check_webhook_url(job["webhook_url"]):
+            print(f"⚠️ Webhook for job {job_id} not sent: {problem}")
+            self._stats["webhooks_failed"] += 1
+            await run_blocking("disk", self.store.update, job_id, webhook_status="rejected")
+            return
+        for attempt in range(JOB_WEBHOOK_RETRIES + 1):
+            try:
+                # Public-address client: checks the address it connects to, and a
+                # redirect is the receiver's answer, not somewhere to send the result
+                response = await http_client.get_webhook_client().post(
+                    job["webhook_url"], json=body, headers={"X-Job-Id": job_id}, timeout=JOB_WEBHOOK_TIMEOUT,
+                    follow_redirects=False
+                )
+                if response.status_code < 300:
+                    status = "delivered"
+                    break
+                if response.status_code < 500 and response.status_code not in (408, 429):
+                    break  # the receiver rejected it; retrying will not help
+            except Exception as e:
+                print(f"⚠️ Webhook for job {job_id} failed: {e}")
+            if attempt < JOB_WEBHOOK_RETRIES:
+                await asyncio.sleep(min(30.0, 2 ** attempt) * random.uniform(0.5, 1.5))
+        self._stats["webhooks_delivered" if status == "delivered" else "webhooks_failed"] += 1
+        await run_blocking("disk", self.store.update, job_id, webhook_status=status)
+
+    async def _janitor(self) -> None:
+        """Drop expired jobs every few minutes"""
+        while True:
+            await asyncio.sleep(min(300, max(self.ttl, 1)))
+            self._stats["expired"] += await run_blocking("disk", self.store.purge, time.time())
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for the metrics endpoint"""
+        return {
+            **self._stats,
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "waiters": len(self._waiters)
+        }
+
+
+job_queue = JobQueue()
@@ -0,0 +1,255 @@
+"""Persistent compressed page cache with HTTP revalidation"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+from app.utils.executor import run_blocking
+from app.utils.fetch import PAGE_MAX_BYTES, fetch_page
+from app.utils.html_parser import parse_page
+from app.utils.speculation import speculator
+
+load_dotenv()
+
+PAGE_CACHE_DIR = os.getenv("PAGE_CACHE_DIR", ".cache/pages")
+PAGE_CACHE_MAX_BYTES = int(os.getenv("PAGE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Freshness for pages that send no Cache-Control max-age or Expires
+PAGE_CACHE_TTL = int(os.getenv("PAGE_CACHE_TTL", "600"))
+PAGE_CACHE_ENABLED = os.getenv("PAGE_CACHE_ENABLED", "true").lower() == "true"
+
+HIT = "HIT"
+MISS = "MISS"
+REVALIDATED = "REVALIDATED"
+STALE = "STALE"
+BYPASS = "BYPASS"
+
+_MAX_AGE = re.compile(r"(?:^|,)\s*(?:s-)?max-age\s*=\s*(\d+)", re.IGNORECASE)
+
+
+def freshness(headers: Dict[str, str], now: float) -> Optional[float]:
+    """
+    Expiry timestamp for a response from its Cache-Control/Expires headers
+
+    Returns:
+        None when the response must not be stored (no-store/private)
+    """
+    cache_control = headers.get("cache-control", "").lower()
+    if "no-store" in cache_control or "private" in cache_control:
+        return None
+    if "no-cache" in cache_control:
+        return now  # store, but revalidate on every use
+    match = _MAX_AGE.search(cache_control)
+    if match:
+        return now + int(match.group(1))
+    if headers.get("expires"):
+        try:
+            return parsedate_to_datetime(headers["expires"]).timestamp()
+        except (TypeError, ValueError):
+            return now
+    return now + PAGE_CACHE_TTL
+
+
+def _parse_key(fields: Iterable[str], limits: Dict[str, Any]) -> str:
+    return ",".join(sorted(fields)) + "|" + json.dumps(limits, sort_keys=True)
+
+
+class PageCache:
+    """
+    Gzipped JSON entries on disk, one per URL, holding the decoded body, the
+    response validators and any parsed results computed from it
+
+    An in-memory index of entry sizes and access times enforces the disk
+    budget (least recently used entries go first); all file I/O runs on the
+    "disk" thread pool.
+    """
+
+    def __init__(self, directory: str = PAGE_CACHE_DIR, max_bytes: int = PAGE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._index: Optional[Dict[str, Tuple[int, float]]] = None  # key -> (size, last access)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "revalidated": 0, "stale": 0, "bypass": 0, "parses_skipped": 0, "evictions": 0, "unpaid": 0}
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json.gz")
+
+    def _load_index(self) -> Dict[str, Tuple[int, float]]:
+        if self._index is None:
+            index = {}
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    if name.endswith(".json.gz"):
+                        stat = os.stat(os.path.join(root, name))
+                        index[name[:-len(".json.gz")]] = (stat.st_size, stat.st_mtime)
+            self._index = index
+            self._bytes = sum(size for size, _ in index.values())
+            self._evict()  # the budget may have shrunk since the last run
+        return self._index
+
+    def _read(self, key: str) -> Optional[Dict]:
+        try:
+            with gzip.open(self._path(key), "rt", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            index = self._load_index()
+            if key in index:
+                index[key] = (index[key][0], time.time())
+        return entry
+
+    def _write(self, key: str, entry: Dict) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = gzip.compress(json.dumps(entry).encode("utf-8"), compresslevel=6)
+        if len(data) > self.max_bytes:
+            return
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)  # readers never see a half-written entry
+        with self._lock:
+            index = self._load_index()
+            previous = index.get(key)
+            self._bytes += len(data) - (previous[0] if previous else 0)
+            index[key] = (len(data), time.time())
+            self._evict()
+
+    def _evict(self) -> None:
+        if self._bytes <= self.max_bytes:
+            return
+        # Trim to 90% so a full cache does not evict on every write
+        target = self.max_bytes * 0.9
+        for key, (size, _) in sorted(self._index.items(), key=lambda item: item[1][1]):
+            if self._bytes <= target:
+                break
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            del self._index[key]
+            self._bytes -= size
+            self._stats["evictions"] += 1
+
+    async def fetch(
+        self,
+        url: str,
+        fields: Iterable[str] = (),
+        max_bytes: int = PAGE_MAX_BYTES,
+        timeout: float = 15,
+        headers: Optional[Dict[str, str]] = None,
+        raise_for_status: bool = False,
+        **limits
+    ) -> Tuple[Dict, Optional[Dict]]:
+        """
+        Fetch a page through the cache and (optionally) parse it
+
+        Fresh entries are served without touching the network; stale ones are
+        revalidated with If-None-Match/If-Modified-Since, and a 304 refreshes
+        the entry. Parsed results are stored alongside the body, so a hit for
+        the same fields and limits skips HTML parsing as well. If revalidation
+        fails with a network error, the stale entry is served. A speculative
+        call's entry is written only once its payment is confirmed.
+
+        Args:
+            url: Page URL
+            fields: parse_html fields to extract; empty to skip parsing
+            max_bytes, timeout, headers, raise_for_status: As for fetch_page
+            **limits: parse_html limits (max_text, max_links, max_images)
+
+        Returns:
+            (page, parsed) where page is the fetch_page dict plus a "cache"
+            status (HIT, MISS, REVALIDATED, STALE or BYPASS) and parsed is
+            None when no fields were requested
+        """
+        fields = tuple(fields)
+        if not PAGE_CACHE_ENABLED:
+            self._stats["bypass"] += 1
+            page = await fetch_page(url, max_bytes, timeout, headers, raise_for_status)
+            parsed = await parse_page(page["text"], fields, **limits) if fields else None
+            return {**page, "cache": BYPASS}, parsed
+
+        key = hashlib.sha256(url.encode()).hexdigest()
+        entry = await run_blocking("disk", self._read, key)
+        # A body cut short at a smaller budget cannot serve a caller that wants more
+        if entry and entry["page"]["truncated"] and entry["max_bytes"] < max_bytes:
+            entry = None
+
+        now = time.time()
+        status = HIT
+        if entry is None or now >= entry["fresh_until"]:
+            request_headers = dict(headers or {})
+            if entry:
+                if entry["page"]["headers"].get("etag"):
+                    request_headers["If-None-Match"] = entry["page"]["headers"]["etag"]
+                if entry["page"]["headers"].get("last-modified"):
+                    request_headers["If-Modified-Since"] = entry["page"]["headers"]["last-modified"]
+            try:
+                page = await fetch_page(url, max_bytes, timeout, request_headers, raise_for_status)
+            except (httpx.TransportError, OSError):
+                if entry is None:
+                    raise
+                page = None
+
+            if page is None:
+                status = STALE
+            elif entry and page["status_code"] == 304:
+                status = REVALIDATED
+                entry["page"]["headers"].update(
+                    {k: v for k, v in page["headers"].items() if k in ("cache-control", "expires", "etag", "last-modified")}
+                )
+                entry["fresh_until"] = freshness(entry["page"]["headers"], now) or now
+            else:
+                status = MISS
+                fresh_until = freshness(page["headers"], now)
+                cacheable = page["status_code"] == 200 and not page["skipped"] and fresh_until is not None
+                if not cacheable:
+                    self._stats["misses"] += 1
+                    parsed = await parse_page(page["text"], fields, **limits) if fields else None
+                    return {**page, "cache": MISS}, parsed
+                entry = {"url": url, "fresh_until": fresh_until, "max_bytes": max_bytes, "page": page, "parsed": {}}
+
+        self._stats[{HIT: "hits", MISS: "misses", REVALIDATED: "revalidated", STALE: "stale"}[status]] += 1
+        dirty = status in (MISS, REVALIDATED)
+        parsed = None
+        if fields:
+            parse_key = _parse_key(fields, limits)
+            parsed = entry["parsed"].get(parse_key)
+            if parsed is None:
+                parsed = await parse_page(entry["page"]["text"], fields, **limits)
+                entry["parsed"][parse_key] = parsed
+                dirty = True
+            else:
+                self._stats["parses_skipped"] += 1
+        if dirty:
+            write = speculator.when_paid(lambda: run_blocking("disk", self._write, key, entry), self._count_unpaid)
+            if write is not None:
+                await write
+        return {**entry["page"], "cache": status}, parsed
+
+    def _count_unpaid(self) -> None:
+        self._stats["unpaid"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for the metrics endpoint"""
+        lookups = self._stats["hits"] + self._stats["misses"] + self._stats["revalidated"] + self._stats["stale"]
+        served = self._stats["hits"] + self._stats["revalidated"] + self._stats["stale"]
+        return {
+            **self._stats,
+            "hit_rate": round(served / lookups, 3) if lookups else 0.0,
+            "entries": len(self._index) if self._index is not None else None,
+            "bytes": self._bytes if self._index is not None else None,
+            "max_bytes": self.max_bytes
+        }
+
+
+page_cache = PageCache()
+
@@ -0,0 +1,398 @@
+"""Local index of USDC Transfer events to the server wallet, for payment lookups without RPC"""
+import asyncio
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+from app.utils.executor import run_blocking
+
+load_dotenv()
+
+PAYMENT_INDEX_ENABLED = os.getenv("PAYMENT_INDEX_ENABLED", "true").lower() == "true"
+PAYMENT_INDEX_DB = os.getenv("PAYMENT_INDEX_DB", ".cache/payments.sqlite3")
+# Blocks to backfill on the very first start (Base makes ~2 blocks/s: 43200 = 6 hours)
+PAYMENT_INDEX_LOOKBACK = int(os.getenv("PAYMENT_INDEX_LOOKBACK", "43200"))
+# Blocks per eth_getLogs request while catching up (halved when the RPC refuses a range)
+PAYMENT_INDEX_BATCH = int(os.getenv("PAYMENT_INDEX_BATCH", "2000"))
+# Blocks the indexer stays behind the head, so reorged logs are not indexed
+PAYMENT_INDEX_CONFIRMATIONS = int(os.getenv("PAYMENT_INDEX_CONFIRMATIONS", "3"))
+# Blocks on top of a tx before its receipt is accepted ahead of the indexer (0 = in the head block)
+PAYMENT_FALLBACK_CONFIRMATIONS = int(os.getenv("PAYMENT_FALLBACK_CONFIRMATIONS", "1"))
+PAYMENT_INDEX_POLL = float(os.getenv("PAYMENT_INDEX_POLL", "2"))
+
+# keccak256("Transfer(address,address,uint256)")
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transfers (
+    tx_hash TEXT NOT NULL,
+    log_index INTEGER NOT NULL,
+    block_number INTEGER NOT NULL,
+    sender TEXT NOT NULL,
+    recipient TEXT NOT NULL,
+    value INTEGER NOT NULL,
+    PRIMARY KEY (tx_hash, log_index)
+);
+CREATE INDEX IF NOT EXISTS transfers_sender ON transfers (sender, block_number);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    name TEXT PRIMARY KEY,
+    block_number INTEGER NOT NULL
+);
+"""
+
+
+def hex_str(value: Any) -> str:
+    """Lowercase 0x-prefixed hex for a hash or address (str, bytes or HexBytes)"""
+    if isinstance(value, (bytes, bytearray)):
+        return "0x" + bytes(value).hex()
+    value = str(value).strip().lower()
+    return value if value.startswith("0x") else "0x" + value
+
+
+def address_topic(address: str) -> str:
+    """An address as a 32-byte indexed event topic"""
+    return "0x" + hex_str(address)[2:].rjust(64, "0")
+
+
+def decode_transfer(log: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """A raw Transfer log as {tx_hash, log_index, block_number, sender, recipient, value}"""
+    topics = [hex_str(topic) for topic in log.get("topics") or []]
+    if len(topics) != 3 or topics[0] != TRANSFER_TOPIC:
+        return None
+    data = log["data"]
+    return {
+        "tx_hash": hex_str(log["transactionHash"]),
+        "log_index": int(log["logIndex"]),
+        "block_number": int(log["blockNumber"]),
+        "sender": "0x" + topics[1][-40:],
+        "recipient": "0x" + topics[2][-40:],
+        "value": int(hex_str(data), 16) if data not in (b"", "0x", "") else 0
+    }
+
+
+class ChainSource(ABC):
+    """
+    What the indexer needs from a chain; get_logs and receipt_transfers
+    return only USDC Transfers to the server wallet, already decoded
+    """
+
+    name = "base"
+
+    @abstractmethod
+    async def block_number(self) -> int:
+        ...
+
+    @abstractmethod
+    async def get_logs(self, from_block: int, to_block: int) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def receipt_transfers(self, tx_hash: str) -> Optional[List[Dict[str, Any]]]:
+        """Transfers in a mined, successful tx; None if unknown, pending or reverted"""
+
+
+class Web3Source(ChainSource):
+    """JSON-RPC through a shared AsyncWeb3 instance"""
+
+    name = "web3"
+
+    def __init__(self, w3, token: str, wallet: str):
+        self.w3 = w3
+        self.token = hex_str(token)
+        self.wallet = hex_str(wallet)
+
+    def _ours(self, transfer: Optional[Dict[str, Any]], log: Dict[str, Any]) -> bool:
+        return transfer is not None and hex_str(log["address"]) == self.token and transfer["recipient"] == self.wallet
+
+    async def block_number(self) -> int:
+        return await self.w3.eth.block_number
+
+    async def get_logs(self, from_block: int, to_block: int) -> List[Dict[str, Any]]:
+        logs = await self.w3.eth.get_logs({
+            "fromBlock": from_block,
+            "toBlock": to_block,
+            "address": self.w3.to_checksum_address(self.token),
+            "topics": [TRANSFER_TOPIC, None, address_topic(self.wallet)]
+        })
+        transfers = [(decode_transfer(log), log) for log in logs]
+        return [transfer for transfer, log in transfers if self._ours(transfer, log)]
+
+    async def receipt_transfers(self, tx_hash: str) -> Optional[List[Dict[str, Any]]]:
+        try:
+            receipt = await self.w3.eth.get_transaction_receipt(tx_hash)
+        except Exception as e:  # TransactionNotFound while pending or unknown
+            if "not found" in str(e).lower():
+                return None
+            raise
+        if not receipt or receipt["status"] != 1:
+            return None
+        transfers = [(decode_transfer(log), log) for log in receipt["logs"]]
+        return [transfer for transfer, log in transfers if self._ours(transfer, log)]
+
+
+class LocalChain(ChainSource):
+    """
+    In-memory chain stand-in for tests: mine() appends a block of transfers
+    and the RPC surface is served from memory, with call counters
+    """
+
+    name = "local"
+
+    def __init__(self, wallet: str, max_range: int = 0):
+        self.wallet = hex_str(wallet)
+        self.max_range = max_range  # like RPC providers that cap eth_getLogs ranges
+        self.blocks: List[List[Dict[str, Any]]] = [[]]
+        self.calls = {"block_number": 0, "get_logs": 0, "receipt": 0}
+
+    def mine(self, *transfers, empty_blocks: int = 0) -> List[str]:
+        """
+        Mine one block holding (sender, recipient, value) transfers, then
+        empty_blocks more; returns the tx hashes
+        """
+        number = len(self.blocks)
+        block = []
+        for position, (sender, recipient, value) in enumerate(transfers):
+            tx_hash = "0x" + f"{number:08x}{position:056x}"
+            block.append({
+                "tx_hash": tx_hash, "log_index": position, "block_number": number,
+                "sender": hex_str(sender), "recipient": hex_str(recipient), "value": int(value)
+            })
+        self.blocks.append(block)
+        self.blocks.extend([] for _ in range(empty_blocks))
+        return [transfer["tx_hash"] for transfer in block]
+
+    async def block_number(self) -> int:
+        self.calls["block_number"] += 1
+        return len(self.blocks) - 1
+
+    async def get_logs(self, from_block: int, to_block: int) -> List[Dict[str, Any]]:
+        self.calls["get_logs"] += 1
+        if self.max_range and to_block - from_block + 1 > self.max_range:
+            raise ValueError("query exceeds max block range")
+        return [
+            dict(transfer) for block in self.blocks[from_block:to_block + 1]
+            for transfer in block if transfer["recipient"] == self.wallet
+        ]
+
+    async def receipt_transfers(self, tx_hash: str) -> Optional[List[Dict[str, Any]]]:
+        self.calls["receipt"] += 1
+        tx_hash = hex_str(tx_hash)
+        for block in self.blocks:
+            found = [dict(t) for t in block if t["tx_hash"] == tx_hash]
+            if found:
+                return [t for t in found if t["recipient"] == self.wallet]
+        return None
+
+
+class TransferStore:
+    """SQLite table of indexed transfers plus the indexer checkpoint; use via the "disk" pool"""
+
+    def __init__(self, path: str = PAYMENT_INDEX_DB):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def checkpoint(self) -> Optional[int]:
+        with self._lock:
+            row = self._connect().execute("SELECT block_number FROM checkpoints WHERE name = 'transfers'").fetchone()
+        return row[0] if row else None
+
+    def add(self, transfers: List[Dict[str, Any]], checkpoint: Optional[int] = None) -> None:
+        """Insert transfers and (optionally) advance the checkpoint in one transaction"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN")
+            try:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO transfers (tx_hash, log_index, block_number, sender, recipient, value) "
+                    "VALUES (:tx_hash, :log_index, :block_number, :sender, :recipient, :value)",
+                    transfers
+                )
+                if checkpoint is not None:
+                    conn.execute(
+                        "INSERT INTO checkpoints (name, block_number) VALUES ('transfers', ?) "
+                        "ON CONFLICT(name) DO UPDATE SET block_number = excluded.block_number",
+                        (checkpoint,)
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def by_tx(self, tx_hash: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._connect().execute("SELECT * FROM transfers WHERE tx_hash = ? ORDER BY log_index", (tx_hash,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def by_sender(self, sender: str, since_block: int = 0) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT * FROM transfers WHERE sender = ? AND block_number >= ? ORDER BY block_number DESC",
+                (sender, since_block)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class TransferIndexer:
+    """
+    Follows USDC Transfer logs to the server wallet into a TransferStore
+
+    Indexing resumes from the stored checkpoint (or PAYMENT_INDEX_LOOKBACK
+    blocks back on a first start), catches up in getLogs batches and then
+    polls, staying PAYMENT_INDEX_CONFIRMATIONS behind the head. A tx that is
+    not in the index yet (a very recent block) is checked from its receipt,
+    once PAYMENT_FALLBACK_CONFIRMATIONS blocks sit on top of it; those
+    transfers are never written to the store, so only sync() (past the full
+    confirmation depth) adds rows.
+    """
+
+    def __init__(self, source: Optional[ChainSource] = None, store: Optional[TransferStore] = None):
+        self.source = source
+        self.store = store or TransferStore()
+        self.batch = PAYMENT_INDEX_BATCH
+        self._task: Optional[asyncio.Task] = None
+        self._checkpoint: Optional[int] = None
+        self._head: Optional[int] = None
+        self._stats = {"indexed": 0, "index_hits": 0, "rpc_fallbacks": 0, "fallback_unconfirmed": 0, "sync_errors": 0}
+
+    def configure(self, source: ChainSource, store: Optional[TransferStore] = None) -> None:
+        """Set the chain (a Web3Source in production, a LocalChain in tests) and optionally the store"""
+        self.source = source
+        if store is not None:
+            self.store = store
+            self._checkpoint = None
+
+    async def sync(self) -> int:
+        """
+        Index everything between the checkpoint and the confirmed head
+
+        Returns:
+            Number of transfers indexed
+        """
+        head = await self.source.block_number()
+        self._head = head
+        target = head - PAYMENT_INDEX_CONFIRMATIONS
+        if self._checkpoint is None:
+            self._checkpoint = await run_blocking("disk", self.store.checkpoint)
+        if self._checkpoint is None:
+            self._checkpoint = max(target - PAYMENT_INDEX_LOOKBACK, -1)
+            await run_blocking("disk", self.store.add, [], self._checkpoint)
+
+        indexed = 0
+        while self._checkpoint < target:
+            start = self._checkpoint + 1
+            end = min(target, start + self.batch - 1)
+            try:
+                transfers = await self.source.get_logs(start, end)
+            except Exception:
+                if self.batch <= 1:
+                    # Not a range cap after all (the RPC is down): start over at full size next time
+                    self.batch = PAYMENT_INDEX_BATCH
+                    raise
+                self.batch = max(1, self.batch // 2)  # provider capped the range; retry smaller
+                continue
+            await run_blocking("disk", self.store.add, transfers, end)
+            self._checkpoint = end
+            indexed += len(transfers)
+        self._stats["indexed"] += indexed
+        return indexed
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                indexed = await self.sync()
+                if indexed:
+                    print(f"🧾 Indexed {indexed} USDC transfer(s) up to block {self._checkpoint}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._stats["sync_errors"] += 1
+                print(f"⚠️ Payment indexer sync failed: {e}")
+            await asyncio.sleep(PAYMENT_INDEX_POLL)
+
+    async def start(self) -> None:
+        """Start following the chain in the background"""
+        if self._task is None and self.source is not None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await run_blocking("disk", self.store.close)
+
+    async def transfers(self, tx_hash: str) -> List[Dict[str, Any]]:
+        """
+        Transfers to the server wallet in a tx: from the index, or from the
+        tx receipt when the index has not reached it yet and its block has
+        PAYMENT_FALLBACK_CONFIRMATIONS blocks on top
+        """
+        tx_hash = hex_str(tx_hash)
+        found = await run_blocking("disk", self.store.by_tx, tx_hash)
+        if found:
+            self._stats["index_hits"] += 1
+            return found
+        self._stats["rpc_fallbacks"] += 1
+        found = await self.source.receipt_transfers(tx_hash)
+        if not found:
+            return []
+        head = await self.source.block_number()
+        if any(head - transfer["block_number"] < PAYMENT_FALLBACK_CONFIRMATIONS for transfer in found):
+            # Too fresh to trust (or from a block our node does not have): the client retries
+            self._stats["fallback_unconfirmed"] += 1
+            return []
+        return found
+
+    async def payments_from(self, sender: str, since_block: int = 0) -> List[Dict[str, Any]]:
+        """Indexed transfers from a sender, newest first"""
+        return await run_blocking("disk", self.store.by_sender, hex_str(sender), since_block)
+
+    async def value(self, tx_hash: str) -> int:
+        """Total micro-USDC the tx sent to the server wallet"""
+        return sum(transfer["value"] for transfer in await self.transfers(tx_hash))
+
+    async def verify(self, tx_hash: str, expected_amount: float) -> bool:
+        """True if the tx sent at least expected_amount USDC (1% tolerance) to the server wallet"""
+        for transfer in await self.transfers(tx_hash):
+            if transfer["value"] / 1e6 >= expected_amount * 0.99:
+                return True
+        return False
+
+    @property
+    def checkpoint(self) -> Optional[int]:
+        return self._checkpoint
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for the metrics endpoint"""
+        return {
+            **self._stats,
+            "source": self.source.name if self.source is not None else None,
+            "running": self._task is not None,
+            "checkpoint": self._checkpoint,
+            "lag_blocks": self._head - self._checkpoint if self._head is not None and self._checkpoint is not None else None,
+            "batch": self.batch
+        }
+
+
+transfer_indexer = TransferIndexer()
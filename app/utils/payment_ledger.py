@@ -0,0 +1,418 @@
+"""Durable ledger of consumed payments: one tx hash can pay for calls up to its value, once"""
+import contextvars
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+from app.utils.executor import run_blocking
+from app.utils.payment_index import hex_str
+from app.utils.receipts import receipt_signer
+from app.utils.singleflight import singleflight
+
+load_dotenv()
+
+# Local to this machine: the ledger is only correct with a single app instance (see fly.toml)
+PAYMENT_LEDGER_DB = os.getenv("PAYMENT_LEDGER_DB", ".cache/ledger.sqlite3")
+# Bloom filter size in bits (8M bits = 1 MB; ~1% false positives at ~800k tx hashes)
+PAYMENT_LEDGER_BLOOM_BITS = int(os.getenv("PAYMENT_LEDGER_BLOOM_BITS", str(8 * 1024 * 1024)))
+PAYMENT_LEDGER_BLOOM_HASHES = 7
+# A transfer up to 1% short of the price is accepted (same tolerance as verification)
+PAYMENT_TOLERANCE = 0.01
+
+# (owner, claim) pairs charged while serving the current request, so a failed call can give them back
+_request_claims: contextvars.ContextVar[Optional[List[Tuple[Any, Dict[str, Any]]]]] = contextvars.ContextVar(
+    "request_claims", default=None
+)
+
+
+def durable_storage_problem(setting: str, path: str) -> Optional[str]:
+    """
+    Why path cannot hold payment state in production (None if it can): the
+    setting must be given explicitly, and on Fly or Railway it must point
+    into a mounted volume, since the container's own disk is wiped on every
+    redeploy and a wiped ledger accepts every spent tx hash again
+    """
+    if not os.getenv(setting):
+        return f"{setting} is not set: point it at persistent storage (the default {path} is not kept across deploys)"
+    if os.getenv("FLY_APP_NAME") or os.getenv("RAILWAY_ENVIRONMENT_NAME") or os.getenv("RAILWAY_ENVIRONMENT"):
+        mount = os.path.dirname(os.path.abspath(path))
+        while not os.path.ismount(mount):
+            mount = os.path.dirname(mount)
+        if mount == os.path.abspath(os.sep):
+            return f"{setting}={path} is not on a mounted volume and would be wiped on redeploy"
+    return None
+
+
+def track_claim(owner, claim: Dict[str, Any]) -> None:
+    """Remember a charge for the current request; owner.refund(claim) undoes it if the request fails"""
+    claims = _request_claims.get()
+    if claims is not None:
+        claims.append((owner, claim))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS payments (
+    tx_hash TEXT PRIMARY KEY,
+    value INTEGER NOT NULL,
+    consumed INTEGER NOT NULL DEFAULT 0,
+    uses INTEGER NOT NULL DEFAULT 0,
+    first_used REAL,
+    last_used REAL
+);
+CREATE TABLE IF NOT EXISTS consumptions (
+    tx_hash TEXT NOT NULL,
+    service TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS consumptions_tx ON consumptions (tx_hash);
+"""
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (no false negatives)"""
+
+    def __init__(self, bits: int = PAYMENT_LEDGER_BLOOM_BITS, hashes: int = PAYMENT_LEDGER_BLOOM_HASHES):
+        self.bits = max(8, bits)
+        self.hashes = hashes
+        self._array = bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        # Double hashing: k positions from two 64-bit halves
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._array[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._array[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class LedgerStore:
+    """SQLite tables of redeemed tx hashes and their consumptions; use via the "disk" pool"""
+
+    def __init__(self, path: str = PAYMENT_LEDGER_DB):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def all_hashes(self):
+        """(tx_hash, exhausted) for every redeemed payment, to warm the in-memory front"""
+        with self._lock:
+            return [(row[0], row[1] <= 0) for row in self._connect().execute("SELECT tx_hash, value - consumed FROM payments")]
+
+    def get(self, tx_hash: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connect().execute("SELECT * FROM payments WHERE tx_hash = ?", (tx_hash,)).fetchone()
+        return dict(row) if row else None
+
+    def register(self, tx_hash: str, value: int, consumed: int = 0) -> None:
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR IGNORE INTO payments (tx_hash, value, consumed) VALUES (?, ?, ?)", (tx_hash, value, consumed)
+            )
+
+    def consume(self, tx_hash: str, amount: Optional[int], service: str) -> Optional[Dict[str, Any]]:
+        """
+        Atomically take amount (or the remainder, within the tolerance) from
+        a payment; amount None takes everything left. None if not enough is left
+
+        The check and the update run under one write transaction, so two
+        concurrent claims can never both spend the same remainder, even
+        across processes sharing the database.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT * FROM payments WHERE tx_hash = ?", (tx_hash,)).fetchone()
+                remaining = row["value"] - row["consumed"] if row else 0
+                minimum = 1 if amount is None else max(int(amount * (1 - PAYMENT_TOLERANCE)), 1)
+                if remaining < minimum:
+                    conn.execute("ROLLBACK")
+                    return None
+                charged = remaining if amount is None else min(amount, remaining)
+                conn.execute(
+                    "UPDATE payments SET consumed = consumed + ?, uses = uses + 1, "
+                    "first_used = COALESCE(first_used, ?), last_used = ? WHERE tx_hash = ?",
+                    (charged, now, now, tx_hash)
+                )
+                conn.execute(
+                    "INSERT INTO consumptions (tx_hash, service, amount, at) VALUES (?, ?, ?, ?)",
+                    (tx_hash, service, charged, now)
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return {**dict(row), "consumed": row["consumed"] + charged, "uses": row["uses"] + 1, "charged": charged}
+
+    def refund(self, tx_hash: str, amount: int, service: str, whole: bool = True) -> None:
+        """Give back an earlier consumption (recorded as a negative amount); part of one keeps its use"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "UPDATE payments SET consumed = MAX(consumed - ?, 0), uses = MAX(uses - ?, 0) WHERE tx_hash = ?",
+                    (amount, int(whole), tx_hash)
+                )
+                conn.execute(
+                    "INSERT INTO consumptions (tx_hash, service, amount, at) VALUES (?, ?, ?, ?)",
+                    (tx_hash, service, -amount, time.time())
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class PaymentLedger:
+    """
+    Redeems PAYMENT-SIGNATURE tx hashes against their on-chain value
+
+    A Bloom filter of every redeemed hash fronts the database: a hash it
+    has never seen goes straight to on-chain verification without a ledger
+    lookup, and a set of fully spent hashes rejects replays without any
+    I/O. A transfer larger than the price keeps its remainder for later
+    calls until its value is used up.
+    """
+
+    def __init__(self, store: Optional[LedgerStore] = None, bloom_bits: int = PAYMENT_LEDGER_BLOOM_BITS):
+        self.store = store or LedgerStore()
+        self._bloom = BloomFilter(bloom_bits)
+        self._spent: Set[str] = set()
+        self._loaded = False
+        self._stats = {
+            "claims": 0, "rejected_spent": 0, "rejected_unpaid": 0, "rejected_insufficient": 0,
+            "bloom_skips": 0, "ledger_lookups": 0, "partial_uses": 0, "refunds": 0
+        }
+
+    async def load(self) -> None:
+        """Warm the Bloom filter and spent set from the database"""
+        for tx_hash, exhausted in await run_blocking("disk", self.store.all_hashes):
+            self._bloom.add(tx_hash)
+            if exhausted:
+                self._spent.add(tx_hash)
+        self._loaded = True
+
+    async def paid_in_full(self, tx_hash: str) -> bool:
+        """True if a single claim spent the tx's whole value"""
+        row = await run_blocking("disk", self.store.get, hex_str(tx_hash))
+        return row is not None and row["uses"] == 1 and row["consumed"] >= row["value"]
+
+    def is_spent(self, tx_hash: str) -> bool:
+        """True if the tx is known to be fully spent (memory only, no I/O)"""
+        return hex_str(tx_hash) in self._spent
+
+    async def claim(
+        self, tx_hash: str, amount_usd: Optional[float], service: str,
+        fetch_value: Optional[Callable[[str], Awaitable[int]]] = None, known: Optional[Tuple[int, int]] = None
+    ) -> Dict[str, Any]:
+        """
+        Spend amount_usd of a payment for one call
+
+        Args:
+            tx_hash: PAYMENT-SIGNATURE transaction hash
+            amount_usd: Price of the call; None spends all that is left
+            service: Service name, recorded with the consumption
+            fetch_value: Async callable giving the micro-USDC the tx paid to
+                the server wallet (0 if it paid nothing); called only the
+                first time a hash is seen
+            known: (value, consumed) already vouched for (by a signed
+                receipt, or transfers the caller just verified), used instead
+                of fetch_value when the ledger has no record yet
+
+        Returns:
+            {"ok": True, "charged_usd", "remaining_usd", "value_usd", "uses",
+            "receipt"?} or {"ok": False, "reason", ...}
+        """
+        if not self._loaded:
+            await self.load()
+        tx_hash = hex_str(tx_hash)
+        amount = None if amount_usd is None else round(amount_usd * 1_000_000)
+        if tx_hash in self._spent:
+            self._stats["rejected_spent"] += 1
+            return {"ok": False, "reason": "spent", "tx_hash": tx_hash, "remaining_usd": 0.0}
+
+        row = None
+        if tx_hash in self._bloom:
+            self._stats["ledger_lookups"] += 1
+            row = await run_blocking("disk", self.store.get, tx_hash)
+        else:
+            self._stats["bloom_skips"] += 1
+        if row is None:
+            if known is not None:
+                value, consumed = known
+            else:
+                # First sight: concurrent claims for the same new hash share one verification
+                value = await singleflight.do(f"payment:{tx_hash}", lambda: fetch_value(tx_hash), label="payment")
+                consumed = 0
+            if value <= 0:
+                self._stats["rejected_unpaid"] += 1
+                return {"ok": False, "reason": "unpaid", "tx_hash": tx_hash}
+            await run_blocking("disk", self.store.register, tx_hash, value, consumed)
+            if tx_hash not in self._bloom:
+                self._bloom.add(tx_hash)
+
+        row = await run_blocking("disk", self.store.consume, tx_hash, amount, service)
+        if row is None:
+            current = await run_blocking("disk", self.store.get, tx_hash)
+            remaining = current["value"] - current["consumed"]
+            if remaining <= 0:
+                self._spent.add(tx_hash)
+                self._stats["rejected_spent"] += 1
+                return {"ok": False, "reason": "spent", "tx_hash": tx_hash, "remaining_usd": 0.0}
+            self._stats["rejected_insufficient"] += 1
+            return {"ok": False, "reason": "insufficient", "tx_hash": tx_hash, "remaining_usd": remaining / 1_000_000}
+
+        remaining = row["value"] - row["consumed"]
+        if remaining <= 0:
+            self._spent.add(tx_hash)
+        if row["uses"] > 1:
+            self._stats["partial_uses"] += 1
+        self._stats["claims"] += 1
+        result = {
+            "ok": True,
+            "tx_hash": tx_hash,
+            "service": service,
+            "charged_usd": row["charged"] / 1_000_000,
+            "remaining_usd": remaining / 1_000_000,
+            "value_usd": row["value"] / 1_000_000,
+            "uses": row["uses"]
+        }
+        if remaining > 0:
+            # Lets the next call spend the rest without an on-chain lookup, in any worker process
+            result["receipt"] = receipt_signer.issue(tx_hash, row["value"], remaining)
+        track_claim(self, result)
+        return result
+
+    async def redeem_receipt(
+        self, token: str, amount_usd: float, service: str,
+        fetch_value: Optional[Callable[[str], Awaitable[int]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Spend from the payment behind a signed receipt
+
+        The signature check is pure CPU. The charge still goes through the
+        ledger record of the receipt's tx, so a replayed receipt can never
+        spend more than the tx has left; a ledger without a record seeds it
+        from the receipt's remaining value instead of asking the chain.
+        That only holds while every worker shares this one ledger: one that
+        never saw the tx would take the raw hash at its full value.
+        """
+        payload = receipt_signer.verify(token)
+        if payload is None:
+            return {"ok": False, "reason": "invalid_receipt"}
+        return await self.claim(
+            payload["tx"], amount_usd, service, fetch_value, known=(payload["v"], payload["v"] - payload["r"])
+        )
+
+    async def refund(self, claim: Dict[str, Any]) -> None:
+        """Return a successful claim's charge (or, with "partial", part of it) to its payment"""
+        amount = round(claim["charged_usd"] * 1_000_000)
+        await run_blocking(
+            "disk", self.store.refund, claim["tx_hash"], amount, claim["service"], not claim.get("partial")
+        )
+        self._spent.discard(claim["tx_hash"])
+        self._stats["refunds"] += 1
+
+    async def close(self) -> None:
+        await run_blocking("disk", self.store.close)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for the metrics endpoint"""
+        return {**self._stats, "known_payments": self._bloom.count, "spent_in_memory": len(self._spent)}
+
+
+async def release_claims(amount_usd: float) -> float:
+    """
+    Give back part of what the current request was charged, for work it
+    paid for but did not get (failed items of a batch)
+
+    Returns:
+        USD actually released (at most what the request's claims charged)
+    """
+    released = 0.0
+    for owner, claim in _request_claims.get() or []:
+        share = round(min(amount_usd - released, claim["charged_usd"] - claim.get("released_usd", 0.0)), 6)
+        if share <= 0:
+            continue
+        await owner.refund({**claim, "charged_usd": share, "partial": True})
+        claim["released_usd"] = claim.get("released_usd", 0.0) + share
+        released += share
+    return round(released, 6)
+
+
+class PaymentClaimsMiddleware:
+    """
+    ASGI middleware for the payments claimed while serving a request
+
+    They are refunded when it ends in a 5xx or an exception, so the client
+    can retry with the same tx hash instead of paying again for a call that
+    did nothing. Otherwise a tx with value left gets a Payment-Receipt
+    header for the next call.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        claims: List[Tuple[Any, Dict[str, Any]]] = []
+        token = _request_claims.set(claims)
+        status = 500
+
+        async def capture_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                receipts = [claim["receipt"] for _, claim in claims if "receipt" in claim]
+                if receipts and status < 500:
+                    message = {**message, "headers": [*message.get("headers", []), (b"payment-receipt", receipts[-1].encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, capture_send)
+        finally:
+            _request_claims.reset(token)
+            if status >= 500:
+                for owner, claim in claims:
+                    remaining = round(claim["charged_usd"] - claim.get("released_usd", 0.0), 6)
+                    if remaining <= 0:
+                        continue
+                    try:
+                        await owner.refund({**claim, "charged_usd": remaining})
+                    except Exception as e:
+                        print(f"⚠️ Payment refund failed for {claim}: {e}")
+
+
+payment_ledger = PaymentLedger()
@@ -1,4 +1,4 @@
-import httpx
+from app.utils import http_client
 import os
 from typing import Dict, Optional
 
@@ -23,15 +23,14 @@ async def verify_usdc_payment(payment_id: str, expected_amount: int = 2000000) -
         "id": 1
     }
     
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(BASE_RPC_URL, json=payload)
-        transfers = resp.json()["result"]["transfers"]
-        
-        for tx in transfers[-10:]:  # Last 10 txs
-            if (tx["rawContract"]["address"].lower() == USDC_CONTRACT.lower() and
-                int(tx["rawContract"]["value"]) >= expected_amount and
-                "memo" in tx["metadata"].get("blockExplorerUrl", "") and
-                payment_id in tx["metadata"]["blockExplorerUrl"]):
-                return True
-        
-        return False
+    resp = await http_client.get_client().post(BASE_RPC_URL, json=payload)
+    transfers = resp.json()["result"]["transfers"]
+    
+    for tx in transfers[-10:]:  # Last 10 txs
+        if (tx["rawContract"]["address"].lower() == USDC_CONTRACT.lower() and
+            int(tx["rawContract"]["value"]) >= expected_amount and
+            "memo" in tx["metadata"].get("blockExplorerUrl", "") and
+            payment_id in tx["metadata"]["blockExplorerUrl"]):
+            return True
+    
+    return False
@@ -0,0 +1,153 @@
+"""Readability-style main-content extraction for LLM prompts"""
+import math
+import re
+from typing import Dict, List
+
+# Elements that start a new text block
+BLOCK_TAGS = {
+    "address", "article", "aside", "blockquote", "br", "dd", "div", "dl", "dt", "fieldset",
+    "figcaption", "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header",
+    "hr", "li", "main", "nav", "ol", "p", "pre", "section", "table", "td", "th", "tr", "ul"
+}
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+# Text here is metadata, not page content (title/description are extracted separately)
+IGNORED_TAGS = {"head", "title", "script", "style", "noscript", "template"}
+
+# Containers whose text is almost never the article itself
+BOILERPLATE_TAGS = {"nav", "footer", "aside", "form", "button", "select", "iframe", "menu"}
+BOILERPLATE_HINTS = re.compile(
+    r"cookie|consent|gdpr|banner|navbar|\bnav\b|menu|footer|sidebar|breadcrumb|comment|share|social|"
+    r"related|promo|advert|\bads?\b|sponsor|subscribe|newsletter|popup|modal|skip-link",
+    re.IGNORECASE
+)
+CONTENT_HINTS = re.compile(r"article|content|\bmain\b|post|entry|story|body-text", re.IGNORECASE)
+
+# Blocks with fewer words are neutral: kept only inside the main region (headings, captions)
+MIN_BLOCK_WORDS = 8
+MAX_LINK_DENSITY = 0.5
+CHARS_PER_TOKEN = 4
+
+
+class BlockBuilder:
+    """
+    Turns a stream of start/end/data events into text blocks annotated with
+    link density and whether they sit inside boilerplate containers
+    """
+
+    def __init__(self):
+        self.blocks: List[Dict] = []
+        self._stack: List[tuple] = []  # (tag, is_boilerplate)
+        self._ignored_depth = 0
+        self._boilerplate_depth = 0
+        self._link_depth = 0
+        self._text: List[str] = []
+        self._link_chars = 0
+
+    def _block_tag(self) -> str:
+        for tag, _ in reversed(self._stack):
+            if tag in BLOCK_TAGS:
+                return tag
+        return "body"
+
+    def _flush(self) -> None:
+        text = " ".join("".join(self._text).split())
+        if text:
+            self.blocks.append({
+                "text": text,
+                "link_chars": self._link_chars,
+                "boilerplate": self._boilerplate_depth > 0,
+                "heading": self._block_tag() in HEADING_TAGS
+            })
+        self._text = []
+        self._link_chars = 0
+
+    def start(self, tag: str, attrs: Dict[str, str]) -> None:
+        if tag in BLOCK_TAGS:
+            self._flush()
+        if tag in VOID_TAGS:
+            return
+        hints = " ".join(filter(None, (attrs.get("class"), attrs.get("id"), attrs.get("role"))))
+        boilerplate = tag in BOILERPLATE_TAGS or bool(
+            hints and BOILERPLATE_HINTS.search(hints) and not CONTENT_HINTS.search(hints)
+        )
+        self._stack.append((tag, boilerplate))
+        self._ignored_depth += tag in IGNORED_TAGS
+        self._boilerplate_depth += boilerplate
+        self._link_depth += tag == "a"
+
+    def end(self, tag: str) -> None:
+        if tag in BLOCK_TAGS:
+            self._flush()
+        if tag in VOID_TAGS or not any(t == tag for t, _ in self._stack):
+            return
+        # Pop up to the matching tag, closing anything left open inside it
+        while self._stack:
+            open_tag, boilerplate = self._stack.pop()
+            self._ignored_depth -= open_tag in IGNORED_TAGS
+            self._boilerplate_depth -= boilerplate
+            self._link_depth -= open_tag == "a"
+            if open_tag == tag:
+                break
+
+    def data(self, text: str) -> None:
+        if self._ignored_depth:
+            return
+        self._text.append(text)
+        if self._link_depth:
+            self._link_chars += len(text.strip())
+
+    def close(self) -> List[Dict]:
+        self._flush()
+        return self.blocks
+
+
+def _score(block: Dict) -> float:
+    chars = len(block["text"])
+    link_density = block["link_chars"] / max(chars, 1)
+    if block["boilerplate"] or link_density > MAX_LINK_DENSITY:
+        return -float(max(chars, 25))
+    if len(block["text"].split()) < MIN_BLOCK_WORDS:
+        return 0.0
+    return chars * (1 - link_density)
+
+
+def select_main_content(blocks: List[Dict]) -> str:
+    """
+    Pick the contiguous run of blocks with the highest text-density score
+
+    Dense prose scores positive, link lists and boilerplate containers score
+    negative, short blocks are neutral; the best-scoring window (maximum
+    subarray) is the main content.
+    """
+    best, best_range = 0.0, None
+    total, start = 0.0, 0
+    scores = [_score(b) for b in blocks]
+    for i, score in enumerate(scores):
+        if total < 0:
+            total, start = 0.0, i
+        total += score
+        if total > best:
+            best, best_range = total, (start, i)
+
+    if best_range is None:
+        # No dense prose at all (landing pages, listings): keep whatever is not boilerplate
+        kept = [b["text"] for b, s in zip(blocks, scores) if s >= 0]
+    else:
+        first, last = best_range
+        kept = [b["text"] for b, s in zip(blocks[first:last + 1], scores[first:last + 1]) if s >= 0]
+    return "\n\n".join(kept)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for Gemini prompts (~4 characters per token)"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def prompt_text(text: str, max_tokens: int) -> str:
+    """Trim main content to a token budget, cutting at a paragraph boundary when possible"""
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text.rfind("\n\n", 0, limit)
+    return text[:cut if cut > limit // 2 else limit]
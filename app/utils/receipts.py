@@ -0,0 +1,100 @@
+"""Short-lived HMAC-signed payment receipts, so the next call spends a tx's remainder without the chain"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Shared by every worker process that should accept the same receipts
+RECEIPT_SECRET = os.getenv("RECEIPT_SECRET", "")
+RECEIPT_TTL = int(os.getenv("RECEIPT_TTL", "300"))
+# Receipts travel in PAYMENT-SIGNATURE like a tx hash; the prefix tells them apart
+RECEIPT_PREFIX = "rcpt_"
+
+
+def is_receipt(value: Optional[str]) -> bool:
+    return isinstance(value, str) and value.startswith(RECEIPT_PREFIX)
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+class ReceiptSigner:
+    """
+    Issues and checks receipt tokens
+
+    A token carries the tx hash, its value and what was left after the
+    call that issued it, the wallet it paid and an expiry, signed with
+    HMAC-SHA256. Like the tx hash it stands for, it pays for any service.
+    Checking one is pure CPU; the spend itself still goes through the
+    payment ledger, which caps it at the tx's remaining value.
+    """
+
+    def __init__(self, secret: str = RECEIPT_SECRET, ttl: int = RECEIPT_TTL, wallet: str = ""):
+        if not secret:
+            print("⚠️ RECEIPT_SECRET not set: payment receipts are only valid in this process")
+            secret = secrets.token_hex(32)
+        self._key = secret.encode()
+        self.ttl = ttl
+        self.wallet = (wallet or os.getenv("SERVER_WALLET_ADDRESS", "")).lower()
+        self._stats = {"issued": 0, "accepted": 0, "bad_signature": 0, "expired": 0, "wrong_wallet": 0}
+
+    def _sign(self, body: str) -> str:
+        return _b64encode(hmac.new(self._key, body.encode(), hashlib.sha256).digest())
+
+    def issue(self, tx_hash: str, value: int, remaining: int) -> str:
+        """
+        Args:
+            tx_hash: Payment the receipt spends from
+            value: Micro-USDC the tx paid
+            remaining: Micro-USDC left after the issuing call
+
+        Returns:
+            "rcpt_<payload>.<signature>"
+        """
+        payload = {
+            "tx": tx_hash, "v": value, "r": remaining, "to": self.wallet,
+            "exp": int(time.time()) + self.ttl
+        }
+        body = _b64encode(json.dumps(payload, separators=(",", ":")).encode())
+        self._stats["issued"] += 1
+        return f"{RECEIPT_PREFIX}{body}.{self._sign(body)}"
+
+    def verify(self, token: str) -> Optional[Dict[str, Any]]:
+        """Payload of a genuine, unexpired receipt for this wallet, else None"""
+        body, _, signature = token[len(RECEIPT_PREFIX):].partition(".")
+        if not hmac.compare_digest(self._sign(body), signature):
+            self._stats["bad_signature"] += 1
+            return None
+        try:
+            payload = json.loads(_b64decode(body))
+        except ValueError:
+            self._stats["bad_signature"] += 1
+            return None
+        if payload["exp"] < time.time():
+            self._stats["expired"] += 1
+            return None
+        if payload["to"] != self.wallet:
+            self._stats["wrong_wallet"] += 1
+            return None
+        self._stats["accepted"] += 1
+        return payload
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for the metrics endpoint"""
+        return {**self._stats, "ttl": self.ttl}
+
+
+receipt_signer = ReceiptSigner()
@@ -0,0 +1,257 @@
+"""Content-addressed cache for LLM-backed service results"""
+import functools
+import hashlib
+import inspect
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+from app.llm import gateway
+from app.utils.singleflight import singleflight
+from app.utils.speculation import speculator
+
+load_dotenv()
+
+# Seconds a result stays fresh, per service. 0 disables caching for the service:
+# generative services where callers expect a new draft each time, and code
+# review, which must always look at the code as submitted.
+DEFAULT_TTLS = {
+    "sentiment": 3600,
+    "translate": 86400,
+    "summarize": 3600,
+    "extract": 1800,
+    "email_finder": 86400,
+    "company_intel": 6 * 3600,
+    "research": 3600,
+    "market_intel": 6 * 3600,
+    "lead_gen": 3600,
+    "competitive": 12 * 3600,
+    "swot": 24 * 3600,
+    "trend_forecast": 6 * 3600,
+    "code_review": 0,
+    "content_gen": 0,
+    "seo_optimize": 0,
+    "social_schedule": 0,
+    "email_campaign": 0,
+    "bulk_content": 0,
+}
+
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# Expired entries are kept this many seconds longer so they can be served
+# (marked STALE) when a fresh computation fails
+RESULT_CACHE_STALE_SECONDS = int(os.getenv("RESULT_CACHE_STALE_SECONDS", "3600"))
+
+HIT = "HIT"
+MISS = "MISS"
+STALE = "STALE"
+BYPASS = "BYPASS"
+
+
+def get_ttl(service: str) -> int:
+    """TTL for a service; CACHE_TTL_<SERVICE> overrides the default"""
+    override = os.getenv(f"CACHE_TTL_{service.upper()}")
+    if override is not None:
+        return int(override)
+    return DEFAULT_TTLS.get(service, 0)
+
+
+def _normalize(value: Any, exact: bool = False) -> Any:
+    """
+    Canonical form of request data: sorted keys, strings stripped of
+    surrounding whitespace (left as sent when exact). Inner whitespace is
+    kept: in code, poetry or preformatted text it changes the meaning, and
+    so the result.
+    """
+    if hasattr(value, "model_dump"):
+        value = value.model_dump(mode="json")
+    if isinstance(value, dict):
+        return {str(k): _normalize(v, exact) for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v, exact) for v in value]
+    if isinstance(value, str) and not exact:
+        return value.strip()
+    return value
+
+
+def make_key(service: str, request: Any, model: str = "", prompt_version: str = "1", exact: bool = False) -> str:
+    """SHA-256 over (service, normalized request, model name, prompt version); exact keeps strings as sent"""
+    canonical = json.dumps(
+        {"service": service, "request": _normalize(request, exact), "model": model, "prompt_version": prompt_version},
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ResultCache:
+    """In-process LRU cache bounded by the total size of the stored results"""
+
+    def __init__(self, max_bytes: int = RESULT_CACHE_MAX_BYTES, stale_seconds: int = RESULT_CACHE_STALE_SECONDS):
+        self.max_bytes = max_bytes
+        self.stale_seconds = stale_seconds
+        self._entries: "OrderedDict[str, Tuple[float, str, str]]" = OrderedDict()
+        self._bytes = 0
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, service: str, event: str) -> None:
+        stats = self._stats.setdefault(service, {"hits": 0, "misses": 0, "stale": 0, "bypass": 0, "stores": 0, "unpaid": 0, "evictions": 0})
+        stats[event] += 1
+
+    def _remove(self, key: str) -> None:
+        _, _, payload = self._entries.pop(key)
+        self._bytes -= len(payload)
+
+    def get(self, key: str) -> Tuple[Optional[str], Any]:
+        """
+        Look up a key
+
+        Returns:
+            (HIT, value) for a fresh entry, (STALE, value) for an expired entry
+            still inside the stale window, (None, None) otherwise
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, None
+        expires_at, _, payload = entry
+        now = time.time()
+        if now > expires_at + self.stale_seconds:
+            self._remove(key)
+            return None, None
+        self._entries.move_to_end(key)
+        return (HIT if now <= expires_at else STALE), json.loads(payload)
+
+    def set(self, service: str, key: str, value: Any, ttl: int) -> None:
+        payload = json.dumps(value, default=str)
+        if len(payload) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.time() + ttl, service, payload)
+        self._bytes += len(payload)
+        self._count(service, "stores")
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._count(self._entries[oldest][1], "evictions")
+            self._remove(oldest)
+
+    def lookup(self, service: str, request: Any, model: str = "", prompt_version: str = "1") -> Tuple[str, Optional[str], Any]:
+        """
+        Cache check for callers that produce the result themselves (streamed
+        responses) and store it afterwards with set()
+
+        Returns:
+            (HIT, key, value) for a fresh entry, (MISS, key, None) otherwise,
+            or (BYPASS, None, None) when the service is not cached
+        """
+        if get_ttl(service) <= 0:
+            self._count(service, "bypass")
+            return BYPASS, None, None
+        key = make_key(service, request, model, prompt_version)
+        status, value = self.get(key)
+        if status == HIT:
+            self._count(service, "hits")
+            return HIT, key, value
+        self._count(service, "misses")
+        return MISS, key, None
+
+    async def get_or_compute(
+        self,
+        service: str,
+        request: Any,
+        compute: Callable[[], Awaitable[Any]],
+        model: str = "",
+        prompt_version: str = "1"
+    ) -> Tuple[Any, str]:
+        """
+        Return a cached result or compute and store it
+
+        Failed computations are never cached; if one fails while an expired
+        entry is still inside the stale window, that entry is served instead.
+        Services with caching disabled are never stored, but calls with
+        exactly the same payload that arrive while one is still running
+        share its result. A result computed speculatively is stored only
+        once the payment behind it is confirmed, so unpaid calls cannot
+        fill the cache; callers sharing it get it without waiting for that.
+
+        Returns:
+            (result, cache status) where status is HIT, MISS, STALE or BYPASS
+        """
+        ttl = get_ttl(service)
+        # Uncached services (code review, generation) only share a run with a byte-identical request
+        key = make_key(service, request, model, prompt_version, exact=ttl <= 0)
+        if ttl <= 0:
+            self._count(service, "bypass")
+            return await singleflight.do(key, compute, label=service), BYPASS
+
+        status, value = self.get(key)
+        if status == HIT:
+            self._count(service, "hits")
+            return value, HIT
+
+        async def fill():
+            result = await compute()
+            # Stored once the payment of the request that started the run is confirmed
+            speculator.when_paid(
+                lambda: self.set(service, key, result, ttl), lambda: self._count(service, "unpaid")
+            )
+            return result
+
+        try:
+            # Concurrent misses for the same key share one upstream computation
+            result = await singleflight.do(key, fill, label=service)
+        except Exception:
+            if status == STALE:
+                self._count(service, "stale")
+                return value, STALE
+            raise
+        self._count(service, "misses")
+        return result, MISS
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit-rate counters for the metrics endpoint"""
+        services = {}
+        for service, counts in self._stats.items():
+            lookups = counts["hits"] + counts["misses"] + counts["stale"]
+            services[service] = {**counts, "hit_rate": round(counts["hits"] / lookups, 3) if lookups else 0.0}
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "services": services
+        }
+
+
+result_cache = ResultCache()
+
+
+def cached_service(service: str, prompt_version: str = "1"):
+    """
+    Cache an async service function on its call arguments
+
+    The function's qualified name is part of the key, so services that share a
+    TTL name (e.g. app.services.analysis.swot_analysis and /agent/swot) never
+    share entries.
+    """
+    def decorator(fn):
+        signature = inspect.signature(fn)
+        name = f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            result, _ = await result_cache.get_or_compute(
+                service,
+                {"fn": name, "args": dict(bound.arguments)},
+                lambda: fn(*args, **kwargs),
+                model=gateway.model,
+                prompt_version=prompt_version
+            )
+            return result
+
+        return wrapper
+    return decorator
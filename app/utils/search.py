@@ -0,0 +1,273 @@
+"""Async web search with a pluggable provider, TTL cache and throttling backoff"""
+import asyncio
+import os
+import random
+import re
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from app.utils.crawler import normalize_url
+from app.utils.executor import run_blocking
+from app.utils.singleflight import singleflight
+from app.utils.speculation import speculator
+
+load_dotenv()
+
+try:
+    from ddgs import DDGS
+except ImportError:  # older package name
+    from duckduckgo_search import DDGS
+
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "900"))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "2048"))
+SEARCH_RETRIES = int(os.getenv("SEARCH_RETRIES", "3"))
+SEARCH_BACKOFF_BASE = float(os.getenv("SEARCH_BACKOFF_BASE", "1.0"))
+SEARCH_BACKOFF_MAX = float(os.getenv("SEARCH_BACKOFF_MAX", "8.0"))
+# Provider calls in flight across the whole app, so fan-outs cannot trip rate limits
+SEARCH_MAX_CONCURRENCY = int(os.getenv("SEARCH_MAX_CONCURRENCY", "4"))
+# Seconds a multi-query search stage waits before continuing with what it has
+SEARCH_STAGE_DEADLINE = float(os.getenv("SEARCH_STAGE_DEADLINE", "8"))
+
+_WORDS = re.compile(r"\w+")
+
+
+class SearchThrottled(Exception):
+    """The provider is rate limiting us (and retries did not get through)"""
+
+
+class SearchProvider(ABC):
+    """
+    Interface for search backends
+
+    text() returns result dicts with "title", "href" and "body" (the
+    DuckDuckGo shape) and raises SearchThrottled when rate limited.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    async def text(self, query: str, max_results: int) -> List[Dict[str, Any]]:
+        ...
+
+
+class DuckDuckGoProvider(SearchProvider):
+    """DDGS is synchronous, so calls run on the "search" thread pool"""
+
+    name = "duckduckgo"
+
+    def _text(self, query: str, max_results: int) -> List[Dict[str, Any]]:
+        try:
+            return list(DDGS().text(query, max_results=max_results) or [])
+        except Exception as e:
+            # Rate limits surface as RatelimitException (or a 202/429 message) depending on version
+            if "ratelimit" in type(e).__name__.lower() or re.search(r"\b(202|429)\b|rate ?limit", str(e), re.I):
+                raise SearchThrottled(str(e)) from e
+            raise
+
+    async def text(self, query: str, max_results: int) -> List[Dict[str, Any]]:
+        return await run_blocking("search", self._text, query, max_results)
+
+
+class StaticProvider(SearchProvider):
+    """
+    Local stand-in index for tests and benchmarks: ranks a fixed list of
+    documents by word overlap with the query, optionally after a delay
+    """
+
+    name = "static"
+
+    def __init__(self, documents: Iterable[Dict[str, Any]], latency: float = 0.0):
+        self.documents = list(documents)
+        self.latency = latency
+        self.calls = 0
+
+    async def text(self, query: str, max_results: int) -> List[Dict[str, Any]]:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        terms = set(_WORDS.findall(query.lower()))
+        scored = []
+        for position, doc in enumerate(self.documents):
+            words = set(_WORDS.findall(f"{doc.get('title', '')} {doc.get('body', '')}".lower()))
+            overlap = len(terms & words)
+            if overlap:
+                scored.append((-overlap, position, doc))
+        scored.sort(key=lambda item: item[:2])
+        return [dict(doc, score=round(-neg / max(len(terms), 1), 3)) for neg, _, doc in scored[:max_results]]
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a query, used as the cache key"""
+    return " ".join(query.lower().split())
+
+
+class SearchClient:
+    """
+    Cached, coalesced search over one provider
+
+    Results are cached per (normalized query, max_results) for the TTL;
+    concurrent identical queries share one provider call; throttling is
+    retried with jittered exponential backoff. Empty results are not
+    cached, since a soft-throttled provider often answers with nothing.
+    """
+
+    def __init__(
+        self,
+        provider: Optional[SearchProvider] = None,
+        ttl: int = SEARCH_CACHE_TTL,
+        max_entries: int = SEARCH_CACHE_MAX_ENTRIES,
+        retries: int = SEARCH_RETRIES,
+        max_concurrency: int = SEARCH_MAX_CONCURRENCY
+    ):
+        self.provider = provider or DuckDuckGoProvider()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.retries = retries
+        self.max_concurrency = max_concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._cache: "OrderedDict[Tuple[str, int], Tuple[float, List[Dict]]]" = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "throttled": 0, "retries": 0, "errors": 0, "unpaid": 0}
+
+    def configure(self, provider: Optional[SearchProvider] = None) -> None:
+        """Swap the provider (e.g. a StaticProvider in tests) and clear the cache"""
+        self.provider = provider or DuckDuckGoProvider()
+        self._cache.clear()
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def _fetch(self, query: str, max_results: int) -> List[Dict[str, Any]]:
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._get_semaphore():
+                    return await self.provider.text(query, max_results)
+            except SearchThrottled:
+                self._stats["throttled"] += 1
+                if attempt == self.retries:
+                    raise
+                self._stats["retries"] += 1
+                delay = min(SEARCH_BACKOFF_MAX, SEARCH_BACKOFF_BASE * 2 ** attempt)
+                await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+        return []
+
+    async def search(self, query: str, max_results: int = 5) -> List[Dict[str, Any]]:
+        """
+        Search the web
+
+        Args:
+            query: Search query
+            max_results: Number of results wanted
+
+        Returns:
+            List of {"title", "href", "body", ...} dicts (copies; safe to mutate)
+        """
+        key = (normalize_query(query), max_results)
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] > time.time():
+            self._cache.move_to_end(key)
+            self._stats["hits"] += 1
+            return [dict(r) for r in entry[1]]
+
+        def store(results):
+            self._cache[key] = (time.time() + self.ttl, results)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+        async def fill():
+            results = await self._fetch(query, max_results)
+            if results:
+                # Speculative (not yet paid) searches are cached only once paid
+                speculator.when_paid(lambda: store(results), self._count_unpaid)
+            return results
+
+        self._stats["misses"] += 1
+        try:
+            results = await singleflight.do(f"search:{key[0]}:{max_results}", fill, label="search")
+        except Exception:
+            self._stats["errors"] += 1
+            raise
+        return [dict(r) for r in results]
+
+    def _count_unpaid(self) -> None:
+        self._stats["unpaid"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "provider": self.provider.name,
+            "entries": len(self._cache),
+            "hit_rate": round(self._stats["hits"] / lookups, 3) if lookups else 0.0
+        }
+
+
+search_client = SearchClient()
+search = search_client.search
+
+
+async def search_many(
+    queries: List[str], max_results: int = 5, deadline: float = SEARCH_STAGE_DEADLINE
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Run several searches concurrently and merge them, deduplicated by URL
+
+    Queries still running when the deadline passes are cancelled and the
+    stage continues with partial results; failed queries are skipped.
+
+    Returns:
+        (results in query order, report with per-query outcome and elapsed_ms)
+    """
+    started = time.perf_counter()
+    tasks = [asyncio.ensure_future(search(q, max_results)) for q in queries]
+    pending = set()
+    if tasks:
+        _, pending = await asyncio.wait(tasks, timeout=deadline)
+        for task in pending:
+            task.cancel()
+
+    merged, seen = [], set()
+    report = {"queries": len(queries), "completed": 0, "failed": [], "timed_out": [], "duplicates": 0}
+    for query, task in zip(queries, tasks):
+        if task in pending:
+            report["timed_out"].append(query)
+            continue
+        if task.exception() is not None:
+            report["failed"].append(query)
+            continue
+        report["completed"] += 1
+        for result in task.result():
+            href = result.get("href") or ""
+            key = normalize_url(href) or href
+            if key and key in seen:
+                report["duplicates"] += 1
+                continue
+            seen.add(key)
+            merged.append(result)
+    report["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return merged, report
+
+
+def web_results(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Raw results in the {"title", "url", "content", "score"} shape the service modules use"""
+    return [
+        {"title": r.get("title", ""), "url": r.get("href", ""), "content": r.get("body", ""), "score": r.get("score", 0.8)}
+        for r in results
+    ]
+
+
+async def search_web(query: str, max_results: int = 5) -> List[Dict[str, Any]]:
+    """search() in the web_results() shape; errors are logged and give an empty list"""
+    print(f"🔍 Searching for: {query}")
+    try:
+        results = await search(query, max_results)
+    except Exception as e:
+        print(f"❌ Search error: {e}")
+        return []
+    print(f"✅ Found {len(results)} results")
+    return web_results(results)
@@ -0,0 +1,83 @@
+"""In-process coalescing of concurrent identical requests"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Run at most one computation per key at a time
+
+    The first caller for a key starts the work as a separate task; callers that
+    arrive while it is running await the same task and share its result or
+    exception. A caller being cancelled never cancels the shared work unless it
+    was the last one waiting for it.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, label: str, event: str) -> None:
+        stats = self._stats.setdefault(label, {"executions": 0, "coalesced": 0})
+        stats[event] += 1
+
+    def _forget(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def _finished(self, key: str, call: _Call, task: asyncio.Task) -> None:
+        self._forget(key, call)
+        # Mark the exception as retrieved even if every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]], label: str = "default") -> Any:
+        """
+        Run fn() once for all concurrent callers with the same key
+
+        Args:
+            key: Normalized request hash
+            fn: Coroutine function doing the upstream work
+            label: Service name used for the saved-call counters
+
+        Returns:
+            The shared result (exceptions from fn propagate to every caller)
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda task: self._finished(key, call, task))
+            self._count(label, "executions")
+        else:
+            self._count(label, "coalesced")
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Nobody is left to receive the result: stop the upstream work and
+                # make sure a new caller starts fresh instead of joining it
+                self._forget(key, call)
+                call.task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        """Upstream calls saved by coalescing, per service"""
+        return {
+            "in_flight": len(self._calls),
+            "upstream_calls_saved": sum(s["coalesced"] for s in self._stats.values()),
+            "services": dict(self._stats)
+        }
+
+
+singleflight = SingleFlight()
@@ -0,0 +1,196 @@
+"""Speculative execution: run a paid handler while its payment is still being verified"""
+import asyncio
+import contextvars
+import functools
+import inspect
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SPECULATIVE_EXECUTION = os.getenv("SPECULATIVE_EXECUTION", "false").lower() == "true"
+# Unverified handlers allowed to run at once; beyond this, requests verify first as usual
+SPECULATIVE_MAX_INFLIGHT = int(os.getenv("SPECULATIVE_MAX_INFLIGHT", "8"))
+
+
+class _Speculation:
+    """Per-request state shared by the handler wrapper and require_payment"""
+
+    def __init__(self):
+        self.handler: Optional[asyncio.Task] = None
+        self.verification: Optional[asyncio.Task] = None
+        self.verify_ms = 0.0
+
+
+_current: contextvars.ContextVar[Optional[_Speculation]] = contextvars.ContextVar("speculation", default=None)
+
+
+class Speculator:
+    """
+    Overlaps payment verification with the service work it pays for
+
+    A wrapped handler runs as a task. When require_payment hands its
+    verification to start(), it runs alongside instead of in front of the
+    handler; the handler's result is released only once verification
+    passes. A failed verification cancels the handler (or throws away its
+    result if it already finished) and the rejection is returned instead.
+    Shared state (the result, search and page caches) is written through
+    when_paid(), so only paid work fills it.
+    """
+
+    def __init__(self, enabled: bool = SPECULATIVE_EXECUTION, max_inflight: int = SPECULATIVE_MAX_INFLIGHT):
+        self.enabled = enabled
+        self.max_inflight = max_inflight
+        self._inflight = 0
+        self._writes: Set[asyncio.Task] = set()
+        self._stats = {
+            "speculated": 0, "confirmed": 0, "rejected": 0, "completed_unpaid": 0, "skipped_cap": 0,
+            "saved_ms": 0.0, "wasted_ms": 0.0
+        }
+
+    def wrap(self, handler: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        """Decorator for endpoint handlers that call require_payment"""
+
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            if not self.enabled or _current.get() is not None:
+                # Nested call (a batch item): the outer request's speculation covers it
+                return await handler(*args, **kwargs)
+            speculation = _Speculation()
+            token = _current.set(speculation)
+            try:
+                task = asyncio.ensure_future(handler(*args, **kwargs))
+            finally:
+                _current.reset(token)
+            speculation.handler = task
+            started = time.perf_counter()
+            try:
+                await asyncio.wait({task})
+            except asyncio.CancelledError:
+                task.cancel()
+                if speculation.verification is not None:
+                    speculation.verification.cancel()
+                raise
+            work_ms = (time.perf_counter() - started) * 1000
+            if speculation.verification is None:
+                return task.result()
+
+            rejection = await speculation.verification
+            if rejection is not None:
+                self._stats["rejected"] += 1
+                self._stats["wasted_ms"] += work_ms
+                if not task.cancelled():
+                    self._stats["completed_unpaid"] += 1
+                    task.exception()  # unpaid result or error, discarded either way
+                return rejection
+            self._stats["confirmed"] += 1
+            # Serial would have been verify + work; overlapped it is the longer of the two
+            self._stats["saved_ms"] += min(speculation.verify_ms, work_ms)
+            return task.result()
+
+        return wrapper
+
+    def start(self, verify: Callable[[], Awaitable[Optional[Any]]]) -> bool:
+        """
+        Run verify() in the background if the current request is speculative
+
+        Args:
+            verify: Coroutine function returning None if paid, else the
+                rejection response
+
+        Returns:
+            True if verification was started (the caller carries on unpaid),
+            False if it must verify inline (not wrapped, disabled, or at cap)
+        """
+        speculation = _current.get()
+        if speculation is None or speculation.verification is not None or speculation.handler is None:
+            return False
+        if self._inflight >= self.max_inflight:
+            self._stats["skipped_cap"] += 1
+            return False
+        self._inflight += 1
+        self._stats["speculated"] += 1
+
+        async def run():
+            started = time.perf_counter()
+            try:
+                rejection = await verify()
+            except BaseException:
+                speculation.handler.cancel()
+                raise
+            finally:
+                self._inflight -= 1
+                speculation.verify_ms = (time.perf_counter() - started) * 1000
+            if rejection is not None:
+                speculation.handler.cancel()
+            return rejection
+
+        speculation.verification = asyncio.ensure_future(run())
+        return True
+
+    async def confirmed(self) -> Optional[Any]:
+        """
+        Wait for the current request's payment before a side effect that
+        cannot be undone (queueing a job, for instance)
+
+        Returns:
+            None once paid (or if nothing is pending), else the rejection
+        """
+        speculation = _current.get()
+        if speculation is None or speculation.verification is None:
+            return None
+        return await asyncio.shield(speculation.verification)
+
+    def when_paid(self, write: Callable[[], Any], dropped: Optional[Callable[[], Any]] = None) -> Any:
+        """
+        Write shared state once the current request's payment checks out,
+        without waiting for it
+
+        Work shared through singleflight runs in the context of the request
+        that started it; deferring the write (rather than awaiting verification
+        here) keeps paid callers that joined it from waiting on that request's
+        verification.
+
+        Args:
+            write: Called now if nothing is pending, else once verification
+                passes (a coroutine it returns then runs as a task)
+            dropped: Called instead if verification is rejected, fails or
+                is cancelled
+
+        Returns:
+            What write() returned if it ran now (for the caller to await),
+            else None
+        """
+        def run(callback):
+            if callback is not None and inspect.isawaitable(outcome := callback()):
+                task = asyncio.ensure_future(outcome)
+                self._writes.add(task)
+                task.add_done_callback(self._writes.discard)
+
+        speculation = _current.get()
+        if speculation is None or speculation.verification is None:
+            return write()
+
+        def settled(verification: asyncio.Task):
+            paid = not verification.cancelled() and verification.exception() is None and verification.result() is None
+            run(write if paid else dropped)
+
+        speculation.verification.add_done_callback(settled)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for the metrics endpoint"""
+        return {
+            **self._stats,
+            "saved_ms": round(self._stats["saved_ms"], 1),
+            "wasted_ms": round(self._stats["wasted_ms"], 1),
+            "enabled": self.enabled,
+            "in_flight": self._inflight,
+            "max_inflight": self.max_inflight
+        }
+
+
+speculator = Speculator()
+speculative = speculator.wrap
@@ -0,0 +1,49 @@
+"""NDJSON and Server-Sent Events responses for incremental results"""
+import json
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from fastapi.responses import StreamingResponse
+
+NDJSON = "ndjson"
+SSE = "sse"
+
+MEDIA_TYPES = {NDJSON: "application/x-ndjson", SSE: "text/event-stream"}
+
+
+def stream_format(requested: Optional[str] = None, accept: Optional[str] = None) -> Optional[str]:
+    """
+    Pick the streaming format from an explicit request field or the Accept
+    header; None means the client wants a single JSON response
+    """
+    if requested:
+        requested = requested.lower()
+        return requested if requested in MEDIA_TYPES else None
+    accept = (accept or "").lower()
+    if MEDIA_TYPES[SSE] in accept:
+        return SSE
+    if MEDIA_TYPES[NDJSON] in accept:
+        return NDJSON
+    return None
+
+
+def encode_event(fmt: str, event: str, data: Dict[str, Any]) -> str:
+    """One NDJSON line ({"event": ..., **data}) or one SSE event"""
+    if fmt == SSE:
+        return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+    return json.dumps({"event": event, **data}, default=str) + "\n"
+
+
+def event_stream(events: AsyncIterator[Tuple[str, Dict[str, Any]]], fmt: str) -> StreamingResponse:
+    """
+    Stream (event name, payload) pairs in the given format
+
+    Closing the response (client disconnect) closes the events iterator, so
+    producers should release their work in a finally block.
+    """
+    async def body():
+        async for event, data in events:
+            yield encode_event(fmt, event, data)
+
+    # no-transform/X-Accel-Buffering keep proxies from holding events back
+    headers = {"Cache-Control": "no-cache, no-transform", "X-Accel-Buffering": "no"}
+    return StreamingResponse(body(), media_type=MEDIA_TYPES[fmt], headers=headers)
@@ -0,0 +1,320 @@
+"""Embedded structured data (JSON-LD, OpenGraph, microdata, meta) and field matching"""
+import json
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Sources, in the order they are trusted
+JSON_LD = "json-ld"
+MICRODATA = "microdata"
+OPENGRAPH = "opengraph"
+META = "meta"
+HTML = "html"
+LLM = "llm"
+
+# Canonical field -> lookups tried in order: (source, key or dotted JSON-LD path)
+FIELD_LOOKUPS = {
+    "title": ((JSON_LD, "headline"), (JSON_LD, "name"), (MICRODATA, "headline"), (MICRODATA, "name"),
+              (OPENGRAPH, "og:title"), (META, "twitter:title"), (HTML, "title")),
+    "description": ((JSON_LD, "description"), (MICRODATA, "description"), (OPENGRAPH, "og:description"),
+                    (META, "description"), (META, "twitter:description")),
+    "price": ((JSON_LD, "offers.price"), (JSON_LD, "offers.lowPrice"), (MICRODATA, "price"),
+              (OPENGRAPH, "product:price:amount"), (OPENGRAPH, "og:price:amount")),
+    "currency": ((JSON_LD, "offers.priceCurrency"), (MICRODATA, "priceCurrency"),
+                 (OPENGRAPH, "product:price:currency"), (OPENGRAPH, "og:price:currency")),
+    "author": ((JSON_LD, "author.name"), (MICRODATA, "author"), (META, "author"), (OPENGRAPH, "article:author")),
+    "date_published": ((JSON_LD, "datePublished"), (MICRODATA, "datePublished"),
+                       (OPENGRAPH, "article:published_time"), (META, "date"), (META, "pubdate")),
+    "date_modified": ((JSON_LD, "dateModified"), (MICRODATA, "dateModified"),
+                      (OPENGRAPH, "article:modified_time"), (OPENGRAPH, "og:updated_time")),
+    "image": ((JSON_LD, "image.url"), (OPENGRAPH, "og:image"), (META, "twitter:image"), (MICRODATA, "image")),
+    "url": ((JSON_LD, "url"), (OPENGRAPH, "og:url"), (MICRODATA, "url")),
+    "site_name": ((OPENGRAPH, "og:site_name"), (JSON_LD, "publisher.name")),
+    "brand": ((JSON_LD, "brand.name"), (MICRODATA, "brand")),
+    "sku": ((JSON_LD, "sku"), (MICRODATA, "sku")),
+    "rating": ((JSON_LD, "aggregateRating.ratingValue"), (MICRODATA, "ratingValue")),
+    "availability": ((JSON_LD, "offers.availability"), (MICRODATA, "availability"),
+                     (OPENGRAPH, "product:availability")),
+    "keywords": ((JSON_LD, "keywords"), (META, "keywords")),
+}
+
+# Spellings callers use in extraction schemas -> canonical field
+FIELD_SYNONYMS = {
+    "name": "title", "headline": "title", "pagetitle": "title",
+    "summary": "description", "desc": "description",
+    "cost": "price", "amount": "price",
+    "pricecurrency": "currency",
+    "authorname": "author", "byline": "author", "writer": "author",
+    "date": "date_published", "datepublished": "date_published", "published": "date_published",
+    "publisheddate": "date_published", "publishdate": "date_published", "publicationdate": "date_published",
+    "pubdate": "date_published",
+    "datemodified": "date_modified", "modified": "date_modified", "updated": "date_modified",
+    "lastmodified": "date_modified", "updateddate": "date_modified",
+    "imageurl": "image", "thumbnail": "image",
+    "canonicalurl": "url", "link": "url",
+    "sitename": "site_name", "site": "site_name", "publisher": "site_name",
+    "ratingvalue": "rating",
+}
+
+OPENGRAPH_PREFIXES = ("og:", "article:", "product:", "book:", "profile:", "music:", "video:")
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]")
+
+# Fast-path counters for the metrics endpoint
+_stats = {"requests": 0, "llm_calls_avoided": 0, "fields_from_page": 0, "fields_from_llm": 0}
+
+
+def _compact(name: str) -> str:
+    return _NON_ALNUM.sub("", name.lower())
+
+
+def _json_ld_entities(blocks: Iterable[str]) -> List[Dict]:
+    entities = []
+    for block in blocks:
+        block = block.strip()
+        if block.startswith("<!--"):
+            block = block[4:].rsplit("-->", 1)[0]
+        try:
+            data = json.loads(block)
+        except ValueError:
+            continue
+        stack = data if isinstance(data, list) else [data]
+        for item in stack:
+            if isinstance(item, dict):
+                entities.append(item)
+                graph = item.get("@graph")
+                if isinstance(graph, list):
+                    entities.extend(g for g in graph if isinstance(g, dict))
+    return entities
+
+
+def _meta(values: Dict[str, str], opengraph: Dict, meta: Dict) -> None:
+    content = values.get("content")
+    if content is None:
+        return
+    prop = (values.get("property") or "").strip().lower()
+    name = (values.get("name") or "").strip().lower()
+    if prop.startswith(OPENGRAPH_PREFIXES):
+        opengraph.setdefault(prop, content.strip())
+    if name:
+        meta.setdefault(name, content.strip())
+    elif prop and not prop.startswith(OPENGRAPH_PREFIXES):
+        meta.setdefault(prop, content.strip())
+
+
+def _itemprop_value(tag: str, attrs: Dict[str, str]) -> Optional[str]:
+    for attr in ("content", "datetime", "href", "src"):
+        if attrs.get(attr) is not None and (attr == "content" or tag in ("a", "link", "img", "time", "meta", "source")):
+            return attrs[attr].strip()
+    return None
+
+
+def _item_type(attrs: Dict[str, str]) -> str:
+    return (attrs.get("itemtype") or "").rstrip("/").rsplit("/", 1)[-1]
+
+
+def collect_lxml(root) -> Dict:
+    """Structured data from an lxml document (call before script elements are stripped)"""
+    opengraph: Dict[str, str] = {}
+    meta: Dict[str, str] = {}
+    for element in root.iter("meta"):
+        _meta(element.attrib, opengraph, meta)
+
+    microdata = []
+    for item in root.xpath("//*[@itemscope]"):
+        properties: Dict[str, str] = {}
+        for prop in item.xpath(".//*[@itemprop]"):
+            if prop.xpath("ancestor::*[@itemscope][1]")[0] is not item:
+                continue
+            value = _itemprop_value(prop.tag, prop.attrib)
+            if value is None:
+                value = " ".join(prop.text_content().split())
+            for name in prop.get("itemprop").split():
+                properties.setdefault(name, value)
+        microdata.append({"type": _item_type(item.attrib), "properties": properties})
+
+    blocks = root.xpath('//script[translate(@type, "LDJSON", "ldjson")="application/ld+json"]/text()')
+    return {"json_ld": _json_ld_entities(blocks), "opengraph": opengraph, "meta": meta, "microdata": microdata}
+
+
+class StructuredCollector:
+    """Event-driven collection of the same data, for the stdlib parser"""
+
+    VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+    MAX_CAPTURE = 1000
+
+    def __init__(self):
+        self.opengraph: Dict[str, str] = {}
+        self.meta: Dict[str, str] = {}
+        self.microdata: List[Dict] = []
+        self._json_ld: List[str] = []
+        self._script: Optional[List[str]] = None
+        self._depth = 0
+        self._items: List[Tuple[int, Dict]] = []  # open itemscopes: (depth, item)
+        self._captures: List[Tuple[int, Dict, List[str], List[str]]] = []  # (depth, properties, names, text)
+
+    def start(self, tag: str, attrs: Dict[str, str]) -> None:
+        if tag == "meta":
+            _meta(attrs, self.opengraph, self.meta)
+        elif tag == "script" and (attrs.get("type") or "").lower() == "application/ld+json":
+            self._script = []
+        if tag in self.VOID_TAGS:
+            value = _itemprop_value(tag, attrs)
+            if "itemprop" in attrs and self._items and value is not None:
+                for name in (attrs.get("itemprop") or "").split():
+                    self._items[-1][1]["properties"].setdefault(name, value)
+            return
+
+        self._depth += 1
+        if "itemprop" in attrs and self._items:
+            properties = self._items[-1][1]["properties"]
+            names = (attrs.get("itemprop") or "").split()
+            value = _itemprop_value(tag, attrs)
+            if value is not None:
+                for name in names:
+                    properties.setdefault(name, value)
+            else:
+                self._captures.append((self._depth, properties, names, []))
+        if "itemscope" in attrs:
+            item = {"type": _item_type(attrs), "properties": {}}
+            self.microdata.append(item)
+            self._items.append((self._depth, item))
+
+    def end(self, tag: str) -> None:
+        if tag == "script" and self._script is not None:
+            self._json_ld.append("".join(self._script))
+            self._script = None
+        if tag in self.VOID_TAGS or self._depth == 0:
+            return
+        while self._captures and self._captures[-1][0] >= self._depth:
+            _, properties, names, text = self._captures.pop()
+            for name in names:
+                properties.setdefault(name, " ".join("".join(text).split())[:self.MAX_CAPTURE])
+        while self._items and self._items[-1][0] >= self._depth:
+            self._items.pop()
+        self._depth -= 1
+
+    def data(self, text: str) -> None:
+        if self._script is not None:
+            self._script.append(text)
+        for capture in self._captures:
+            if sum(map(len, capture[3])) < self.MAX_CAPTURE:
+                capture[3].append(text)
+
+    def result(self) -> Dict:
+        return {
+            "json_ld": _json_ld_entities(self._json_ld),
+            "opengraph": self.opengraph,
+            "meta": self.meta,
+            "microdata": self.microdata
+        }
+
+
+def _json_ld_path(entity: Any, path: str) -> Any:
+    value = entity
+    for part in path.split("."):
+        if isinstance(value, list):
+            value = value[0] if value else None
+        if not isinstance(value, dict):
+            return None
+        key = next((k for k in value if k.lower() == part.lower()), None)
+        if key is None:
+            return None
+        value = value[key]
+    return value
+
+
+def _scalar(value: Any) -> Any:
+    """Reduce a JSON-LD value to something a caller would expect in one field"""
+    if isinstance(value, list):
+        values = [_scalar(v) for v in value]
+        values = [v for v in values if v not in (None, "")]
+        if not values:
+            return None
+        return values[0] if len(values) == 1 or not all(isinstance(v, str) for v in values) else ", ".join(values)
+    if isinstance(value, dict):
+        for key in ("name", "url", "@value", "@id"):
+            if isinstance(value.get(key), (str, int, float)):
+                return value[key]
+        return None
+    if isinstance(value, str):
+        return value.strip() or None
+    return value
+
+
+def _lookup(structured: Dict, parsed: Dict, source: str, key: str) -> Any:
+    if source == JSON_LD:
+        for entity in structured.get("json_ld", []):
+            value = _scalar(_json_ld_path(entity, key))
+            if value is not None:
+                return value
+    elif source == MICRODATA:
+        wanted = key.lower()
+        for item in structured.get("microdata", []):
+            for name, value in item["properties"].items():
+                if name.lower() == wanted and value:
+                    return value
+    elif source == OPENGRAPH:
+        return structured.get("opengraph", {}).get(key.lower()) or None
+    elif source == META:
+        return structured.get("meta", {}).get(key.lower()) or None
+    elif source == HTML:
+        return parsed.get(key) or None
+    return None
+
+
+def _coerce(value: Any, type_hint: Any) -> Any:
+    """Honour simple schema type hints ("number", "integer") for string values"""
+    if isinstance(value, str) and isinstance(type_hint, str) and type_hint.lower() in ("number", "float", "int", "integer"):
+        try:
+            number = float(value.replace(",", ""))
+        except ValueError:
+            return value
+        return int(number) if type_hint.lower() in ("int", "integer") and number.is_integer() else number
+    return value
+
+
+def fill_fields(schema: Dict[str, Any], structured: Dict, parsed: Dict) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """
+    Fill extraction-schema fields from structured data without an LLM
+
+    Known fields (title, price, author, dates, ...) and their common
+    spellings use curated lookups; any other field is looked up by name in
+    JSON-LD, microdata, OpenGraph (og:<field>) and meta tags.
+
+    Args:
+        schema: Field name -> type hint or description
+        structured: The parser's "structured" field
+        parsed: Other parsed fields (title, description) used as a last resort
+
+    Returns:
+        (values, sources) for the fields that could be filled
+    """
+    values: Dict[str, Any] = {}
+    sources: Dict[str, str] = {}
+    for field, type_hint in schema.items():
+        compact = _compact(field)
+        canonical = FIELD_SYNONYMS.get(compact, field.lower() if field.lower() in FIELD_LOOKUPS else compact)
+        lookups = FIELD_LOOKUPS.get(canonical) or (
+            (JSON_LD, field), (MICRODATA, field), (OPENGRAPH, f"og:{field}"), (META, field)
+        )
+        for source, key in lookups:
+            value = _lookup(structured, parsed, source, key)
+            if value not in (None, ""):
+                values[field] = _coerce(value, type_hint)
+                sources[field] = source
+                break
+    return values, sources
+
+
+def record(filled: int, missing: int) -> None:
+    """Count one extraction: fields filled from page data vs left to the LLM"""
+    _stats["requests"] += 1
+    _stats["fields_from_page"] += filled
+    _stats["fields_from_llm"] += missing
+    if not missing:
+        _stats["llm_calls_avoided"] += 1
+
+
+def stats() -> Dict[str, Any]:
+    total = _stats["fields_from_page"] + _stats["fields_from_llm"]
+    return {**_stats, "page_field_rate": round(_stats["fields_from_page"] / total, 3) if total else 0.0}
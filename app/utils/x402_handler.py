@@ -4,6 +4,7 @@ from fastapi import HTTPException, Request
 from dotenv import load_dotenv
 import json
 import base64
+from app.utils import http_client
 
 load_dotenv()
 
@@ -105,35 +106,32 @@ async def verify_with_facilitator(payment_signature: str, amount_usd: float, ser
     """
     Call CDP x402 facilitator to verify payment
     """
-    import httpx
-    
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{FACILITATOR_URL}/verify",
-                json={
-                    "signature": payment_signature,
-                    "amount": int(amount_usd * 1_000_000),
-                    "network": CHAIN_ID,
-                    "recipient": SERVER_WALLET,
-                    "service_id": service_id
-                },
-                timeout=10.0
-            )
+        response = await http_client.get_client().post(
+            f"{FACILITATOR_URL}/verify",
+            json={
+                "signature": payment_signature,
+                "amount": int(amount_usd * 1_000_000),
+                "network": CHAIN_ID,
+                "recipient": SERVER_WALLET,
+                "service_id": service_id
+            },
+            timeout=10.0
+        )
+        
+        if response.status_code == 200:
+            result = response.json()
+            return {
+                "verified": True,
+                "tx_hash": result.get("transaction_hash"),
+                "amount": result.get("amount")
+            }
+        else:
+            return {
+                "verified": False,
+                "error": f"Facilitator returned {response.status_code}"
+            }
             
-            if response.status_code == 200:
-                result = response.json()
-                return {
-                    "verified": True,
-                    "tx_hash": result.get("transaction_hash"),
-                    "amount": result.get("amount")
-                }
-            else:
-                return {
-                    "verified": False,
-                    "error": f"Facilitator returned {response.status_code}"
-                }
-                
     except Exception as e:
         return {
             "verified": False,
@@ -0,0 +1,129 @@
+"""Microbenchmark: BeautifulSoup html.parser path vs app.utils.html_parser - LOCAL VERSION
+
+Usage:
+    python bench_html_parse.py [corpus_dir]
+
+corpus_dir holds saved pages (*.html). Without one, synthetic pages of
+roughly 10 KB, 200 KB and 2 MB are generated. Also measures how long the event
+loop stalls while a large page is parsed on the old path vs parse_page.
+"""
+import asyncio
+import glob
+import os
+import statistics
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+from app.utils.executor import shutdown_pools
+from app.utils.html_parser import lxml_html, parse_html, parse_page
+
+RUNS = int(os.getenv("BENCH_RUNS", "5"))
+SCRAPE_FIELDS = ("title", "text", "links", "images")
+
+
+def synthetic_page(paragraphs: int) -> str:
+    nav = "".join(f'<li><a href="/section/{i}">Section {i}</a></li>' for i in range(40))
+    body = "".join(
+        f'<div class="post"><h2>Heading {i}</h2><p>Paragraph {i} with <a href="/p/{i}">a link</a> and '
+        f'<b>some</b> inline text that goes on for a while to look like an article.</p>'
+        f'<img src="/img/{i}.png"></div>'
+        for i in range(paragraphs)
+    )
+    script = "<script>var data = {" + ",".join(f'"k{i}": {i}' for i in range(200)) + "};</script>"
+    return (
+        f"<html><head><title>Synthetic {paragraphs}</title>"
+        f'<meta name="description" content="synthetic page">{script}</head>'
+        f"<body><nav><ul>{nav}</ul></nav><h1>Synthetic</h1>{body}<footer>footer</footer></body></html>"
+    )
+
+
+def load_corpus(directory: str):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.html"))):
+        with open(path, "rb") as f:
+            pages.append((os.path.basename(path), f.read().decode("utf-8", "replace")))
+    return pages
+
+
+def current_path(html: str) -> dict:
+    """What /agent/scrape did before: full html.parser tree, then search it"""
+    soup = BeautifulSoup(html, "html.parser")
+    return {
+        "title": soup.title.string if soup.title else None,
+        "text": soup.get_text()[:5000],
+        "links": [a.get("href") for a in soup.find_all("a", href=True)][:50],
+        "images": [img.get("src") for img in soup.find_all("img", src=True)][:20],
+    }
+
+
+def timed(fn, html: str) -> float:
+    samples = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        fn(html)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+async def max_loop_stall(work) -> float:
+    """Largest gap between 1 ms ticks of a concurrent task while work() runs"""
+    stall = 0.0
+    done = asyncio.Event()
+
+    async def ticker():
+        nonlocal stall
+        last = time.perf_counter()
+        while not done.is_set():
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            stall = max(stall, now - last)
+            last = now
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    await work()
+    done.set()
+    await task
+    return stall * 1000
+
+
+async def stall_comparison(html: str):
+    await parse_page(html, SCRAPE_FIELDS)  # warm up the worker process
+
+    async def old():
+        current_path(html)
+
+    async def new():
+        await parse_page(html, SCRAPE_FIELDS)
+
+    return await max_loop_stall(old), await max_loop_stall(new)
+
+
+def main():
+    if len(sys.argv) > 1:
+        pages = load_corpus(sys.argv[1])
+    else:
+        pages = [(f"synthetic-{n}", synthetic_page(n)) for n in (40, 800, 8000)]
+
+    print("\n" + "=" * 78)
+    print(f"🚀 HTML PARSE BENCHMARK (median of {RUNS} runs, fields: {', '.join(SCRAPE_FIELDS)})")
+    print("=" * 78)
+    print(f"{'page':<28}{'size':>10}{'bs4 html.parser':>17}{'lxml':>10}{'stdlib':>10}")
+    for name, html in pages:
+        bs4_ms = timed(current_path, html)
+        lxml_ms = timed(lambda h: parse_html(h, SCRAPE_FIELDS, engine="lxml"), html) if lxml_html is not None else float("nan")
+        stdlib_ms = timed(lambda h: parse_html(h, SCRAPE_FIELDS, engine="stdlib"), html)
+        print(f"{name[:27]:<28}{len(html) // 1024:>8}KB{bs4_ms:>15.1f}ms{lxml_ms:>8.1f}ms{stdlib_ms:>8.1f}ms")
+
+    largest = max(pages, key=lambda p: len(p[1]))
+    old_stall, new_stall = asyncio.run(stall_comparison(largest[1]))
+    print(f"\nEvent-loop stall parsing {largest[0]} ({len(largest[1]) // 1024} KB):")
+    print(f"  bs4 on the loop : {old_stall:.1f}ms")
+    print(f"  parse_page      : {new_stall:.1f}ms")
+    shutdown_pools(wait=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Benchmark: fresh httpx client per request vs the shared pooled client - LOCAL VERSION
+
+Starts a local HTTPS stand-in with a self-signed certificate (generated with
+the openssl CLI) and fetches it N times with both strategies, reporting wall
+time and how many TCP+TLS handshakes the server saw.
+"""
+import asyncio
+import os
+import ssl
+import subprocess
+import tempfile
+import time
+
+import httpx
+
+from app.utils.http_client import create_client
+
+REQUESTS = int(os.getenv("BENCH_REQUESTS", "200"))
+CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "10"))
+BODY = b"<html><head><title>stand-in</title></head><body>" + b"x" * 2048 + b"</body></html>"
+
+
+class StandInServer:
+    """Minimal HTTP/1.1 keep-alive server over TLS"""
+
+    def __init__(self, cert: str, key: str):
+        self.context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        self.context.load_cert_chain(cert, key)
+        self.handshakes = 0
+        self.server = None
+        self.port = None
+
+    async def handle(self, reader, writer):
+        self.handshakes += 1
+        try:
+            while True:
+                request = await reader.readuntil(b"\r\n\r\n")
+                if not request:
+                    break
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n"
+                    + f"Content-Length: {len(BODY)}\r\n\r\n".encode()
+                    + BODY
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0, ssl=self.context)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+def make_certificate(directory: str):
+    cert, key = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost",
+         "-keyout", key, "-out", cert],
+        check=True, capture_output=True
+    )
+    return cert, key
+
+
+async def run(fetch) -> float:
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def one():
+        async with semaphore:
+            response = await fetch()
+            assert response.status_code == 200
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(REQUESTS)])
+    return time.perf_counter() - start
+
+
+async def bench():
+    with tempfile.TemporaryDirectory() as directory:
+        cert, key = make_certificate(directory)
+        server = StandInServer(cert, key)
+        await server.start()
+        url = f"https://localhost:{server.port}/"
+
+        async def fresh_client():
+            async with httpx.AsyncClient(verify=cert) as c:
+                return await c.get(url)
+
+        fresh_time = await run(fresh_client)
+        fresh_handshakes, server.handshakes = server.handshakes, 0
+
+        shared = create_client(verify=cert)
+        pooled_time = await run(lambda: shared.get(url))
+        await shared.aclose()
+        pooled_handshakes = server.handshakes
+
+        await server.stop()
+
+    print("\n" + "=" * 70)
+    print(f"🚀 HTTP CLIENT BENCHMARK ({REQUESTS} requests, concurrency {CONCURRENCY})")
+    print("=" * 70)
+    print(f"Fresh client per request : {fresh_time:.2f}s, {fresh_handshakes} TCP+TLS handshakes")
+    print(f"Shared pooled client     : {pooled_time:.2f}s, {pooled_handshakes} TCP+TLS handshakes")
+    print(f"Speed-up                 : {fresh_time / pooled_time:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(bench())
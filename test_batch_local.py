@@ -0,0 +1,125 @@
+"""Batch endpoint check - LOCAL VERSION (no network)
+
+Runs /agent/batch with stand-in service handlers, an in-memory chain and
+temporary SQLite stores: pipes feed earlier results into later items,
+streaming and crawl items are refused before any payment is asked for,
+and items that fail with a 5xx (or are skipped because of one) give their
+share of the payment back to the tx or the credit balance.
+"""
+import asyncio
+import os
+import tempfile
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["TEST_MODE"] = "true"
+os.environ["PAYMENT_LEDGER_DB"] = os.path.join(_tmp.name, "ledger.sqlite3")
+os.environ["CREDITS_DB"] = os.path.join(_tmp.name, "credits.sqlite3")
+
+import httpx
+
+import app.main as hub
+from app.utils.payment_index import LocalChain, TransferStore
+
+PAYER = "0x" + "01" * 20
+USDC = 1_000_000  # micro-USDC per USDC
+
+
+async def stand_in_sentiment(request, payment_signature=None):
+    if err := await hub.require_payment("sentiment", payment_signature): return err
+    return {"sentiment": "positive", "text": request.text}
+
+
+async def stand_in_summarize(request, payment_signature=None):
+    if err := await hub.require_payment("summarize", payment_signature): return err
+    if request.text == "boom":
+        raise RuntimeError("upstream model unavailable")
+    return {"summary": request.text[:10]}
+
+
+async def stand_in_translate(request, payment_signature=None):
+    if err := await hub.require_payment("translate", payment_signature): return err
+    return {"translated_text": f"[{request.target_language}] {request.text}"}
+
+
+BATCH = [
+    {"service": "sentiment", "params": {"text": "great release"}},
+    {"id": "sum", "service": "summarize", "params": {"text": "boom"}},
+    {"service": "translate", "params": {"target_language": "French"}, "pipe": {"text": "sum.summary"}},
+]
+
+
+async def run_checks():
+    services = dict(hub.SERVICES)
+    hub.SERVICES["sentiment"] = (hub.SentimentRequest, stand_in_sentiment)
+    hub.SERVICES["summarize"] = (hub.SummarizeRequest, stand_in_summarize)
+    hub.SERVICES["translate"] = (hub.TranslateRequest, stand_in_translate)
+    chain = LocalChain(hub.SERVER_WALLET)
+    tx = chain.mine((PAYER, hub.SERVER_WALLET, 18 * USDC // 100), empty_blocks=3)[0]  # the batch's exact price
+    hub.transfer_indexer.configure(chain, TransferStore(os.path.join(_tmp.name, "payments.sqlite3")))
+    hub.TEST_MODE = False
+
+    transport = httpx.ASGITransport(app=hub.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://local") as c:
+            # Refused before payment: no PAYMENT-SIGNATURE, yet a 400 rather than a 402
+            for item in [{"service": "scrape", "params": {"url": "https://example.com", "crawl": True}},
+                         {"service": "bulk_content", "params": {"topics": ["a"], "stream": "ndjson"}},
+                         {"service": "sentiment", "params": {}, "pipe": {"stream": "0.mode"}}]:
+                refused = await c.post("/agent/batch", json={"items": [BATCH[0], item]})
+                assert refused.status_code == 400 and "streaming and crawl" in refused.text, refused.text
+
+            quote = await c.post("/agent/batch", json={"items": BATCH})
+            assert quote.status_code == 402 and quote.json()["detail"]["amount_usd"] == 0.18, quote.text
+
+            paid = await c.post("/agent/batch", json={"items": BATCH}, headers={"PAYMENT-SIGNATURE": tx})
+            body = paid.json()
+            assert paid.status_code == 200, paid.text
+            assert [item["status"] for item in body["items"]] == ["success", "error", "skipped"], body
+            assert body["items"][1]["status_code"] == 500
+            # summarize ($0.08) failed and translate ($0.05) never ran: both go back on the tx
+            assert body["status"] == "partial" and body["refunded_usd"] == 0.13, body
+            row = await asyncio.to_thread(hub.payment_ledger.store.get, tx)
+            assert row["value"] - row["consumed"] == 13 * USDC // 100 and row["uses"] == 1, row
+
+            # The refunded value pays for a retry of the failed items
+            retry = [{"id": "sum", "service": "summarize", "params": {"text": "a long text to summarize"}},
+                     {"service": "translate", "params": {"target_language": "French"}, "pipe": {"text": "sum.summary"}}]
+            again = await c.post("/agent/batch", json={"items": retry}, headers={"PAYMENT-SIGNATURE": tx})
+            assert again.status_code == 200 and again.json()["status"] == "success", again.text
+            assert again.json()["items"][1]["result"]["translated_text"] == "[French] a long tex", again.json()
+            assert again.json()["refunded_usd"] == 0
+
+            # Credit balances get the failed share back the same way
+            account = await hub.credit_accounts.deposit(0.50, "0x" + "cc" * 32)
+            key = account["credit_key"]
+            credited = await c.post("/agent/batch", json={"items": BATCH}, headers={"PAYMENT-SIGNATURE": key})
+            assert credited.json()["refunded_usd"] == 0.13, credited.text
+            balance = await hub.credit_accounts.balance(key)
+            assert balance["balance_usd"] == 0.45, balance
+    finally:
+        hub.SERVICES.clear()
+        hub.SERVICES.update(services)
+        hub.TEST_MODE = True
+        await hub.transfer_indexer.stop()
+        await hub.credit_accounts.close()
+        await hub.payment_ledger.close()
+
+
+def check_batch():
+    asyncio.run(run_checks())
+
+
+def test_batch():
+    check_batch()
+
+
+def main():
+    print("\n" + "=" * 70)
+    print("🚀 AGENT HUB - BATCH TEST (stand-in services)")
+    print("=" * 70)
+    check_batch()
+    print("✅ Batch checks passed (pipes, streaming/crawl refused before payment, refunds for failed items)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Bulk content fan-out check - LOCAL VERSION (no network)
+
+Runs /agent/bulk-content against a stand-in Gemini client: pieces are
+generated BULK_CONTENT_CONCURRENCY at a time and stream back as NDJSON
+lines or SSE events in the order they finish, a piece that fails once is
+retried on its own, one that keeps failing is reported without sinking the
+others, and a summary with per-topic status closes the stream. As a job,
+every finished piece is checkpointed and a job cut off mid-way resumes
+with only the topics it had not finished.
+"""
+import asyncio
+import json
+import os
+import re
+import tempfile
+
+os.environ["TEST_MODE"] = "true"
+
+import httpx
+
+import app.main as hub
+from app.utils.jobs import JobContext, JobStore
+
+TOPICS = ["slow", "quick", "flaky", "broken", "medium"]
+LATENCY = {"slow": 0.3, "quick": 0.01, "flaky": 0.02, "broken": 0.01, "medium": 0.1}
+
+
+class StandInModels:
+    """Writes "<topic> text" after a per-topic delay; "flaky" fails once, "broken" always"""
+
+    def __init__(self):
+        self.calls = []
+        self.in_flight = self.peak = 0
+
+    async def generate_content(self, model, contents, **kwargs):
+        topic = re.search(r"about (\w+) in a", contents).group(1)
+        self.calls.append(topic)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(LATENCY[topic])
+        finally:
+            self.in_flight -= 1
+        if topic == "broken" or (topic == "flaky" and self.calls.count("flaky") == 1):
+            raise ValueError(f"no content for {topic}")
+        return type("Response", (), {"text": f"{topic} text", "usage_metadata": None})()
+
+
+def use_models(models):
+    hub.llm.gateway.configure(client=type("Client", (), {"aio": type("Aio", (), {"models": models})()})())
+
+
+def parse_sse(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append({"event": fields["event"], **json.loads(fields["data"])})
+    return events
+
+
+async def check_streaming(c):
+    models = StandInModels()
+    use_models(models)
+    response = await c.post("/agent/bulk-content", json={"topics": TOPICS, "stream": "ndjson"})
+    assert response.status_code == 200 and response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    pieces, summary = lines[:-1], lines[-1]
+
+    # Pieces arrive as they finish, not in topic order
+    assert pieces[0]["topic"] == "quick" and sorted(piece["index"] for piece in pieces) == list(range(5)), pieces
+    assert [piece["index"] for piece in pieces] != list(range(5)), pieces
+    assert models.peak <= hub.BULK_CONTENT_CONCURRENCY == 2, models.peak
+    flaky = next(piece for piece in pieces if piece["topic"] == "flaky")
+    assert flaky["status"] == "success" and flaky["attempts"] == 2 and flaky["content"] == "flaky text", flaky
+    broken = next(piece for piece in pieces if piece["topic"] == "broken")
+    assert broken["status"] == "error" and "no content for broken" in broken["error"], broken
+    assert summary["event"] == "summary" and summary["succeeded"] == 4 and summary["failed"] == 1, summary
+    assert [entry["topic"] for entry in summary["per_topic"]] == TOPICS, summary
+
+    use_models(StandInModels())
+    sse = await c.post("/agent/bulk-content", json={"topics": ["quick", "medium"]},
+                       headers={"Accept": "text/event-stream"})
+    assert sse.headers["content-type"].startswith("text/event-stream"), sse.headers
+    events = parse_sse(sse.text)
+    assert [event["event"] for event in events] == ["piece", "piece", "summary"], events
+    assert [event.get("topic") for event in events[:2]] == ["quick", "medium"], events
+
+
+async def check_resume(db_path):
+    store = JobStore(db_path)
+    request = hub.BulkContentRequest(topics=["quick", "medium", "slow", "flaky"])
+    models = StandInModels()
+    use_models(models)
+
+    # The first run is cut off (the process stops) while "slow" is still being written
+    first = asyncio.ensure_future(hub.run_bulk_content(request, JobContext(store, "job-1", 1)))
+    while len(await asyncio.to_thread(store.items, "job-1")) < 2:
+        await asyncio.sleep(0.01)
+    first.cancel()
+    checkpoints = await asyncio.to_thread(store.items, "job-1")
+    assert sorted(checkpoints) == [0, 1] and checkpoints[1]["content"] == "medium text", checkpoints
+
+    models = StandInModels()
+    use_models(models)
+    result = await hub.run_bulk_content(request, JobContext(store, "job-1", 2))
+    assert sorted(models.calls) == ["flaky", "flaky", "slow"], "finished topics must not be generated again"
+    assert [piece["topic"] for piece in result["content_pieces"]] == ["quick", "medium", "slow", "flaky"], result
+    assert result["summary"]["resumed"] == 2 and result["summary"]["succeeded"] == 4, result["summary"]
+    assert sorted(await asyncio.to_thread(store.items, "job-1")) == [0, 1, 2, 3]
+    store.close()
+
+
+async def run_checks():
+    concurrency = hub.BULK_CONTENT_CONCURRENCY
+    hub.BULK_CONTENT_CONCURRENCY = 2
+    transport = httpx.ASGITransport(app=hub.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://local", timeout=10) as c:
+            await check_streaming(c)
+        with tempfile.TemporaryDirectory() as tmp:
+            await check_resume(os.path.join(tmp, "jobs.sqlite3"))
+    finally:
+        hub.BULK_CONTENT_CONCURRENCY = concurrency
+
+
+def check_bulk_content():
+    asyncio.run(run_checks())
+
+
+def test_bulk_content():
+    check_bulk_content()
+
+
+def main():
+    print("\n" + "=" * 70)
+    print("🚀 AGENT HUB - BULK CONTENT TEST (stand-in Gemini)")
+    print("=" * 70)
+    check_bulk_content()
+    print("✅ Bulk content checks passed (bounded fan-out, NDJSON and SSE in completion order, retries, failures, checkpoint resume)")
+
+
+if __name__ == "__main__":
+    main()
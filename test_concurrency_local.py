@@ -0,0 +1,85 @@
+"""Concurrency check for the async execution layer - LOCAL VERSION (no network)
+
+Replaces Gemini and DuckDuckGo with slow local stand-ins and fires concurrent
+requests at the app in-process. Before the executor layer every blocking call
+ran on the event loop, so N requests took N x the stand-in latency.
+"""
+import asyncio
+import os
+import time
+
+os.environ["TEST_MODE"] = "true"
+os.environ.setdefault("GOOGLE_API_KEY", "local-stand-in")
+
+import httpx
+
+import app.main as hub
+import app.utils.search as search_module
+
+SLOW_SECONDS = 0.5
+CONCURRENT_REQUESTS = 6
+
+
+class SlowSearch:
+    """Stand-in for duckduckgo_search.DDGS that blocks like the real client"""
+
+    def text(self, query, max_results=5):
+        time.sleep(SLOW_SECONDS)
+        return [{"title": f"{query} {i}", "href": f"https://example.com/{i}", "body": "stand-in"} for i in range(max_results)]
+
+
+class SlowModels:
+    async def generate_content(self, model, contents, **kwargs):
+        await asyncio.sleep(SLOW_SECONDS)
+        return type("Response", (), {"text": '{"sentiment": "positive", "score": 0.9}'})()
+
+
+class SlowClient:
+    """Stand-in for google.genai.Client exposing only the aio surface used by app.llm"""
+
+    def __init__(self):
+        self.aio = type("Aio", (), {"models": SlowModels()})()
+
+
+async def run_concurrent():
+    hub.llm.gateway.configure(client=SlowClient())
+    search_module.DDGS = SlowSearch
+    hub.search_client.configure()
+
+    transport = httpx.ASGITransport(app=hub.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://local") as c:
+        calls = [c.post("/agent/research", json={"query": f"topic {i}", "max_sources": 2}) for i in range(CONCURRENT_REQUESTS)]
+        calls += [c.post("/agent/sentiment", json={"text": "fast call"}) for _ in range(CONCURRENT_REQUESTS)]
+
+        start = time.perf_counter()
+        responses = await asyncio.gather(*calls)
+        elapsed = time.perf_counter() - start
+
+    return responses, elapsed
+
+
+def check_concurrency():
+    responses, elapsed = asyncio.run(run_concurrent())
+
+    assert all(r.status_code == 200 for r in responses), [r.text for r in responses if r.status_code != 200]
+    # Research = search + generation (2 x SLOW_SECONDS); serialized it would be
+    # CONCURRENT_REQUESTS x 3 x SLOW_SECONDS in total.
+    serialized = CONCURRENT_REQUESTS * 3 * SLOW_SECONDS
+    assert elapsed < serialized / 2, f"requests serialized: {elapsed:.2f}s (serial would be {serialized:.2f}s)"
+    return elapsed, serialized
+
+
+def test_concurrent_requests_do_not_serialize():
+    check_concurrency()
+
+
+def main():
+    print("\n" + "=" * 70)
+    print("🚀 AGENT HUB - CONCURRENCY TEST (slow local stand-ins)")
+    print("=" * 70)
+    elapsed, serialized = check_concurrency()
+    print(f"✅ {CONCURRENT_REQUESTS * 2} concurrent requests finished in {elapsed:.2f}s (serialized: {serialized:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
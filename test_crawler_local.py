@@ -0,0 +1,97 @@
+"""Crawler check - LOCAL VERSION (no network)
+
+Crawls a stand-in site: links that only differ in spelling (fragments,
+tracking parameters, default ports, dot segments, case) are fetched once,
+other sites and binary files are never fetched, depth and the page budget
+stop the crawl, robots.txt rules are honoured and requests to the host
+are spaced by the politeness delay.
+"""
+import asyncio
+import time
+from urllib.robotparser import RobotFileParser
+
+from app.utils.crawler import Crawler, normalize_url
+
+ROBOTS = "User-agent: *\nDisallow: /private/\n"
+SITE = {
+    "https://shop.example/": [
+        "/about", "/about#team", "https://SHOP.example:443/about?utm_source=mail",
+        "./products/../about", "https://www.shop.example/products", "/private/admin",
+        "https://other.example/", "/catalog.pdf", "mailto:sales@shop.example",
+    ],
+    "https://shop.example/about": ["/", "/products", "/team"],
+    "https://www.shop.example/products": ["/products/1", "/products/2", "/products/3"],
+    "https://shop.example/products": ["/products/1"],
+    "https://shop.example/team": ["/jobs"],
+}
+
+
+class StandInCrawler(Crawler):
+    """Reads robots.txt from ROBOTS instead of the network"""
+
+    async def _load_robots(self, origin):
+        robots = RobotFileParser()
+        robots.parse(ROBOTS.splitlines())
+        return robots, self.host_delay
+
+
+def check_normalize():
+    assert normalize_url("HTTPS://Shop.Example:443/a/./b/../c?b=2&a=1&utm_medium=x#top") == "https://shop.example/a/c?a=1&b=2"
+    assert normalize_url("http://shop.example:8080") == "http://shop.example:8080/"
+    assert normalize_url("../up", "https://shop.example/a/b/") == "https://shop.example/a/up"
+    assert normalize_url("javascript:void(0)") is None and normalize_url("mailto:a@b.c") is None
+
+
+async def crawl(max_depth, max_pages, host_delay=0.0):
+    fetched = []
+
+    async def fetch(url):
+        fetched.append((url, time.monotonic()))
+        return {"status": "success", "url": url, "links": SITE.get(url, [])}
+
+    crawler = StandInCrawler(fetch, max_depth=max_depth, max_pages=max_pages, workers=3, host_delay=host_delay)
+    results = [result async for result in crawler.run("https://shop.example/")]
+    return results[:-1], results[-1], fetched
+
+
+async def run_checks():
+    pages, summary, fetched = await crawl(max_depth=1, max_pages=20)
+    urls = [url for url, _ in fetched]
+    assert len(urls) == len(set(urls)), urls
+    assert sorted(urls) == ["https://shop.example/", "https://shop.example/about", "https://www.shop.example/products"], urls
+    skipped = [page for page in pages if page["status"] == "skipped"]
+    assert [page["url"] for page in skipped] == ["https://shop.example/private/admin"], skipped
+    assert summary["stopped"] == "complete" and summary["pages"] == 4, summary
+
+    # Depth 2 reaches the product pages, but the budget stops the crawl at five pages
+    pages, summary, fetched = await crawl(max_depth=2, max_pages=5)
+    assert summary["pages"] == 5 and summary["stopped"] == "page_budget", summary
+    assert len({url for url, _ in fetched}) == len(fetched) <= 5
+    assert max(page["depth"] for page in pages) <= 2
+
+    # Requests to one host are spaced by the politeness delay
+    _, summary, fetched = await crawl(max_depth=1, max_pages=3, host_delay=0.05)
+    times = sorted(at for url, at in fetched if url.startswith("https://shop.example/"))
+    assert len(times) == 2, fetched
+    assert all(later - earlier >= 0.045 for earlier, later in zip(times, times[1:])), times
+
+
+def check_crawler():
+    check_normalize()
+    asyncio.run(run_checks())
+
+
+def test_crawler():
+    check_crawler()
+
+
+def main():
+    print("\n" + "=" * 70)
+    print("🚀 AGENT HUB - CRAWLER TEST (stand-in site)")
+    print("=" * 70)
+    check_crawler()
+    print("✅ Crawler checks passed (URL dedupe, same-site only, depth, page budget, robots.txt, politeness)")
+
+
+if __name__ == "__main__":
+    main()
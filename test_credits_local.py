@@ -0,0 +1,120 @@
+"""Prepaid credits check - LOCAL VERSION (no network)
+
+Runs /credits/deposit and credit-key payments against an in-memory chain
+stand-in and temporary SQLite stores: only the wallet that sent a transfer
+can deposit it, only once and only after it is confirmed; concurrent
+debits never take the balance below zero, and an empty account gets 402
+until it is topped up.
+"""
+import asyncio
+import os
+import tempfile
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["TEST_MODE"] = "true"
+os.environ["PAYMENT_LEDGER_DB"] = os.path.join(_tmp.name, "ledger.sqlite3")
+os.environ["CREDITS_DB"] = os.path.join(_tmp.name, "credits.sqlite3")
+
+import httpx
+from eth_account import Account
+from eth_account.messages import encode_defunct
+
+import app.main as hub
+from app.utils.credits import deposit_message
+from app.utils.payment_index import LocalChain, TransferStore
+
+PAYER = Account.create()
+STRANGER = Account.create()
+USDC = 1_000_000  # micro-USDC per USDC
+
+
+def sign(account, tx_hash, account_id=None):
+    return account.sign_message(encode_defunct(text=deposit_message(tx_hash, account_id))).signature.hex()
+
+
+async def run_checks():
+    chain = LocalChain(hub.SERVER_WALLET)
+    deposit = chain.mine((PAYER.address, hub.SERVER_WALLET, 20 * USDC // 100), empty_blocks=3)[0]  # four calls
+    top_up = chain.mine((PAYER.address, hub.SERVER_WALLET, 5 * USDC // 100), empty_blocks=3)[0]
+    hub.transfer_indexer.configure(chain, TransferStore(os.path.join(_tmp.name, "payments.sqlite3")))
+    hub.TEST_MODE = False
+
+    transport = httpx.ASGITransport(app=hub.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://local") as c:
+        headers = {"PAYMENT-SIGNATURE": deposit}
+        unsigned = await c.post("/credits/deposit", headers=headers, json={})
+        assert unsigned.status_code == 400, unsigned.text
+        stolen = await c.post("/credits/deposit", headers=headers, json={"signature": sign(STRANGER, deposit)})
+        assert stolen.status_code == 403, stolen.text
+
+        opened = await c.post("/credits/deposit", headers=headers, json={"signature": sign(PAYER, deposit)})
+        assert opened.status_code == 200, opened.text
+        key, account_id = opened.json()["credit_key"], opened.json()["account_id"]
+        assert opened.json()["balance_usd"] == 0.20
+        replay = await c.post("/credits/deposit", headers=headers, json={"signature": sign(PAYER, deposit)})
+        assert replay.status_code == 402 and replay.json()["detail"]["reason"] == "spent", replay.text
+
+        # Eight concurrent $0.05 calls on $0.20: four are paid, none overdraws
+        results = await asyncio.gather(*[hub.require_payment("sentiment", key) for _ in range(8)])
+        assert sum(r is None for r in results) == 4, results
+        assert {r.status_code for r in results if r is not None} == {402}
+        balance = (await c.get("/credits/balance", headers={"PAYMENT-SIGNATURE": key})).json()
+        assert balance["balance_usd"] == 0 and balance["calls"] == 4 and balance["low_balance"], balance
+
+        # A top-up is signed for the account it goes to
+        misdirected = await c.post("/credits/deposit", headers={"PAYMENT-SIGNATURE": top_up},
+                                   json={"credit_key": key, "signature": sign(PAYER, top_up)})
+        assert misdirected.status_code == 403, misdirected.text
+        topped = await c.post("/credits/deposit", headers={"PAYMENT-SIGNATURE": top_up},
+                              json={"credit_key": key, "signature": sign(PAYER, top_up, account_id)})
+        assert topped.status_code == 200 and topped.json()["balance_usd"] == 0.05, topped.text
+        assert await hub.require_payment("sentiment", key) is None
+        assert (await hub.require_payment("sentiment", key)).status_code == 402
+        assert (await hub.require_payment("sentiment", key[:-2] + "xx")).status_code == 402
+
+        # A transfer without a confirmation yet cannot be deposited by anyone, even if a
+        # block confirms it mid-request; once confirmed, only its sender can deposit it
+        fresh = chain.mine((PAYER.address, hub.SERVER_WALLET, 10 * USDC // 100))[0]
+        indexer_transfers = hub.transfer_indexer.transfers
+
+        async def confirm_after_lookup(tx_hash):
+            found = await indexer_transfers(tx_hash)
+            chain.mine()
+            return found
+
+        hub.transfer_indexer.transfers = confirm_after_lookup
+        raced = await c.post("/credits/deposit", headers={"PAYMENT-SIGNATURE": fresh},
+                             json={"signature": sign(STRANGER, fresh)})
+        assert raced.status_code == 402 and raced.json()["detail"]["reason"] == "unpaid", raced.text
+        del hub.transfer_indexer.transfers
+        stolen = await c.post("/credits/deposit", headers={"PAYMENT-SIGNATURE": fresh},
+                              json={"signature": sign(STRANGER, fresh)})
+        assert stolen.status_code == 403, stolen.text
+        owned = await c.post("/credits/deposit", headers={"PAYMENT-SIGNATURE": fresh},
+                             json={"signature": sign(PAYER, fresh)})
+        assert owned.status_code == 200 and owned.json()["balance_usd"] == 0.10, owned.text
+
+    hub.TEST_MODE = True
+    await hub.transfer_indexer.stop()
+    await hub.credit_accounts.close()
+    await hub.payment_ledger.close()
+
+
+def check_credits():
+    asyncio.run(run_checks())
+
+
+def test_credits():
+    check_credits()
+
+
+def main():
+    print("\n" + "=" * 70)
+    print("🚀 AGENT HUB - PREPAID CREDITS TEST (local chain stand-in)")
+    print("=" * 70)
+    check_credits()
+    print("✅ Credit checks passed (sender-only deposits, single use, no overdraft, top-up)")
+
+
+if __name__ == "__main__":
+    main()
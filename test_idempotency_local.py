@@ -0,0 +1,82 @@
+"""Idempotent replay check - LOCAL VERSION (no network)
+
+Puts IdempotencyMiddleware in front of a counting stand-in endpoint: a retry
+with the same key gets the stored response without running the handler,
+a different request under the same key is a 422, the same key sent with a
+different payment credential is a separate call, and the tx-hash fallback
+only replays a tx that one call spent in full.
+"""
+import asyncio
+
+import httpx
+from fastapi import FastAPI, Request
+
+from app.utils.idempotency import IdempotencyMiddleware, IdempotencyStore
+
+FULL_TX = "0x" + "aa" * 32
+PARTIAL_TX = "0x" + "bb" * 32
+
+
+def build_app():
+    app = FastAPI()
+    calls = []
+
+    @app.post("/agent/echo")
+    async def echo(request: Request):
+        calls.append(await request.json())
+        return {"call": len(calls)}
+
+    async def paid_in_full(tx_hash):
+        return tx_hash == FULL_TX
+
+    app.add_middleware(IdempotencyMiddleware, store=IdempotencyStore(), paid_in_full=paid_in_full)
+    return app, calls
+
+
+async def run_checks():
+    app, calls = build_app()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://local") as c:
+        paid = {"Idempotency-Key": "order-1", "PAYMENT-SIGNATURE": PARTIAL_TX}
+        first = await c.post("/agent/echo", json={"text": "a"}, headers=paid)
+        retry = await c.post("/agent/echo", json={"text": "a"}, headers=paid)
+        assert first.json() == retry.json() == {"call": 1}, (first.json(), retry.json())
+        assert retry.headers.get("idempotent-replayed") == "true"
+        assert len(calls) == 1
+
+        conflict = await c.post("/agent/echo", json={"text": "b"}, headers=paid)
+        assert conflict.status_code == 422, conflict.status_code
+        assert len(calls) == 1
+
+        # Same key from another payer is its own call, not the first payer's response
+        other = await c.post("/agent/echo", json={"text": "a"}, headers={**paid, "PAYMENT-SIGNATURE": FULL_TX})
+        assert other.json() == {"call": 2} and "idempotent-replayed" not in other.headers
+        calls.clear()
+
+        # No key: a tx spent in full replays, one with value left pays again
+        for tx, expected in [(FULL_TX, [1, 1]), (PARTIAL_TX, [2, 3])]:
+            seen = []
+            for _ in range(2):
+                r = await c.post("/agent/echo", json={"text": "c"}, headers={"PAYMENT-SIGNATURE": tx})
+                seen.append(r.json()["call"])
+            assert seen == expected, (tx, seen)
+
+
+def check_idempotency():
+    asyncio.run(run_checks())
+
+
+def test_idempotency():
+    check_idempotency()
+
+
+def main():
+    print("\n" + "=" * 70)
+    print("🚀 AGENT HUB - IDEMPOTENCY TEST (stand-in endpoint)")
+    print("=" * 70)
+    check_idempotency()
+    print("✅ Idempotency checks passed (replay, 422 on reuse, per-payer keys, tx fallback)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""Async job queue check - LOCAL VERSION (no network)
+
+Runs the persistent job queue against a temporary SQLite store: a job cut off
+by a process stop resumes from its checkpoints on the next start, a job that
+keeps dying is failed after JOB_MAX_ATTEMPTS runs, a webhook still pending at
+the stop is delivered after the restart, and webhook URLs aimed at private
+hosts are refused: up front, through a redirect, and after DNS rebinding.
+"""
+import asyncio
+import os
+import tempfile
+
+import httpcore
+import httpx
+
+from app.utils import http_client
+import app.utils.jobs as jobs
+from app.utils.jobs import FAILED, RUNNING, SUCCEEDED, JobQueue, JobStore
+
+
+async def wait_for(predicate, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not await predicate():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+async def check_resume(db_path):
+    runs = []
+    blocked = asyncio.Event()
+
+    async def first_run(payload, context):
+        runs.append(context.attempt)
+        await context.checkpoint(0, {"piece": "a"})
+        blocked.set()
+        await asyncio.Event().wait()  # the process "dies" while this runs
+
+    queue = JobQueue(JobStore(db_path), workers=1)
+    queue.register("bulk", first_run)
+    await queue.start()
+    job = await queue.submit("bulk", {"topics": ["a", "b"]})
+    await blocked.wait()
+    await queue.stop()
+    assert (await asyncio.to_thread(JobStore(db_path).get, job["job_id"]))["status"] == RUNNING
+
+    async def second_run(payload, context):
+        runs.append(context.attempt)
+        done = await context.checkpoints()
+        return {"resumed_with": sorted(done), "topics": payload["topics"]}
+
+    restarted = JobQueue(JobStore(db_path), workers=1)
+    restarted.register("bulk", second_run)
+    await restarted.start()
+    finished = await restarted.wait(job["job_id"], 5)
+    await restarted.stop()
+    assert finished["status"] == SUCCEEDED, finished
+    assert finished["result"] == {"resumed_with": [0], "topics": ["a", "b"]}
+    assert finished["attempts"] == 2 and runs == [1, 2], (finished["attempts"], runs)
+
+
+async def check_attempt_cap(db_path):
+    store = JobStore(db_path)
+    queue = JobQueue(store, workers=1, max_attempts=3)
+
+    async def never(payload, context):
+        raise AssertionError("a job past its attempt cap must not run again")
+
+    queue.register("crashy", never)
+    await queue.start()
+    job = await queue.submit("crashy", {})
+    await queue.stop()
+    # As if three runs had each taken the process down
+    await asyncio.to_thread(JobStore(db_path).update, job["job_id"], status=RUNNING, attempts=3)
+
+    restarted = JobQueue(JobStore(db_path), workers=1, max_attempts=3)
+    restarted.register("crashy", never)
+    await restarted.start()
+    finished = await restarted.wait(job["job_id"], 5)
+    await restarted.stop()
+    assert finished["status"] == FAILED and "Interrupted 3 times" in finished["error"], finished
+
+
+async def check_pending_webhook(db_path):
+    received = []
+
+    def receiver(request):
+        received.append(request.headers["X-Job-Id"])
+        return httpx.Response(200)
+
+    async def allow_example_host(url):
+        return None if url.startswith("https://hooks.example.com/") else "blocked"
+
+    original_check, original_client = jobs.check_webhook_url, http_client._webhook_client
+    jobs.check_webhook_url = allow_example_host
+    http_client._webhook_client = httpx.AsyncClient(transport=httpx.MockTransport(receiver))
+    try:
+        queue = JobQueue(JobStore(db_path), workers=1)
+
+        async def quick(payload, context):
+            return {"ok": True}
+
+        queue.register("quick", quick)
+        await queue.start()
+        job = await queue.submit("quick", {}, webhook_url="https://hooks.example.com/done")
+        await queue.wait(job["job_id"], 5)
+        await queue.stop()  # in practice: the process stopped before the POST went out
+        await asyncio.to_thread(JobStore(db_path).update, job["job_id"], webhook_status="pending")
+        received.clear()
+
+        restarted = JobQueue(JobStore(db_path), workers=1)
+        restarted.register("quick", quick)
+        await restarted.start()
+        await wait_for(lambda: _webhook_done(restarted, job["job_id"]))
+        await restarted.stop()
+        assert received == [job["job_id"]], received
+    finally:
+        await http_client._webhook_client.aclose()
+        jobs.check_webhook_url, http_client._webhook_client = original_check, original_client
+
+
+async def check_webhook_redirect(db_path):
+    requested = []
+
+    def receiver(request):
+        requested.append(str(request.url))
+        # A public receiver pointing the POST at an internal service
+        return httpx.Response(307, headers={"Location": "http://169.254.169.254/latest/meta-data"})
+
+    async def allow_example_host(url):
+        return None if url.startswith("https://hooks.example.com/") else "blocked"
+
+    original_check, original_client = jobs.check_webhook_url, http_client._webhook_client
+    jobs.check_webhook_url = allow_example_host
+    # Even a client that would follow redirects must not follow them for a webhook
+    http_client._webhook_client = httpx.AsyncClient(transport=httpx.MockTransport(receiver), follow_redirects=True)
+    try:
+        queue = JobQueue(JobStore(db_path), workers=1)
+
+        async def quick(payload, context):
+            return {"secret": "job result"}
+
+        queue.register("quick", quick)
+        await queue.start()
+        job = await queue.submit("quick", {}, webhook_url="https://hooks.example.com/done")
+        await queue.wait(job["job_id"], 5)
+        await wait_for(lambda: _webhook_settled(queue, job["job_id"]))
+        finished = await queue.get(job["job_id"])
+        await queue.stop()
+        assert requested == ["https://hooks.example.com/done"], requested
+        assert finished["webhook_status"] == "failed", finished
+    finally:
+        await http_client._webhook_client.aclose()
+        jobs.check_webhook_url, http_client._webhook_client = original_check, original_client
+
+
+async def _webhook_settled(queue, job_id):
+    job = await queue.get(job_id)
+    return job is not None and job["webhook_status"] not in (None, "pending")
+
+
+async def check_rebinding():
+    """A host that passed the submit-time check but now resolves to loopback is refused at connect"""
+    connects = []
+
+    class RecordingBackend:
+        async def connect_tcp(self, host, port, **kwargs):
+            connects.append(host)
+            raise AssertionError("must not connect")
+
+    answers = iter([[(2, 1, 6, "", ("93.184.216.34", 443))], [(2, 1, 6, "", ("127.0.0.1", 443))]])
+
+    async def rebinding_resolver(host, port, **kwargs):
+        return next(answers)
+
+    backend = http_client.PublicOnlyBackend(RecordingBackend(), resolve=rebinding_resolver)
+    assert await rebinding_resolver("hooks.example.com", 443)  # the check saw a public address
+    try:
+        await backend.connect_tcp("hooks.example.com", 443)
+    except httpcore.ConnectError as e:
+        assert "non-public" in str(e), e
+    else:
+        raise AssertionError("rebound host was connected to")
+    assert connects == []
+
+    # The real webhook client refuses internal targets at connect, whatever the URL check said
+    client = http_client.create_client(public_only=True)
+    try:
+        await client.post("http://127.0.0.1:9/hook", json={})
+    except httpx.ConnectError as e:
+        assert "non-public" in str(e), e
+    else:
+        raise AssertionError("webhook client reached loopback")
+    finally:
+        await client.aclose()
+
+
+async def _webhook_done(queue, job_id):
+    job = await queue.get(job_id)
+    return job is not None and job["webhook_status"] == "delivered"
+
+
+async def check_webhook_hosts():
+    for url in [
+        "http://hooks.example.com/done",
+        "https://localhost/hook",
+        "https://127.0.0.1/hook",
+        "https://10.0.0.5/hook",
+        "https://169.254.169.254/latest/meta-data",
+        "https://[::1]/hook",
+        "https://[fdaa::3]/hook",
+    ]:
+        assert await jobs.check_webhook_url(url), f"{url} should be refused"
+    assert await jobs.check_webhook_url("https://93.184.216.34/hook") is None
+
+
+async def run_checks(tmp):
+    await check_resume(os.path.join(tmp, "resume.sqlite3"))
+    await check_attempt_cap(os.path.join(tmp, "cap.sqlite3"))
+    await check_pending_webhook(os.path.join(tmp, "webhook.sqlite3"))
+    await check_webhook_redirect(os.path.join(tmp, "redirect.sqlite3"))
+    await check_rebinding()
+    await check_webhook_hosts()
+
+
+def check_jobs():
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(run_checks(tmp))
+
+
+def test_jobs():
+    check_jobs()
+
+
+def main():
+    print("\n" + "=" * 70)
+    print("🚀 AGENT HUB - JOB QUEUE TEST (temporary store)")
+    print("=" * 70)
+    check_jobs()
+    print("✅ Job queue checks passed (resume, attempt cap, pending webhook, redirect, rebinding, webhook hosts)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Payment indexer check - LOCAL VERSION (no network)
+
+Runs the USDC Transfer indexer against an in-memory chain stand-in:
+backfill in capped getLogs batches, verification as a local lookup, the
+receipt fallback for blocks newer than the checkpoint, and resuming from
+the stored checkpoint after a restart.
+"""
+import asyncio
+import os
+import tempfile
+
+os.environ["TEST_MODE"] = "true"
+os.environ["PAYMENT_INDEX_CONFIRMATIONS"] = "2"
+
+import app.main as hub
+from app.utils.payment_index import LocalChain, TransferIndexer, TransferStore
+
+WALLET = "0x" + "ab" * 20
+PAYER = "0x" + "01" * 20
+OTHER_WALLET = "0x" + "cd" * 20
+USDC = 1_000_000  # micro-USDC per USDC
+
+
+async def run_checks(db_path):
+    chain = LocalChain(WALLET, max_range=50)
+    paid = chain.mine((PAYER, WALLET, 2 * USDC), empty_blocks=120)[0]
+    elsewhere = chain.mine((PAYER, OTHER_WALLET, 5 * USDC), empty_blocks=30)[0]
+    small = chain.mine((PAYER, WALLET, USDC // 20), empty_blocks=30)[0]
+
+    # Catch-up: 180+ blocks with a provider that refuses ranges over 50
+    indexer = TransferIndexer(chain, TransferStore(db_path))
+    indexer.batch = 200
+    indexed = await indexer.sync()
+    assert indexed == 2, indexed
+    assert indexer.batch <= 50
+    assert indexer.checkpoint == len(chain.blocks) - 1 - 2
+
+    # Indexed payments verify without touching the chain
+    assert await indexer.verify(paid, 2.00)
+    assert await indexer.verify(paid.upper().replace("0X", "0x"), 1.50)
+    assert not await indexer.verify(paid, 3.00)
+    assert not await indexer.verify(small, 0.10)
+    assert chain.calls["receipt"] == 0, chain.calls
+
+    # Not ours / unknown: the receipt is checked (the index cannot rule out recent blocks)
+    assert not await indexer.verify(elsewhere, 1.00)
+    assert not await indexer.verify("0x" + "ee" * 32, 0.05)
+    assert chain.calls["receipt"] == 2, chain.calls
+
+    # A payment newer than the checkpoint is checked from its receipt, but only once a
+    # block sits on top of it, and the unconfirmed transfer is never written to the index
+    fresh = chain.mine((PAYER, WALLET, USDC))[0]
+    assert not await indexer.verify(fresh, 1.00)
+    chain.mine()
+    assert await indexer.verify(fresh, 1.00)
+    assert await indexer.verify(fresh, 1.00)
+    assert chain.calls["receipt"] == 5, chain.calls
+    assert indexer.stats()["fallback_unconfirmed"] == 1
+
+    assert [t["tx_hash"] for t in await indexer.payments_from(PAYER)] == [small, paid]
+    await indexer.stop()
+
+    # Restart: a new indexer on the same store resumes from the checkpoint
+    checkpoint = indexer.checkpoint
+    later = chain.mine((PAYER, WALLET, 3 * USDC), empty_blocks=5)[0]
+    restarted = TransferIndexer(chain, TransferStore(db_path))
+    logs_before = chain.calls["get_logs"]
+    assert await restarted.sync() == 2  # the fresh payment and the later one
+    assert chain.calls["get_logs"] - logs_before == 1, "resumed sync should need a single batch"
+    assert restarted.checkpoint > checkpoint
+    assert await restarted.verify(later, 3.00)
+    assert chain.calls["receipt"] == 5, chain.calls
+
+    # The app's verify_usdc_payment goes through the shared indexer
+    hub.transfer_indexer.configure(chain, TransferStore(db_path))
+    assert await hub.verify_usdc_payment(later, 3.00)
+    assert not await hub.verify_usdc_payment(later, 10.00)
+    await restarted.stop()
+    await hub.transfer_indexer.stop()
+    return chain.calls
+
+
+def check_indexer():
+    with tempfile.TemporaryDirectory() as tmp:
+        return asyncio.run(run_checks(os.path.join(tmp, "payments.sqlite3")))
+
+
+def test_payment_indexer():
+    check_indexer()
+
+
+def main():
+    print("\n" + "=" * 70)
+    print("🚀 AGENT HUB - PAYMENT INDEXER TEST (local chain stand-in)")
+    print("=" * 70)
+    calls = check_indexer()
+    print(f"✅ Indexer checks passed (chain calls: {calls})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Payment ledger check - LOCAL VERSION (no network)
+
+Runs the payment ledger against a temporary SQLite store and a stand-in
+value lookup: a tx pays for calls up to its value and is then rejected as
+spent (also after a restart), concurrent claims never overspend, a tx
+that paid nothing is refused, and a call that fails with a 5xx gets its
+charge back through PaymentClaimsMiddleware. Production storage must be
+set explicitly and, on Fly or Railway, sit on a mounted volume.
+"""
+import asyncio
+import os
+import tempfile
+
+import httpx
+from fastapi import FastAPI, Header
+from fastapi.responses import JSONResponse
+
+from app.utils.payment_ledger import LedgerStore, PaymentClaimsMiddleware, PaymentLedger, durable_storage_problem
+
+USDC = 1_000_000  # micro-USDC per USDC
+SIX_CALLS = "0x" + "01" * 32  # $0.30: six $0.05 calls
+ONE_CALL = "0x" + "02" * 32
+TWO_CALLS = "0x" + "03" * 32
+UNPAID = "0x" + "04" * 32
+VALUES = {SIX_CALLS: 30 * USDC // 100, ONE_CALL: 5 * USDC // 100, TWO_CALLS: 10 * USDC // 100}
+
+
+async def chain_value(tx_hash):
+    return VALUES.get(tx_hash, 0)
+
+
+async def check_claims(db_path):
+    ledger = PaymentLedger(LedgerStore(db_path))
+
+    first = await ledger.claim(ONE_CALL, 0.05, "sentiment", chain_value)
+    assert first["ok"] and first["remaining_usd"] == 0 and "receipt" not in first, first
+    second = await ledger.claim(ONE_CALL, 0.05, "sentiment", chain_value)
+    assert not second["ok"] and second["reason"] == "spent", second
+    assert await ledger.paid_in_full(ONE_CALL)
+
+    results = await asyncio.gather(*[ledger.claim(SIX_CALLS, 0.05, "sentiment", chain_value) for _ in range(10)])
+    assert sum(r["ok"] for r in results) == 6, results
+    assert {r["reason"] for r in results if not r["ok"]} == {"spent"}
+    assert not await ledger.paid_in_full(SIX_CALLS)
+
+    partial = await ledger.claim(TWO_CALLS, 0.15, "summarize", chain_value)
+    assert not partial["ok"] and partial["reason"] == "insufficient" and partial["remaining_usd"] == 0.10, partial
+    assert (await ledger.claim(UNPAID, 0.05, "sentiment", chain_value))["reason"] == "unpaid"
+    await ledger.close()
+
+    # Restart: the spent hashes are still spent, and the chain is not asked again
+    restarted = PaymentLedger(LedgerStore(db_path))
+
+    async def no_chain(tx_hash):
+        raise AssertionError("a known payment must not be looked up again")
+
+    replay = await restarted.claim(SIX_CALLS, 0.05, "sentiment", no_chain)
+    assert not replay["ok"] and replay["reason"] == "spent", replay
+    assert (await restarted.claim(TWO_CALLS, 0.05, "sentiment", no_chain))["ok"]
+    await restarted.close()
+
+
+async def check_refund(db_path):
+    ledger = PaymentLedger(LedgerStore(db_path))
+    app = FastAPI()
+    app.add_middleware(PaymentClaimsMiddleware)
+    outcomes = ["fail", "ok"]
+
+    @app.post("/agent/flaky")
+    async def flaky(payment_signature: str = Header(None, alias="PAYMENT-SIGNATURE")):
+        claim = await ledger.claim(payment_signature, 0.05, "flaky", chain_value)
+        if not claim["ok"]:
+            return JSONResponse(status_code=402, content={"reason": claim["reason"]})
+        if outcomes.pop(0) == "fail":
+            return JSONResponse(status_code=502, content={"detail": "upstream down"})
+        return {"charged": claim["charged_usd"]}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://local") as c:
+        failed = await c.post("/agent/flaky", headers={"PAYMENT-SIGNATURE": ONE_CALL})
+        assert failed.status_code == 502, failed.status_code
+        retried = await c.post("/agent/flaky", headers={"PAYMENT-SIGNATURE": ONE_CALL})
+        assert retried.status_code == 200, retried.text
+        again = await c.post("/agent/flaky", headers={"PAYMENT-SIGNATURE": ONE_CALL})
+        assert again.status_code == 402 and again.json()["reason"] == "spent", again.text
+    assert ledger.stats()["refunds"] == 1
+    await ledger.close()
+
+
+def check_durable_storage():
+    saved = {name: os.environ.pop(name, None) for name in ("PAYMENT_LEDGER_DB", "FLY_APP_NAME")}
+    ismount = os.path.ismount
+    os.path.ismount = lambda path: path in ("/", "/data")
+    try:
+        assert "not set" in durable_storage_problem("PAYMENT_LEDGER_DB", ".cache/ledger.sqlite3")
+        os.environ["PAYMENT_LEDGER_DB"] = "/srv/ledger.sqlite3"
+        assert durable_storage_problem("PAYMENT_LEDGER_DB", "/srv/ledger.sqlite3") is None  # self-hosted disk
+        os.environ["FLY_APP_NAME"] = "agent-hub-prod"
+        assert "mounted volume" in durable_storage_problem("PAYMENT_LEDGER_DB", "/srv/ledger.sqlite3")
+        assert durable_storage_problem("PAYMENT_LEDGER_DB", "/data/ledger.sqlite3") is None
+    finally:
+        os.path.ismount = ismount
+        for name, value in saved.items():
+            os.environ.pop(name, None)
+            if value is not None:
+                os.environ[name] = value
+
+
+async def run_checks(tmp):
+    await check_claims(os.path.join(tmp, "claims.sqlite3"))
+    await check_refund(os.path.join(tmp, "refund.sqlite3"))
+
+
+def check_ledger():
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(run_checks(tmp))
+    check_durable_storage()
+
+
+def test_payment_ledger():
+    check_ledger()
+
+
+def main():
+    print("\n" + "=" * 70)
+    print("🚀 AGENT HUB - PAYMENT LEDGER TEST (temporary store)")
+    print("=" * 70)
+    check_ledger()
+    print("✅ Payment ledger checks passed (single spend, concurrent claims, restart, refund on 5xx, durable storage)")
+
+
+if __name__ == "__main__":
+    main()
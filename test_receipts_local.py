@@ -0,0 +1,82 @@
+"""Payment receipt check - LOCAL VERSION (no network)
+
+Runs payment receipts against a temporary ledger and a stand-in value
+lookup: a claim that leaves value on a tx issues a receipt, the receipt
+pays for later calls without a chain lookup and from the same record as
+the raw tx hash (for any service, like the hash itself), and a used-up,
+expired, tampered or other-wallet receipt is refused.
+"""
+import asyncio
+import os
+import tempfile
+
+from app.utils.payment_ledger import LedgerStore, PaymentLedger
+from app.utils.receipts import receipt_signer
+
+USDC = 1_000_000  # micro-USDC per USDC
+TX = "0x" + "0a" * 32  # $0.15: three $0.05 calls
+
+
+async def run_checks(db_path):
+    ledger = PaymentLedger(LedgerStore(db_path))
+    lookups = []
+
+    async def chain_value(tx_hash):
+        lookups.append(tx_hash)
+        return 15 * USDC // 100
+
+    first = await ledger.claim(TX, 0.05, "sentiment", chain_value)
+    assert first["ok"] and first["remaining_usd"] == 0.10 and first["receipt"].startswith("rcpt_"), first
+
+    # Partial redemption: the receipt spends from the tx's record, no chain lookup
+    second = await ledger.redeem_receipt(first["receipt"], 0.05, "summarize", chain_value)
+    assert second["ok"] and second["remaining_usd"] == 0.05, second
+    assert lookups == [TX], lookups
+
+    # The raw hash shares that record, and an old receipt cannot spend more than is left
+    third = await ledger.claim(TX, 0.05, "sentiment", chain_value)
+    assert third["ok"] and third["remaining_usd"] == 0 and "receipt" not in third, third
+    replay = await ledger.redeem_receipt(second["receipt"], 0.05, "sentiment", chain_value)
+    assert not replay["ok"] and replay["reason"] == "spent", replay
+
+    original_ttl = receipt_signer.ttl
+    receipt_signer.ttl = -1
+    try:
+        expired = receipt_signer.issue(TX, 15 * USDC // 100, 10 * USDC // 100)
+    finally:
+        receipt_signer.ttl = original_ttl
+    assert (await ledger.redeem_receipt(expired, 0.05, "sentiment", chain_value))["reason"] == "invalid_receipt"
+
+    original_wallet = receipt_signer.wallet
+    receipt_signer.wallet = "0x" + "ee" * 20
+    try:
+        elsewhere = receipt_signer.issue(TX, 15 * USDC // 100, 10 * USDC // 100)
+    finally:
+        receipt_signer.wallet = original_wallet
+    assert (await ledger.redeem_receipt(elsewhere, 0.05, "sentiment", chain_value))["reason"] == "invalid_receipt"
+    tampered = first["receipt"].replace(".", ".x", 1)
+    assert (await ledger.redeem_receipt(tampered, 0.05, "sentiment", chain_value))["reason"] == "invalid_receipt"
+    stats = receipt_signer.stats()
+    assert stats["expired"] >= 1 and stats["wrong_wallet"] >= 1 and stats["bad_signature"] >= 1, stats
+    await ledger.close()
+
+
+def check_receipts():
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(run_checks(os.path.join(tmp, "ledger.sqlite3")))
+
+
+def test_receipts():
+    check_receipts()
+
+
+def main():
+    print("\n" + "=" * 70)
+    print("🚀 AGENT HUB - PAYMENT RECEIPT TEST (temporary ledger)")
+    print("=" * 70)
+    check_receipts()
+    print("✅ Receipt checks passed (partial redemption, shared record, expired/tampered/other wallet)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Result cache check - LOCAL VERSION (no network)
+
+Checks the result cache keys and lookups: requests that differ only in key
+order or surrounding whitespace share an entry, while requests whose inner
+whitespace differs (code, poetry, preformatted text) never do, and
+uncached services only coalesce byte-identical calls in flight.
+"""
+import asyncio
+
+from app.utils.result_cache import HIT, MISS, ResultCache, make_key
+
+CODE = "def f(x):\n    if x:\n        return 1\n    return 2\n"
+# Same tokens, different indentation: a different program
+CODE_DEDENTED = "def f(x):\n    if x:\n        return 1\nreturn 2\n"
+POEM = "roses are red\n\n    violets are blue"
+
+
+def check_keys():
+    assert make_key("code_review", {"code": CODE, "language": "python"}) == \
+        make_key("code_review", {"language": "python", "code": CODE}), "key order must not matter"
+    assert make_key("summarize", {"text": "  a text\n"}) == make_key("summarize", {"text": "a text"})
+    assert make_key("code_review", {"code": CODE}) != make_key("code_review", {"code": CODE_DEDENTED})
+    assert make_key("translate", {"text": POEM}) != make_key("translate", {"text": " ".join(POEM.split())})
+    assert make_key("summarize", {"text": "a  b"}) != make_key("summarize", {"text": "a b"})
+    assert make_key("code_review", {"code": CODE}, exact=True) != make_key("code_review", {"code": CODE.strip()}, exact=True)
+
+
+async def check_lookups():
+    cache = ResultCache()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return {"n": len(calls)}
+
+    first, status = await cache.get_or_compute("summarize", {"text": "one\n  two"}, compute)
+    assert status == MISS and first == {"n": 1}
+    again, status = await cache.get_or_compute("summarize", {"text": " one\n  two "}, compute)
+    assert status == HIT and again == first
+    other, status = await cache.get_or_compute("summarize", {"text": "one two"}, compute)
+    assert status == MISS and other == {"n": 2}
+
+
+async def check_uncached_coalescing():
+    """code_review is never cached: only byte-identical calls in flight share one run"""
+    cache = ResultCache()
+    runs = []
+
+    def reviewer(code):
+        async def compute():
+            runs.append(code)
+            await asyncio.sleep(0.05)
+            return {"reviewed": code}
+        return compute
+
+    results = await asyncio.gather(
+        cache.get_or_compute("code_review", {"code": CODE}, reviewer(CODE)),
+        cache.get_or_compute("code_review", {"code": CODE}, reviewer(CODE)),
+        cache.get_or_compute("code_review", {"code": CODE + "\n"}, reviewer(CODE + "\n")),
+    )
+    assert len(runs) == 2, runs
+    assert results[2][0] == {"reviewed": CODE + "\n"}, results
+
+
+def check_result_cache():
+    check_keys()
+    asyncio.run(check_lookups())
+    asyncio.run(check_uncached_coalescing())
+
+
+def test_result_cache():
+    check_result_cache()
+
+
+def main():
+    print("\n" + "=" * 70)
+    print("🚀 AGENT HUB - RESULT CACHE TEST (keys and lookups)")
+    print("=" * 70)
+    check_result_cache()
+    print("✅ Result cache checks passed (key order, surrounding vs inner whitespace, exact keys for uncached services)")
+
+
+if __name__ == "__main__":
+    main()
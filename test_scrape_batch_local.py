@@ -0,0 +1,84 @@
+"""Batch scrape check - LOCAL VERSION (no network)
+
+Runs /agent/scrape/batch with a stand-in page scraper: duplicate URLs are
+scraped (and priced) once, pages stream back as NDJSON in completion order
+with a summary line, no host ever has more than SCRAPE_BATCH_PER_HOST pages
+in flight, and a page that fails is reported without stopping the others.
+"""
+import asyncio
+import json
+import os
+from collections import Counter
+from urllib.parse import urlsplit
+
+os.environ["TEST_MODE"] = "true"
+
+import httpx
+
+import app.main as hub
+
+URLS = [f"https://busy.example/{i}" for i in range(6)] + ["https://quiet.example/", "https://down.example/"]
+
+
+async def run_checks():
+    in_flight, peak = Counter(), Counter()
+
+    async def stand_in_scrape(url, max_links=50):
+        host = urlsplit(url).hostname
+        in_flight[host] += 1
+        peak[host] = max(peak[host], in_flight[host])
+        try:
+            await asyncio.sleep(0.2 if host == "quiet.example" else 0.02)
+            if host == "down.example":
+                raise ConnectionError("connection refused")
+            return {"status": "success", "url": url, "title": url}
+        finally:
+            in_flight[host] -= 1
+
+    scrape_page = hub.scrape_page
+    hub.scrape_page = stand_in_scrape
+    transport = httpx.ASGITransport(app=hub.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://local") as c:
+            empty = await c.post("/agent/scrape/batch", json={"urls": []})
+            assert empty.status_code == 400, empty.text
+            too_many = [f"https://busy.example/{i}" for i in range(hub.SCRAPE_BATCH_MAX_URLS + 1)]
+            assert (await c.post("/agent/scrape/batch", json={"urls": too_many})).status_code == 400
+
+            response = await c.post("/agent/scrape/batch", json={"urls": URLS + URLS[:3]})
+            assert response.status_code == 200, response.text
+            assert response.headers["content-type"].startswith("application/x-ndjson")
+            lines = [json.loads(line) for line in response.text.splitlines()]
+    finally:
+        hub.scrape_page = scrape_page
+
+    pages, summary = lines[:-1], lines[-1]
+    assert sorted(page["index"] for page in pages) == list(range(len(URLS))), pages
+    assert summary["done"] and summary["count"] == len(URLS), summary
+    assert summary["succeeded"] == len(URLS) - 1 and summary["failed"] == 1, summary
+    assert summary["amount_usd"] == round(hub.PRICING["scrape"] * len(URLS), 6), summary
+    failed = next(page for page in pages if page["status"] == "error")
+    assert failed["url"] == "https://down.example/" and "connection refused" in failed["error"], failed
+    # Completion order: the slow host comes last, after the busy host's queue drained
+    assert pages[-1]["url"] == "https://quiet.example/", [page["url"] for page in pages]
+    assert peak["busy.example"] == hub.SCRAPE_BATCH_PER_HOST, peak
+
+
+def check_scrape_batch():
+    asyncio.run(run_checks())
+
+
+def test_scrape_batch():
+    check_scrape_batch()
+
+
+def main():
+    print("\n" + "=" * 70)
+    print("🚀 AGENT HUB - BATCH SCRAPE TEST (stand-in scraper)")
+    print("=" * 70)
+    check_scrape_batch()
+    print("✅ Batch scrape checks passed (dedupe, per-host cap, completion order, failed pages reported)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Search layer check - LOCAL VERSION (no network)
+
+Runs the search client over a StaticProvider stand-in: spellings of a
+query that differ only in case and spacing share a cache entry, concurrent
+identical queries make one provider call, callers get copies they can
+change, empty answers are not cached, entries expire and the oldest go
+first when the cache is full, and throttling is retried with backoff.
+search_many() runs queries side by side under the shared provider limit,
+merges them without duplicate URLs and gives up on slow or failing
+queries without failing the stage.
+"""
+import asyncio
+import time
+
+import app.utils.search as search_module
+from app.utils.search import SearchClient, SearchThrottled, StaticProvider, search_client, search_many
+
+DOCUMENTS = [
+    {"title": "Agent hub pricing", "href": "https://hub.example/pricing", "body": "per call pricing in USDC"},
+    {"title": "Agent hub docs", "href": "https://hub.example/docs", "body": "endpoints and payment"},
+    {"title": "Unrelated", "href": "https://other.example/", "body": "gardening"},
+]
+
+
+class ThrottledProvider(StaticProvider):
+    """Throttles the first `failures` calls, then answers"""
+
+    def __init__(self, documents, failures):
+        super().__init__(documents)
+        self.failures = failures
+
+    async def text(self, query, max_results):
+        if self.failures:
+            self.failures -= 1
+            self.calls += 1
+            raise SearchThrottled("202 Ratelimit")
+        return await super().text(query, max_results)
+
+
+async def check_cache():
+    provider = StaticProvider(DOCUMENTS, latency=0.05)
+    client = SearchClient(provider, ttl=60, max_entries=2)
+
+    first, second = await asyncio.gather(client.search("agent hub", 2), client.search("Agent  HUB ", 2))
+    assert provider.calls == 1 and first == second, (provider.calls, first, second)
+    assert [r["href"] for r in first] == ["https://hub.example/pricing", "https://hub.example/docs"], first
+    first[0]["title"] = "changed by a caller"
+    again = await client.search("agent hub", 2)
+    assert again[0]["title"] == "Agent hub pricing" and provider.calls == 1
+    assert client.stats()["hits"] == 1, client.stats()
+
+    assert await client.search("no such words", 2) == []
+    assert await client.search("no such words", 2) == [] and provider.calls == 3, "empty answers are not cached"
+
+    # A different result count is a different entry; the oldest entry goes when full
+    await client.search("agent hub", 1)
+    await client.search("gardening", 2)
+    assert client.stats()["entries"] == 2
+    await client.search("agent hub", 2)
+    assert provider.calls == 6, provider.calls
+
+    client.ttl = -1
+    await client.search("payment", 2)
+    await client.search("payment", 2)
+    assert provider.calls == 8, "expired entries are fetched again"
+
+
+async def check_throttling():
+    base = search_module.SEARCH_BACKOFF_BASE
+    search_module.SEARCH_BACKOFF_BASE = 0.01
+    try:
+        recovering = SearchClient(ThrottledProvider(DOCUMENTS, failures=2), retries=3)
+        assert (await recovering.search("agent hub"))[0]["href"] == "https://hub.example/pricing"
+        assert recovering.stats()["throttled"] == 2 and recovering.stats()["retries"] == 2, recovering.stats()
+
+        blocked = SearchClient(ThrottledProvider(DOCUMENTS, failures=10), retries=1)
+        try:
+            await blocked.search("agent hub")
+        except SearchThrottled:
+            pass
+        else:
+            raise AssertionError("throttling past the retry budget must raise")
+        assert blocked.provider.calls == 2 and blocked.stats()["errors"] == 1, blocked.stats()
+    finally:
+        search_module.SEARCH_BACKOFF_BASE = base
+
+
+class FanOutProvider(StaticProvider):
+    """Slow or failing for some queries; counts provider calls in flight"""
+
+    def __init__(self, documents):
+        super().__init__(documents, latency=0.05)
+        self.in_flight = self.peak = 0
+
+    async def text(self, query, max_results):
+        if "broken" in query:
+            raise RuntimeError("provider error")
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            if "slow" in query:
+                await asyncio.sleep(5)
+            return await super().text(query, max_results)
+        finally:
+            self.in_flight -= 1
+
+
+async def check_fan_out():
+    provider = FanOutProvider(DOCUMENTS + [
+        {"title": "Agent hub pricing (mirror)", "href": "HTTPS://hub.example:443/pricing#plans", "body": "pricing"},
+    ])
+    search_client.configure(provider)
+    try:
+        queries = ["agent hub pricing", "hub docs payment", "pricing", "slow agent", "broken agent", "gardening"]
+        started = time.perf_counter()
+        results, report = await search_many(queries, max_results=3, deadline=0.5)
+        elapsed = time.perf_counter() - started
+    finally:
+        search_client.configure()
+
+    assert elapsed < 1.0, f"the slow query held up the stage: {elapsed:.2f}s"
+    assert report["timed_out"] == ["slow agent"] and report["failed"] == ["broken agent"], report
+    assert report["completed"] == 4 and report["duplicates"] >= 2, report
+    hrefs = [r["href"] for r in results]
+    assert len(hrefs) == len(set(hrefs)) and "HTTPS://hub.example:443/pricing#plans" not in hrefs, hrefs
+    assert hrefs[0] == "https://hub.example/pricing" and "https://other.example/" in hrefs, hrefs
+    assert provider.peak <= search_client.max_concurrency, provider.peak
+
+
+async def run_checks():
+    await check_cache()
+    await check_throttling()
+    await check_fan_out()
+
+
+def check_search():
+    asyncio.run(run_checks())
+
+
+def test_search():
+    check_search()
+
+
+def main():
+    print("\n" + "=" * 70)
+    print("🚀 AGENT HUB - SEARCH LAYER TEST (static provider)")
+    print("=" * 70)
+    check_search()
+    print("✅ Search checks passed (normalized cache keys, coalescing, copies, expiry, eviction, throttling, fan-out)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Speculative execution check - LOCAL VERSION (no network)
+
+Runs a speculative handler with stand-in verification and service work:
+a rejected payment cancels work still running and returns the rejection,
+work that finished before the rejection is thrown away and never reaches
+the result, search or page cache (a paid caller sharing it gets the result
+without waiting on the other payment), and a confirmed payment releases
+the result and caches it.
+"""
+import asyncio
+import tempfile
+import time
+
+import app.utils.page_cache as page_cache_module
+from app.utils.page_cache import HIT as PAGE_HIT, PageCache
+from app.utils.result_cache import HIT, ResultCache
+from app.utils.search import SearchClient, StaticProvider
+from app.utils.speculation import speculator
+
+REJECTED = {"status": 402}
+
+
+def build_handler(cache, verify_seconds, paid, work_seconds, state):
+    async def verify():
+        await asyncio.sleep(verify_seconds)
+        return None if paid else REJECTED
+
+    async def compute():
+        try:
+            await asyncio.sleep(work_seconds)
+        except asyncio.CancelledError:
+            state["cancelled"] += 1
+            raise
+        state["computed"] += 1
+        return {"sentiment": "positive"}
+
+    @speculator.wrap
+    async def handler(text):
+        assert speculator.start(verify), "verification should run alongside the work"
+        result, _ = await cache.get_or_compute("sentiment", {"text": text}, compute)
+        return result
+
+    return handler
+
+
+def speculate(verify_seconds, paid, work):
+    """Speculative handler running work() alongside a stand-in verification"""
+    async def verify():
+        await asyncio.sleep(verify_seconds)
+        return None if paid else REJECTED
+
+    @speculator.wrap
+    async def handler():
+        assert speculator.start(verify), "verification should run alongside the work"
+        return await work()
+
+    return handler
+
+
+async def fake_fetch_page(url, max_bytes, timeout, headers, raise_for_status):
+    return {"url": url, "status_code": 200, "headers": {"cache-control": "max-age=600"},
+            "text": "<p>page</p>", "truncated": False, "skipped": None}
+
+
+async def check_other_caches():
+    client = SearchClient(StaticProvider([{"title": "agent hub", "href": "https://a.example", "body": "docs"}]))
+    assert await speculate(0.05, False, lambda: client.search("agent hub"))() == REJECTED
+    assert client.stats()["entries"] == 0 and client.stats()["unpaid"] == 1, client.stats()
+    assert (await speculate(0.02, True, lambda: client.search("agent hub"))())[0]["href"] == "https://a.example"
+    assert client.stats()["entries"] == 1
+
+    fetch_page = page_cache_module.fetch_page
+    page_cache_module.fetch_page = fake_fetch_page
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = PageCache(tmp)
+            assert await speculate(0.05, False, lambda: cache.fetch("https://a.example/doc"))() == REJECTED
+            page, _ = await cache.fetch("https://a.example/doc")
+            assert page["cache"] != PAGE_HIT and cache.stats()["unpaid"] == 1, cache.stats()
+            await speculate(0.02, True, lambda: cache.fetch("https://b.example/doc"))()
+            await asyncio.sleep(0.05)  # the confirmed entry is written in the background
+            page, _ = await cache.fetch("https://b.example/doc")
+            assert page["cache"] == PAGE_HIT, page
+    finally:
+        page_cache_module.fetch_page = fetch_page
+
+
+async def run_checks():
+    cache = ResultCache()
+    state = {"cancelled": 0, "computed": 0}
+
+    # Verification fails while the work is running: the work is cancelled
+    slow_work = build_handler(cache, 0.05, False, 0.5, state)
+    assert await slow_work("cancelled") == REJECTED
+    assert state == {"cancelled": 1, "computed": 0}, state
+
+    # The work finishes first, then verification fails: nothing is cached
+    fast_work = build_handler(cache, 0.1, False, 0.01, state)
+    assert await fast_work("finished") == REJECTED
+    assert state["computed"] == 1, state
+    assert cache.lookup("sentiment", {"text": "finished"})[0] != HIT
+    assert cache.stats()["services"]["sentiment"]["stores"] == 0
+
+    # A paid caller sharing an unpaid speculative run gets the result as soon as the
+    # work is done, without waiting on the other payment, but it is not cached
+    shared = build_handler(cache, 0.3, False, 0.05, state)
+
+    async def paid_caller():
+        await asyncio.sleep(0.01)
+        started = time.perf_counter()
+        result, _ = await cache.get_or_compute("sentiment", {"text": "shared"}, lambda: asyncio.sleep(0, "unused"))
+        return result, time.perf_counter() - started
+
+    unpaid, (paid, waited) = await asyncio.gather(shared("shared"), paid_caller())
+    assert unpaid == REJECTED and paid == {"sentiment": "positive"}, (unpaid, paid)
+    assert waited < 0.2, waited
+    assert cache.lookup("sentiment", {"text": "shared"})[0] != HIT
+    assert cache.stats()["services"]["sentiment"]["unpaid"] == 2, cache.stats()
+
+    # A confirmed payment releases the result and fills the cache
+    paid_work = build_handler(cache, 0.05, True, 0.01, state)
+    assert await paid_work("paid") == {"sentiment": "positive"}
+    assert cache.lookup("sentiment", {"text": "paid"})[0] == HIT
+    assert cache.stats()["services"]["sentiment"]["stores"] == 1
+
+    await check_other_caches()
+    stats = speculator.stats()
+    assert stats["rejected"] == 5 and stats["confirmed"] == 3, stats
+
+
+def check_speculation():
+    enabled = speculator.enabled
+    speculator.enabled = True
+    try:
+        asyncio.run(run_checks())
+    finally:
+        speculator.enabled = enabled
+
+
+def test_speculation():
+    check_speculation()
+
+
+def main():
+    print("\n" + "=" * 70)
+    print("🚀 AGENT HUB - SPECULATIVE EXECUTION TEST (stand-in verification)")
+    print("=" * 70)
+    check_speculation()
+    print("✅ Speculation checks passed (rejected work cancelled, unpaid results kept out of every cache, paid results cached)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Streaming check - LOCAL VERSION (no network)
+
+Streams generative endpoints from a stand-in Gemini client: SSE or NDJSON
+is picked from the Accept header, "token" events carry the text as it is
+produced and a "done" event carries exactly the JSON a non-streaming call
+returns, a cached result is sent as "done" alone, and a generation that
+fails mid-stream ends with an "error" event and is not cached.
+"""
+import asyncio
+import json
+import os
+
+os.environ["TEST_MODE"] = "true"
+
+import httpx
+
+import app.main as hub
+from app.utils.streaming import NDJSON, SSE, stream_format
+
+CHUNKS = ["Bonjour", " le", " monde"]
+
+
+class Chunk:
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = None
+
+
+class StandInModels:
+    """Streams CHUNKS with a short pause between them; prompts mentioning "fail" break mid-stream"""
+
+    def __init__(self):
+        self.streams = 0
+
+    async def generate_content_stream(self, model, contents, **kwargs):
+        self.streams += 1
+
+        async def chunks():
+            for index, text in enumerate(CHUNKS):
+                if index == 2 and "fail" in contents:
+                    raise ValueError("stream interrupted")
+                await asyncio.sleep(0.01)
+                yield Chunk(text)
+
+        return chunks()
+
+    async def generate_content(self, model, contents, **kwargs):
+        return Chunk("".join(CHUNKS))
+
+
+def parse_sse(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def check_format():
+    assert stream_format(None, "text/event-stream") == SSE
+    assert stream_format(None, "application/x-ndjson, application/json") == NDJSON
+    assert stream_format(None, "application/json") is None and stream_format(None, None) is None
+    assert stream_format("NDJSON", "text/event-stream") == NDJSON and stream_format("xml") is None
+
+
+async def run_checks():
+    models = StandInModels()
+    hub.llm.gateway.configure(client=type("Client", (), {"aio": type("Aio", (), {"models": models})()})())
+    transport = httpx.ASGITransport(app=hub.app)
+    body = {"text": "Hello world", "target_language": "French"}
+    async with httpx.AsyncClient(transport=transport, base_url="http://local") as c:
+        streamed = await c.post("/agent/translate", json=body, headers={"Accept": "text/event-stream"})
+        assert streamed.status_code == 200 and streamed.headers["content-type"].startswith("text/event-stream")
+        assert "no-cache" in streamed.headers["cache-control"], streamed.headers
+        events = parse_sse(streamed.text)
+        assert [name for name, _ in events] == ["token", "token", "token", "done"], events
+        assert "".join(data["text"] for name, data in events if name == "token") == "Bonjour le monde"
+        done = events[-1][1]
+        assert done["translated_text"] == "Bonjour le monde" and done["original_text"] == "Hello world", done
+
+        # The streamed result went through the result cache: a plain call gets the same JSON
+        plain = await c.post("/agent/translate", json=body)
+        assert plain.headers["x-cache"] == "HIT" and plain.json() == done, (plain.headers, plain.json())
+        replay = await c.post("/agent/translate", json=body, headers={"Accept": "application/x-ndjson"})
+        lines = [json.loads(line) for line in replay.text.splitlines()]
+        assert [line["event"] for line in lines] == ["done"] and models.streams == 1, lines
+
+        broken = {"text": "please fail", "target_language": "French"}
+        failed = await c.post("/agent/translate", json=broken, headers={"Accept": "application/x-ndjson"})
+        lines = [json.loads(line) for line in failed.text.splitlines()]
+        assert [line["event"] for line in lines] == ["token", "token", "error"], lines
+        assert "stream interrupted" in lines[-1]["error"]
+        again = await c.post("/agent/translate", json=broken, headers={"Accept": "application/x-ndjson"})
+        assert json.loads(again.text.splitlines()[0])["event"] == "token", "a failed stream must not be cached"
+
+
+def check_streaming():
+    check_format()
+    asyncio.run(run_checks())
+
+
+def test_streaming():
+    check_streaming()
+
+
+def main():
+    print("\n" + "=" * 70)
+    print("🚀 AGENT HUB - STREAMING TEST (stand-in Gemini)")
+    print("=" * 70)
+    check_streaming()
+    print("✅ Streaming checks passed (SSE/NDJSON negotiation, tokens then done, cached replay, mid-stream errors)")
+
+
+if __name__ == "__main__":
+    main()